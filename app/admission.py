@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Admission control for the chat endpoints.
+
+Every /chat and /chat/stream request takes a slot before any routing, search or
+generation work starts:
+
+- a global cap on turns in flight (per server process), with a bounded FIFO
+  wait queue; a request that cannot queue, or waits longer than the queue
+  timeout, is rejected immediately instead of slowing everyone down
+- per-user token buckets (sustained rate + burst) and a per-user cap on
+  concurrent turns, so one client cannot fill the shared slots
+
+Rejections carry a retry hint (seconds) that the endpoints return as a 429
+with a ``Retry-After`` header. In-flight count, queue depth, wait time and
+rejections are exported on /metrics.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.metrics import metrics_registry
+from config import (
+    ADMISSION_MAX_IN_FLIGHT, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT,
+    USER_RATE_PER_MINUTE, USER_BURST, USER_MAX_CONCURRENT
+)
+
+IDLE_USER_LIMIT = 10000  # Per-user entries kept before idle, refilled buckets are dropped
+SERVICE_TIME_SMOOTHING = 0.2  # EWMA weight of the latest turn duration (for retry hints)
+
+IN_FLIGHT = metrics_registry.gauge(
+    "admission_in_flight", "Requests holding an admission slot", ("pool",))
+QUEUE_DEPTH = metrics_registry.gauge(
+    "admission_queue_depth", "Requests waiting for an admission slot", ("pool",))
+QUEUE_WAIT_SECONDS = metrics_registry.histogram(
+    "admission_queue_wait_seconds", "Time admitted requests spent waiting for a slot", ("pool",))
+REJECTIONS = metrics_registry.counter(
+    "admission_rejections_total", "Requests rejected with 429, by reason", ("pool", "reason"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason: str, message: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class Ticket:
+    """An admitted request's slot; release it exactly once when the turn ends."""
+
+    def __init__(self, controller: "AdmissionController", user_key: str):
+        self._controller = controller
+        self.user_key = user_key
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """Global in-flight cap with a bounded wait queue plus per-user limits (one event loop).
+
+    ``pool`` labels the metrics, so several controllers (chat turns, prefetch)
+    can run side by side.
+    """
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, queue_size: int = ADMISSION_QUEUE_SIZE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, user_rate_per_minute: float = USER_RATE_PER_MINUTE,
+                 user_burst: int = USER_BURST, user_max_concurrent: int = USER_MAX_CONCURRENT, pool: str = "chat"):
+        self.pool = pool
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate_per_minute / 60.0
+        self.user_burst = user_burst
+        self.user_max_concurrent = user_max_concurrent
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._buckets: Dict[str, list] = {}  # user -> [tokens, last refill]
+        self._active: Dict[str, int] = {}    # user -> turns admitted or queued
+        self._service_time = 5.0             # EWMA of turn duration, seconds
+
+    # ---------------- Per-user limits ----------------
+
+    def _take_token(self, user_key: str) -> Optional[float]:
+        """Consume one token; returns seconds until one is available if the bucket is empty."""
+        if self.user_rate <= 0:
+            return None
+        now = time.monotonic()
+        bucket = self._buckets.get(user_key)
+        if bucket is None:
+            if len(self._buckets) >= IDLE_USER_LIMIT:
+                self._prune(now)
+            bucket = self._buckets[user_key] = [float(self.user_burst), now]
+        bucket[0] = min(float(self.user_burst), bucket[0] + (now - bucket[1]) * self.user_rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return (1 - bucket[0]) / self.user_rate
+        bucket[0] -= 1
+        return None
+
+    def _prune(self, now: float):
+        for user_key, (tokens, last) in list(self._buckets.items()):
+            if user_key not in self._active and tokens + (now - last) * self.user_rate >= self.user_burst:
+                del self._buckets[user_key]
+
+    # ---------------- Admission ----------------
+
+    def _queue_wait_hint(self) -> float:
+        return self._service_time * (len(self._waiters) + 1) / max(self.max_in_flight, 1)
+
+    def _reject(self, reason: str, message: str, retry_after: float):
+        REJECTIONS.inc(pool=self.pool, reason=reason)
+        raise AdmissionRejected(reason, message, retry_after)
+
+    async def acquire(self, user_key: str) -> Ticket:
+        """Wait for a slot or raise AdmissionRejected."""
+        if self.user_max_concurrent and self._active.get(user_key, 0) >= self.user_max_concurrent:
+            self._reject("user_concurrency", "Too many chat requests in progress for this user",
+                         self._service_time)
+        if self.in_flight >= self.max_in_flight and len(self._waiters) >= self.queue_size:
+            self._reject("queue_full", "Server is busy, please retry shortly", self._queue_wait_hint())
+        wait = self._take_token(user_key)
+        if wait is not None:
+            self._reject("user_rate", "Chat request rate limit exceeded for this user", wait)
+
+        self._active[user_key] = self._active.get(user_key, 0) + 1
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            IN_FLIGHT.set(self.in_flight, pool=self.pool)
+            QUEUE_WAIT_SECONDS.observe(0.0, pool=self.pool)
+            return Ticket(self, user_key)
+
+        # Queue: a releasing turn hands its slot straight to the oldest waiter
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        QUEUE_DEPTH.set(len(self._waiters), pool=self.pool)
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self._handoff()  # the slot arrived as we gave up: pass it on
+            else:
+                waiter.cancel()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            QUEUE_DEPTH.set(len(self._waiters), pool=self.pool)
+            self._forget_user(user_key)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("queue_timeout", "Server is busy, please retry shortly", self._queue_wait_hint())
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - queued_at, pool=self.pool)
+        return Ticket(self, user_key)
+
+    def _handoff(self):
+        """Give a freed slot to the oldest live waiter, else return it to the pool."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                QUEUE_DEPTH.set(len(self._waiters), pool=self.pool)
+                return
+        QUEUE_DEPTH.set(0, pool=self.pool)
+        self.in_flight -= 1
+        IN_FLIGHT.set(self.in_flight, pool=self.pool)
+
+    def _forget_user(self, user_key: str):
+        remaining = self._active.get(user_key, 0) - 1
+        if remaining > 0:
+            self._active[user_key] = remaining
+        else:
+            self._active.pop(user_key, None)
+
+    def _release(self, ticket: Ticket):
+        duration = time.monotonic() - ticket.started
+        self._service_time += SERVICE_TIME_SMOOTHING * (duration - self._service_time)
+        self._forget_user(ticket.user_key)
+        self._handoff()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool": self.pool,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._waiters),
+            "queue_size": self.queue_size,
+            "active_users": len(self._active),
+            "avg_turn_seconds": round(self._service_time, 2)
+        }
+
+
+# Global controller (per server process)
+admission_controller = AdmissionController()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+HNSW parameters and on-disk maintenance for the Chroma collection.
+
+Chroma fixes ``hnsw:space``, ``hnsw:M`` and ``hnsw:construction_ef`` when a
+collection is created; they are copied into the vector segment and later
+``collection_metadata`` only rewrites the collection row, not the index. New
+builds therefore take the configured values from ``hnsw_metadata()``, an
+existing collection is opened without overrides, and changed build-time
+values are applied by ``compact_collection`` (copy into a fresh collection).
+``hnsw:search_ef`` is a query-time knob and is applied in place.
+
+Each vector segment lives in a UUID-named directory next to
+``chroma.sqlite3``. Rebuilds that could not remove the old store, deleted
+collections and copied backups leave directories no segment row points at;
+``find_orphan_segments`` / ``remove_orphan_segments`` clean them up.
+"""
+
+import os
+import re
+import shutil
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from config import CHROMA_HNSW_SPACE, CHROMA_HNSW_M, CHROMA_HNSW_CONSTRUCTION_EF, CHROMA_HNSW_SEARCH_EF
+
+SQLITE_FILE = "chroma.sqlite3"
+SEGMENT_DIR_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+BUILD_PARAMS = ("hnsw:space", "hnsw:M", "hnsw:construction_ef")
+CHROMA_DEFAULTS = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+COPY_BATCH_SIZE = 1000
+
+
+def hnsw_metadata(**overrides) -> Dict[str, Any]:
+    """Collection metadata for a new build: configured HNSW params plus overrides."""
+    metadata = {
+        "hnsw:space": CHROMA_HNSW_SPACE,
+        "hnsw:M": CHROMA_HNSW_M,
+        "hnsw:construction_ef": CHROMA_HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": CHROMA_HNSW_SEARCH_EF,
+    }
+    metadata.update({f"hnsw:{key}": value for key, value in overrides.items()})
+    return metadata
+
+
+def _vector_segment(vectorstore):
+    from chromadb.segment import VectorReader
+    return vectorstore._client._server._manager.get_segment(vectorstore._collection.id, VectorReader)
+
+
+def index_params(vectorstore) -> Dict[str, Any]:
+    """HNSW params the collection's index was actually built with."""
+    params = {**CHROMA_DEFAULTS, **{k: v for k, v in (vectorstore._collection.metadata or {}).items()
+                                    if k.startswith("hnsw:")}}
+    try:
+        segment_params = _vector_segment(vectorstore)._params
+        params.update({
+            "hnsw:space": segment_params.space,
+            "hnsw:M": segment_params.M,
+            "hnsw:construction_ef": segment_params.construction_ef,
+            "hnsw:search_ef": segment_params.search_ef,
+        })
+    except Exception as e:
+        print(f"[WARNING] Could not read HNSW segment params: {e}")
+    return params
+
+
+def apply_search_ef(vectorstore, search_ef: int) -> bool:
+    """Set the query-time ef on the loaded index (no rebuild needed)."""
+    try:
+        segment = _vector_segment(vectorstore)
+        segment._params.search_ef = search_ef
+        if segment._index is not None:
+            segment._index.set_ef(search_ef)
+        return True
+    except Exception as e:
+        print(f"[WARNING] Could not apply hnsw:search_ef={search_ef}: {e}")
+        return False
+
+
+def check_index_params(vectorstore) -> List[str]:
+    """Apply the configured search_ef and report build-time params that differ from config."""
+    configured = hnsw_metadata()
+    actual = index_params(vectorstore)
+    if actual["hnsw:search_ef"] != configured["hnsw:search_ef"]:
+        apply_search_ef(vectorstore, configured["hnsw:search_ef"])
+    stale = [key for key in BUILD_PARAMS if actual[key] != configured[key]]
+    if stale:
+        print(f"[WARNING] Collection was built with {', '.join(f'{k}={actual[k]}' for k in stale)}; "
+              f"run scripts/manage_vectorstore.py compact to apply the configured values")
+    return stale
+
+
+# ---------------- On-disk segments ----------------
+
+def live_segment_ids(persist_directory: str) -> Optional[set]:
+    """Segment ids referenced by chroma.sqlite3; None when there is no database."""
+    db_path = os.path.join(persist_directory, SQLITE_FILE)
+    if not os.path.exists(db_path):
+        return None
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return {row[0] for row in connection.execute("SELECT id FROM segments")}
+    finally:
+        connection.close()
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def find_orphan_segments(persist_directory: str) -> List[Dict[str, Any]]:
+    """UUID segment directories that no segment row references (all of them if the db is gone)."""
+    if not os.path.isdir(persist_directory):
+        return []
+    live = live_segment_ids(persist_directory) or set()
+    orphans = []
+    for name in sorted(os.listdir(persist_directory)):
+        path = os.path.join(persist_directory, name)
+        if os.path.isdir(path) and SEGMENT_DIR_RE.match(name) and name not in live:
+            orphans.append({"segment": name, "path": path, "bytes": directory_size(path)})
+    return orphans
+
+
+def remove_orphan_segments(persist_directory: str) -> List[Dict[str, Any]]:
+    """Delete orphan segment directories; returns what was removed."""
+    orphans = find_orphan_segments(persist_directory)
+    for orphan in orphans:
+        shutil.rmtree(orphan["path"])
+    return orphans
+
+
+def purge_orphan_rows(persist_directory: str, vacuum: bool = True) -> Dict[str, int]:
+    """
+    Drop sqlite rows of segments that no longer exist, then VACUUM.
+
+    Deleting a collection removes its segment rows but can leave its records
+    in ``embeddings`` / ``embedding_metadata`` / full-text search behind.
+    """
+    db_path = os.path.join(persist_directory, SQLITE_FILE)
+    if not os.path.exists(db_path):
+        return {}
+    connection = sqlite3.connect(db_path)
+    try:
+        live = "SELECT id FROM segments"
+        orphan_ids = f"SELECT id FROM embeddings WHERE segment_id NOT IN ({live})"
+        with connection:
+            removed = {
+                "embedding_metadata": connection.execute(
+                    f"DELETE FROM embedding_metadata WHERE id IN ({orphan_ids})").rowcount,
+                "embedding_fulltext_search": connection.execute(
+                    f"DELETE FROM embedding_fulltext_search WHERE rowid IN ({orphan_ids})").rowcount,
+                "embeddings": connection.execute(
+                    f"DELETE FROM embeddings WHERE segment_id NOT IN ({live})").rowcount,
+                "max_seq_id": connection.execute(
+                    f"DELETE FROM max_seq_id WHERE segment_id NOT IN ({live})").rowcount,
+            }
+        if vacuum:
+            connection.execute("VACUUM")
+        return removed
+    finally:
+        connection.close()
+
+
+# ---------------- Compaction ----------------
+
+def compact_collection(persist_directory: str, collection_name: str = "langchain",
+                       **hnsw_overrides) -> Dict[str, Any]:
+    """
+    Rebuild the collection's HNSW index with the configured params.
+
+    Copies ids, embeddings, documents and metadata into a fresh collection
+    (dropping tombstoned labels left by deletes and updates), swaps the names
+    and deletes the old collection, then removes segment directories that
+    are no longer referenced along with the old collection's sqlite rows.
+    """
+    import chromadb
+
+    client = chromadb.PersistentClient(path=persist_directory)
+    source = client.get_collection(collection_name)
+    metadata = {**{k: v for k, v in (source.metadata or {}).items() if not k.startswith("hnsw:")},
+                **hnsw_metadata(**hnsw_overrides)}
+    temp_name = f"{collection_name}_compacting"
+    try:
+        client.delete_collection(temp_name)  # leftover from an interrupted run
+    except Exception:
+        pass
+    target = client.create_collection(temp_name, metadata=metadata)
+
+    size_before = directory_size(persist_directory)
+    count = source.count()
+    for offset in range(0, count, COPY_BATCH_SIZE):
+        batch = source.get(include=["embeddings", "documents", "metadatas"],
+                           limit=COPY_BATCH_SIZE, offset=offset)
+        target.add(ids=batch["ids"], embeddings=batch["embeddings"],
+                   documents=batch["documents"], metadatas=batch["metadatas"])
+    if target.count() != count:
+        client.delete_collection(temp_name)
+        raise RuntimeError(f"Compaction copied {target.count()} of {count} records; original kept")
+
+    client.delete_collection(collection_name)
+    target.modify(name=collection_name)
+    del client, source, target
+    removed = remove_orphan_segments(persist_directory)
+    purged = purge_orphan_rows(persist_directory)
+
+    return {
+        "records": count,
+        "hnsw": {k: v for k, v in metadata.items() if k.startswith("hnsw:")},
+        "bytes_before": size_before,
+        "bytes_after": directory_size(persist_directory),
+        "orphans_removed": [orphan["segment"] for orphan in removed],
+        "orphan_rows_removed": purged,
+    }
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Chunk store: retrieved chunks kept once per process, keyed by their store id.
+
+Retrieval returns (chunk id, relevance) pairs. The first time a chunk id is
+seen, its text and metadata are loaded from the backend (one batched get for
+all the ids a search missed), and its token count and prompt snippet are
+computed. From then on it is shared: prompt context for /chat, /chat/stream
+and auto-correction is a join over cached snippets, with no re-tokenizing,
+no re-formatting and no document payload from the vector store. Entries are
+bounded by an LRU. A knowledge-base rebuild assigns new ids, so stale chunks
+just age out.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.tokens import count_tokens
+from config import CHUNK_STORE_MAX_ENTRIES
+
+TOKEN_MODEL = "gpt-4o-mini"  # Chunk token counts use this model's encoding (shared by the chat models)
+MAX_HEADERS = 64
+
+# "Document N:" headers of the prompt context, formatted once (and counted once, on first use)
+CONTEXT_HEADERS = [f"Document {n}:\n" for n in range(1, MAX_HEADERS + 1)]
+
+
+CONTEXT_SEPARATOR = "\n\n"
+
+
+@lru_cache(maxsize=MAX_HEADERS)
+def _header_tokens(index: int) -> int:
+    """Tokens of header ``index``, with the separator ahead of it from the second document on."""
+    return count_tokens((CONTEXT_SEPARATOR if index else "") + CONTEXT_HEADERS[index], TOKEN_MODEL)
+
+
+# Loads missing chunks: ids -> [(id, text, metadata)]
+ChunkLoader = Callable[[List[str]], Iterable[Tuple[str, str, Optional[Dict[str, Any]]]]]
+
+
+class ChunkStore:
+    """Bounded LRU of chunks by id: text, metadata, token count and prompt snippet."""
+
+    def __init__(self, max_entries: int = CHUNK_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._chunks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _entry(chunk_id: str, text: str, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        text = text or ""
+        snippet = text.strip()
+        return {
+            "id": chunk_id,
+            "text": text,
+            "metadata": metadata or {},
+            "tokens": count_tokens(snippet, TOKEN_MODEL),
+            "snippet": snippet
+        }
+
+    def add(self, chunk_id: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Store a chunk unless it is already known; returns the shared entry."""
+        with self._lock:
+            entry = self._chunks.get(chunk_id)
+            if entry is not None:
+                self._chunks.move_to_end(chunk_id)
+                return entry
+        entry = self._entry(chunk_id, text, metadata)
+        with self._lock:
+            entry = self._chunks.setdefault(chunk_id, entry)
+            self._chunks.move_to_end(chunk_id)
+            while len(self._chunks) > self.max_entries:
+                self._chunks.popitem(last=False)
+        return entry
+
+    def get_many(self, chunk_ids: List[str], loader: Optional[ChunkLoader] = None) -> List[Dict[str, Any]]:
+        """Entries for ``chunk_ids`` in order; misses are fetched with ``loader`` in one call."""
+        with self._lock:
+            found = {}
+            for chunk_id in chunk_ids:
+                entry = self._chunks.get(chunk_id)
+                if entry is not None:
+                    self._chunks.move_to_end(chunk_id)
+                    found[chunk_id] = entry
+            missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing and loader is not None:
+            for chunk_id, text, metadata in loader(missing):
+                found[chunk_id] = self.add(chunk_id, text, metadata)
+        return [found[chunk_id] for chunk_id in chunk_ids if chunk_id in found]
+
+    def context(self, chunks: List[Dict[str, Any]]) -> Tuple[str, int]:
+        """Prompt context for ``chunks`` ("Document N:" + snippet, blank-line separated) and its token count."""
+        chunks = chunks[:MAX_HEADERS]
+        pieces = []
+        tokens = 0
+        for n, chunk in enumerate(chunks):
+            if n:
+                pieces.append(CONTEXT_SEPARATOR)
+            pieces.append(CONTEXT_HEADERS[n])
+            pieces.append(chunk["snippet"])
+            tokens += _header_tokens(n) + chunk["tokens"]
+        return "".join(pieces), tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "chunks": len(self._chunks),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+
+
+# Global chunk store (per server process)
+chunk_store = ChunkStore()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Single-flight coalescing of identical in-flight chat turns.
+
+When many users ask the same question at once (a trending topic, a
+newsletter link), each turn would run its own retrieval and its own LLM
+stream. Turns whose answer depends only on the question - no conversation
+history - are keyed by the normalized question, the knowledge-base version,
+the filters and the model profile. The first turn with a key starts a
+*flight* that does the work once; identical turns arriving while it runs
+subscribe to it and receive the same events, replayed from the start.
+
+Each subscriber still writes its own history and trace. The flight's stage
+spans and generation stats are copied into every subscriber's ChatTurn, but
+the latency / token metrics are recorded once, for the single upstream call.
+If every subscriber disconnects, the flight is cancelled.
+"""
+
+import asyncio
+import re
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+from app.metrics import ChatTurn
+from config import REQUEST_COALESCING
+
+TERMINAL_EVENTS = ("done", "error")
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, trailing punctuation dropped."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").casefold()
+
+
+class Flight:
+    """One shared run of an event producer, buffered for late subscribers."""
+
+    def __init__(self, endpoint: str):
+        self.turn = ChatTurn(endpoint)
+        self.events: List[Dict[str, Any]] = []
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def publish(self, event: Dict[str, Any]):
+        self.events.append(event)
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def events_from_start(self) -> AsyncIterator[Dict[str, Any]]:
+        index = 0
+        while True:
+            wakeup = self._wakeup
+            while index < len(self.events):
+                event = self.events[index]
+                index += 1
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+            await wakeup.wait()
+
+
+class StreamCoalescer:
+    """Runs at most one producer per key; identical concurrent turns share its events."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[Hashable, Flight] = {}
+
+    async def _run(self, key: Hashable, flight: Flight, produce: Callable[[ChatTurn], AsyncIterator[dict]]):
+        try:
+            async for event in produce(flight.turn):
+                flight.publish(event)
+            flight.publish({"type": "done"})
+        except asyncio.CancelledError:
+            flight.publish({"type": "error", "error": "cancelled"})
+            raise
+        except Exception as e:
+            print(f"[ERROR] Coalesced chat turn failed: {e}")
+            flight.publish({"type": "error", "error": str(e)})
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def stream(self, key: Optional[Hashable], turn: ChatTurn,
+                     produce: Callable[[ChatTurn], AsyncIterator[dict]]) -> AsyncIterator[Dict[str, Any]]:
+        """Events of ``produce(turn)``, shared with identical in-flight turns when ``key`` is set.
+
+        A shared producer runs against the flight's own ChatTurn; the
+        subscriber's ``turn`` adopts its spans and generation stats once the
+        flight is done. Producer errors are re-raised as RuntimeError.
+        """
+        if key is None or not self.enabled:
+            async for event in produce(turn):
+                yield event
+            return
+
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if not joined:
+            flight = self._flights[key] = Flight(turn.endpoint)
+            flight.task = asyncio.create_task(self._run(key, flight, produce))
+        else:
+            turn.path = "coalesced"
+        flight.subscribers += 1
+        try:
+            async for event in flight.events_from_start():
+                if event["type"] == "error":
+                    raise RuntimeError(event["error"])
+                if event["type"] == "done":
+                    turn.adopt(flight.turn)
+                    return
+                yield event
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.task.done():
+                # Nobody is listening any more: stop paying for the upstream stream
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+
+# Global coalescer (per server process)
+stream_coalescer = StreamCoalescer(REQUEST_COALESCING)
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Compact quantized vector index with full-precision re-scoring.
+
+The Chroma HNSW segment keeps every chunk's float32 embedding (1536 dims for
+ada-002) in memory. The compact index keeps only a reduced copy in RAM:
+
+- optional Matryoshka truncation to the first ``dims`` components (valid for
+  ``text-embedding-3-*``, which are trained so that prefixes stay meaningful;
+  ada-002 vectors should keep their full width),
+- int8 codes with one float32 scale per vector.
+
+A query scores every code with one batched dot product, takes the best
+``k * rescore`` candidates and re-scores them against the full-precision
+vectors in ``full.npy``, which is memory-mapped so only those rows are read.
+Documents and metadata still come from Chroma's sqlite metadata segment, and
+``where`` filters are resolved there too, so the HNSW segment is never loaded.
+
+Files under ``COMPACT_INDEX_PATH``: ``codes.npy`` (int8, N x dims),
+``scales.npy`` (float32, N), ``full.npy`` (float32, N x D), ``ids.json`` and
+``index.json`` (dims, counts, build time).
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import COMPACT_INDEX_PATH, COMPACT_INDEX_DIMS, COMPACT_INDEX_RESCORE
+
+INDEX_VERSION = 1
+BUILD_BATCH_SIZE = 1000
+SCORE_BLOCK_ROWS = 1024  # int8 rows widened to float32 per block (stays in cache)
+
+
+def truncate(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """Matryoshka truncation: keep the leading ``dims`` components and re-normalize."""
+    if dims and dims < vectors.shape[-1]:
+        vectors = vectors[..., :dims]
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization; returns (codes, scales)."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class CompactIndex:
+    """In-RAM int8 codes plus a memory-mapped full-precision matrix for re-scoring."""
+
+    def __init__(self, path: str, codes: np.ndarray, scales: np.ndarray, full: np.ndarray,
+                 ids: List[str], manifest: Dict[str, Any]):
+        self.path = path
+        self.codes = codes
+        self.scales = scales
+        self.full = full
+        self.ids = ids
+        self.rows = {doc_id: row for row, doc_id in enumerate(ids)}
+        self.manifest = manifest
+        self.dims = manifest["dims"]
+
+    # ---------------- Build / load ----------------
+
+    @classmethod
+    def build(cls, collection, path: str = COMPACT_INDEX_PATH, dims: int = COMPACT_INDEX_DIMS) -> "CompactIndex":
+        """Stream a Chroma collection's embeddings into a new compact index at ``path``."""
+        count = collection.count()
+        if count == 0:
+            raise ValueError("Collection is empty; nothing to index")
+        first = collection.get(include=["embeddings"], limit=1)
+        full_dims = len(first["embeddings"][0])
+        dims = dims if dims and dims < full_dims else full_dims
+
+        tmp_path = path + ".building"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        full = np.lib.format.open_memmap(os.path.join(tmp_path, "full.npy"), mode="w+",
+                                         dtype=np.float32, shape=(count, full_dims))
+        codes = np.empty((count, dims), dtype=np.int8)
+        scales = np.empty(count, dtype=np.float32)
+        ids: List[str] = []
+
+        for offset in range(0, count, BUILD_BATCH_SIZE):
+            batch = collection.get(include=["embeddings"], limit=BUILD_BATCH_SIZE, offset=offset)
+            vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+            rows = slice(len(ids), len(ids) + len(vectors))
+            full[rows] = truncate(vectors, 0)
+            codes[rows], scales[rows] = quantize_int8(truncate(vectors, dims))
+            ids.extend(batch["ids"])
+        if len(ids) != count:
+            raise RuntimeError(f"Collection changed while indexing ({len(ids)} of {count} records)")
+        full.flush()
+        del full
+
+        manifest = {
+            "version": INDEX_VERSION,
+            "count": count,
+            "dims": dims,
+            "full_dims": full_dims,
+            "built_at": time.time()
+        }
+        np.save(os.path.join(tmp_path, "codes.npy"), codes)
+        np.save(os.path.join(tmp_path, "scales.npy"), scales)
+        with open(os.path.join(tmp_path, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+        with open(os.path.join(tmp_path, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path: str = COMPACT_INDEX_PATH) -> Optional["CompactIndex"]:
+        """Load an index from disk; None if there is none or it is from another version."""
+        manifest_path = os.path.join(path, "index.json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION:
+            return None
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        return cls(
+            path,
+            codes=np.load(os.path.join(path, "codes.npy")),
+            scales=np.load(os.path.join(path, "scales.npy")),
+            full=np.load(os.path.join(path, "full.npy"), mmap_mode="r"),
+            ids=ids,
+            manifest=manifest
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Resident (codes + scales) and on-disk sizes."""
+        return {
+            **self.manifest,
+            "resident_bytes": self.codes.nbytes + self.scales.nbytes,
+            "full_precision_bytes": self.full.nbytes
+        }
+
+    # ---------------- Search ----------------
+
+    def _approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        scales = self.scales if rows is None else self.scales[rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + SCORE_BLOCK_ROWS] = block @ query
+        return scores * scales
+
+    def search(self, query_embedding: List[float], k: int, rescore: int = COMPACT_INDEX_RESCORE,
+               rows: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Top-k (id, cosine similarity); ``rows`` restricts the search to those row numbers."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        candidates_pool = len(self.ids) if rows is None else len(rows)
+        if candidates_pool == 0:
+            return []
+
+        approximate = self._approximate_scores(truncate(query, self.dims), rows)
+        candidates = min(candidates_pool, max(k, k * rescore))
+        top = np.argpartition(-approximate, candidates - 1)[:candidates]
+        candidate_rows = top if rows is None else rows[top]
+
+        # Re-score against full precision; sorted rows keep the mmap reads sequential
+        candidate_rows = np.sort(candidate_rows)
+        exact = self.full[candidate_rows] @ truncate(query, 0)
+        order = np.argsort(-exact)[:k]
+        return [(self.ids[candidate_rows[i]], float(exact[i])) for i in order]
+
+
+class CompactVectorSearch:
+    """``similarity_search_by_vector`` over a CompactIndex, documents from Chroma's sqlite."""
+
+    def __init__(self, vectorstore, index: CompactIndex):
+        self.vectorstore = vectorstore
+        self.index = index
+
+    def _allowed_rows(self, where: Dict[str, Any]) -> np.ndarray:
+        allowed = self.vectorstore._collection.get(where=where, include=[])["ids"]
+        return np.fromiter((self.index.rows[i] for i in allowed if i in self.index.rows), dtype=np.int64)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4,
+                                                          filter: Optional[Dict[str, Any]] = None):
+        """Same shape as Chroma's: (Document, distance), cosine distance = 1 - similarity."""
+        from langchain_core.documents import Document
+
+        rows = self._allowed_rows(filter) if filter else None
+        hits = self.index.search(embedding, k, rows=rows)
+        if not hits:
+            return []
+        found = self.vectorstore._collection.get(ids=[doc_id for doc_id, _ in hits],
+                                                 include=["documents", "metadatas"])
+        by_id = {doc_id: (text, metadata) for doc_id, text, metadata
+                 in zip(found["ids"], found["documents"], found["metadatas"])}
+        return [
+            (Document(page_content=by_id[doc_id][0], metadata=by_id[doc_id][1] or {}), 1.0 - score)
+            for doc_id, score in hits if doc_id in by_id
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k, filter)]
+
+    def similarity_search_ids_by_vector(self, embedding: List[float], k: int = 4,
+                                        filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """(chunk id, cosine distance), best first, without reading any documents."""
+        rows = self._allowed_rows(filter) if filter else None
+        return [(doc_id, 1.0 - score) for doc_id, score in self.index.search(embedding, k, rows=rows)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+
+_lock = threading.Lock()
+_search: Optional[CompactVectorSearch] = None
+
+
+def compact_search(vectorstore) -> Optional[CompactVectorSearch]:
+    """The loaded compact index for ``vectorstore``, or None when compact mode is off."""
+    return _search if _search is not None and _search.vectorstore is vectorstore else None
+
+
+def enable_compact_index(vectorstore, rebuild: bool = False) -> Optional[CompactVectorSearch]:
+    """Load (or build, when missing / out of date) the compact index and route searches to it."""
+    global _search
+    with _lock:
+        index = None if rebuild else CompactIndex.load(COMPACT_INDEX_PATH)
+        count = vectorstore._collection.count()
+        wanted_dims = COMPACT_INDEX_DIMS or (index.manifest["full_dims"] if index else 0)
+        if index is None or index.manifest["count"] != count or index.dims != wanted_dims:
+            print(f"[*] Building compact index ({count} vectors, dims={COMPACT_INDEX_DIMS or 'full'})...")
+            index = CompactIndex.build(vectorstore._collection, COMPACT_INDEX_PATH, COMPACT_INDEX_DIMS)
+        stats = index.stats()
+        print(f"[OK] Compact index: {stats['count']} vectors, {stats['dims']} dims int8, "
+              f"{stats['resident_bytes'] / 1024 / 1024:.1f} MB resident")
+        _search = CompactVectorSearch(vectorstore, index)
+        return _search
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Conversation-aware retrieval: standalone search queries and a budgeted history block.
+
+Follow-up turns used to prepend the last 5 raw messages (long assistant
+answers included) to the question, embed that whole blob for the search and
+send it again as the prompt question. Instead:
+
+- ``QueryCondenser`` turns a follow-up into a short standalone search query
+  with a small model, cached per conversation turn. Questions that read as
+  self-contained are searched as they are, with no LLM call
+- ``history_block`` renders the rolling summary and the recent messages for
+  the prompt under a token budget, newest first, each message clipped
+- ``ConversationSummarizer`` folds turns older than the last few messages into
+  a summary stored on the conversation document, in the background after a
+  turn completes, so older context survives without growing every prompt
+"""
+
+import asyncio
+import hashlib
+import re
+from typing import Dict, List, Set
+
+from app.cache import TTLCache
+from app.coalescing import normalize_question
+from app.llm import CONDENSE_MODEL_PROFILE, SUMMARY_MODEL_PROFILE, model_registry
+from app.metrics import COMPLETION_TOKENS, PROMPT_TOKENS, ChatTurn, metrics_registry
+from app.mongodb_memory import get_conversation_window, update_summary
+from app.prompts import CONDENSE_PROMPT, SUMMARY_PROMPT
+from app.tokens import count_message_tokens, count_tokens, truncate_tokens
+from config import (
+    CONDENSE_CACHE_TTL, CONVERSATION_SUMMARIES, HISTORY_MESSAGE_TOKENS, HISTORY_TOKEN_BUDGET,
+    QUERY_CONDENSING, SUMMARY_KEEP_MESSAGES, SUMMARY_MAX_TOKENS
+)
+
+CONDENSE_HISTORY_TOKENS = 400  # History shown to the condensing model
+CONDENSE_MAX_QUERY_CHARS = 300  # Longer output is not a search query; fall back to the question
+SUMMARY_BATCH_MESSAGES = 4  # Uncovered messages beyond the kept ones before a fold (two turns)
+SUMMARY_INPUT_MESSAGE_TOKENS = 500  # Each folded message is clipped to this for the summarizer
+
+SUMMARY_UPDATES = metrics_registry.counter(
+    "conversation_summary_updates_total", "Rolling summary updates, by outcome", ("outcome",))
+
+# Words that make a question lean on earlier turns ("how do I enable it?")
+FOLLOW_UP_RE = re.compile(
+    r"\b(it|its|it's|this|that|these|those|they|them|their|there|he|she|him|her|one|ones|"
+    r"same|also|more|else|other|above|previous|former|latter|again|instead|"
+    r"what about|how about|and if|then)\b",
+    re.IGNORECASE
+)
+
+
+def is_follow_up(question: str) -> bool:
+    """True when a question probably needs the conversation to make sense on its own."""
+    return len(question.split()) <= 3 or bool(FOLLOW_UP_RE.search(question))
+
+
+def history_block(messages: List[Dict[str, str]], budget_tokens: int = HISTORY_TOKEN_BUDGET,
+                  message_tokens: int = HISTORY_MESSAGE_TOKENS, model: str = "gpt-4o-mini",
+                  summary: str = "") -> str:
+    """Summary, then recent messages (newest kept first) within ``budget_tokens``; "" if none."""
+    lines, used = [], 0
+    header = ""
+    if summary:
+        header = f"Summary of the earlier conversation: {truncate_tokens(summary, SUMMARY_MAX_TOKENS, model)}\n"
+        used = count_tokens(header, model)
+    for message in reversed(messages):
+        role = "User" if message["role"] == "user" else "Assistant"
+        line = f"{role}: {truncate_tokens(message['content'], message_tokens, model)}"
+        cost = count_tokens(line, model)
+        if used + cost > budget_tokens:
+            break
+        lines.append(line)
+        used += cost
+    if not lines and not header:
+        return ""
+    return "Conversation so far:\n" + header + "\n".join(reversed(lines)) + "\n\n"
+
+
+class QueryCondenser:
+    """Standalone search queries for follow-up questions, cached per conversation turn."""
+
+    def __init__(self, enabled: bool = QUERY_CONDENSING, ttl_seconds: float = CONDENSE_CACHE_TTL):
+        self.enabled = enabled
+        self._cache = TTLCache(ttl_seconds, max_entries=4096)
+
+    @staticmethod
+    def _key(conversation_id: str, question: str, messages: List[Dict[str, str]]) -> tuple:
+        last = messages[-1]["content"] if messages else ""
+        return (conversation_id, len(messages), hashlib.md5(last.encode("utf-8")).hexdigest(),
+                normalize_question(question))
+
+    async def condense(self, conversation_id: str, question: str, messages: List[Dict[str, str]],
+                       turn: ChatTurn, summary: str = "") -> str:
+        """Search query for ``question`` given the earlier ``messages`` (the question itself if standalone)."""
+        if not messages or not self.enabled or not is_follow_up(question):
+            return question
+        key = self._key(conversation_id, question, messages)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        llm = model_registry.get_profile(CONDENSE_MODEL_PROFILE)
+        with turn.stage("query_condense", model=llm.model_name) as span:
+            query = question
+            try:
+                prompt = CONDENSE_PROMPT.format_messages(
+                    history=history_block(messages, CONDENSE_HISTORY_TOKENS, message_tokens=120,
+                                          model=llm.model_name, summary=summary).strip() or "(none)",
+                    question=question
+                )
+                result = await llm.ainvoke(prompt)
+                prompt_tokens = count_message_tokens(prompt, llm.model_name)
+                completion_tokens = count_tokens(result.content, llm.model_name)
+                PROMPT_TOKENS.inc(prompt_tokens, model=llm.model_name)
+                COMPLETION_TOKENS.inc(completion_tokens, model=llm.model_name)
+                span.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                candidate = result.content.strip().splitlines()[0].strip().strip('"') if result.content.strip() else ""
+                if candidate and len(candidate) <= CONDENSE_MAX_QUERY_CHARS:
+                    query = candidate
+            except Exception as e:
+                # Searching with the bare question beats failing the turn
+                print(f"[WARNING] Query condensation failed, searching with the question: {e}")
+                span["error"] = str(e)
+                return question
+            span["query_tokens"] = count_tokens(query)
+        self._cache.set(key, query)
+        return query
+
+
+class ConversationSummarizer:
+    """Folds older turns into the conversation's stored rolling summary, off the request path."""
+
+    def __init__(self, enabled: bool = CONVERSATION_SUMMARIES, keep_messages: int = SUMMARY_KEEP_MESSAGES):
+        self.enabled = enabled
+        self.keep_messages = keep_messages
+        self._running: Set[str] = set()
+        self._pending: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, conversation_id: str):
+        """Update the summary in the background once the turn is stored (one run per conversation)."""
+        if not self.enabled:
+            return
+        if conversation_id in self._running:
+            self._pending.add(conversation_id)
+            return
+        self._running.add(conversation_id)
+        task = asyncio.create_task(self._run(conversation_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, conversation_id: str):
+        try:
+            while True:
+                self._pending.discard(conversation_id)
+                await self.summarize(conversation_id)
+                if conversation_id not in self._pending:
+                    break
+        except Exception as e:
+            SUMMARY_UPDATES.inc(outcome="error")
+            print(f"[WARNING] Conversation summary update failed for {conversation_id}: {e}")
+        finally:
+            self._running.discard(conversation_id)
+
+    async def summarize(self, conversation_id: str) -> bool:
+        """Fold uncovered messages older than the kept ones into the summary; True if it changed."""
+        window = await get_conversation_window(conversation_id)
+        pending = window["pending"]
+        if len(pending) < self.keep_messages + SUMMARY_BATCH_MESSAGES:
+            return False
+        fold = pending[:len(pending) - self.keep_messages]
+
+        llm = model_registry.get_profile(SUMMARY_MODEL_PROFILE)
+        transcript = "\n".join(
+            f"{'User' if m['role'] == 'user' else 'Assistant'}: "
+            f"{truncate_tokens(m['content'], SUMMARY_INPUT_MESSAGE_TOKENS, llm.model_name)}"
+            for m in fold
+        )
+        prompt = SUMMARY_PROMPT.format_messages(
+            summary=window["summary"] or "(none yet)",
+            messages=transcript,
+            max_words=int(SUMMARY_MAX_TOKENS * 0.7)
+        )
+        result = await llm.ainvoke(prompt)
+        PROMPT_TOKENS.inc(count_message_tokens(prompt, llm.model_name), model=llm.model_name)
+        COMPLETION_TOKENS.inc(count_tokens(result.content, llm.model_name), model=llm.model_name)
+        summary = truncate_tokens(result.content.strip(), SUMMARY_MAX_TOKENS, llm.model_name)
+        if not summary:
+            SUMMARY_UPDATES.inc(outcome="empty")
+            return False
+
+        stored = await update_summary(conversation_id, summary,
+                                      window["summarized_total"] + len(fold), window["summarized_total"])
+        SUMMARY_UPDATES.inc(outcome="stored" if stored else "conflict")
+        return stored
+
+
+# Global condenser and summarizer (per server process)
+query_condenser = QueryCondenser()
+conversation_summarizer = ConversationSummarizer()
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only correction dataset with a sidecar index.
+
+Every auto-correction is appended as one JSON line to ``corrections.jsonl``.
+A small sidecar (``corrections.index.json``) keeps the aggregates the status
+and quality checks need - record count, a HyperLogLog sketch of unique
+questions and per-day recency buckets - and is updated on each append, so
+those checks are O(1) instead of re-reading the dataset. The sidecar records
+how many bytes of the log it covers; a log that grew behind its back (crash,
+manual append) is folded in on load and a shorter one triggers a rebuild.
+
+The in-memory ``trace_id -> byte offset`` map lets the chat path fetch a
+corrected answer with one seek instead of loading the whole file, and the
+``trace_id -> question`` map next to it is what corrected-answer matching
+scans. Every server worker appends under the log's file lock and folds in the
+others' lines before reading (``app.shared_files.SharedLog``).
+
+The legacy ``corrected_responses.json`` (rewritten on every correction) is
+migrated into the log the first time the dataset loads.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.feedback_store import normalize_question
+from app.shared_files import SharedLog
+
+DATASET_DIR = "./data/fine_tuning_dataset"
+CORRECTIONS_FILE = f"{DATASET_DIR}/corrections.jsonl"
+LEGACY_CORRECTED_RESPONSES_FILE = "./data/corrected_responses/corrected_responses.json"
+
+INDEX_VERSION = 1
+SKETCH_PRECISION = 10  # 2^10 registers, ~3% error on unique-question estimates
+RECENT_DAYS = 7
+
+FINE_TUNING_SYSTEM_PROMPT = (
+    "You are an expert assistant specializing in Slack to Microsoft Teams migrations via CloudFuze. "
+    "Provide accurate, helpful, and specific information about migration processes, tools, and best practices."
+)
+
+
+class QuestionSketch:
+    """HyperLogLog distinct counter with linear counting for small cardinalities."""
+
+    def __init__(self, precision: int = SKETCH_PRECISION, registers: Optional[list] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers and len(registers) == self.size else [0] * self.size
+
+    def add(self, value: str):
+        h = int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big")
+        bucket = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[bucket]:
+            self.registers[bucket] = rank
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        raw = alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * self.size and zeros:
+            return int(round(self.size * math.log(self.size / zeros)))
+        return int(round(raw))
+
+
+def _empty_index() -> Dict[str, Any]:
+    return {
+        "version": INDEX_VERSION,
+        "bytes": 0,
+        "count": 0,
+        "trainable_count": 0,
+        "status_counts": {},
+        "daily_counts": {},
+        "question_sketch": [],
+        "updated_at": None
+    }
+
+
+class CorrectionDataset:
+    """JSONL correction log plus an O(1) aggregate sidecar."""
+
+    def __init__(self, path: str = CORRECTIONS_FILE, legacy_path: str = LEGACY_CORRECTED_RESPONSES_FILE):
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".index.json"
+        self.legacy_path = legacy_path
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._index = _empty_index()
+        self._sketch = QuestionSketch()
+        self._offsets: Dict[str, int] = {}  # trace_id -> byte offset of its latest correction
+        self._questions: Dict[str, str] = {}  # trace_id -> question of its latest correction
+        self._log = SharedLog(path)
+
+    # ---------------- Loading ----------------
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with self._log.locked():
+                self._load_index()
+                if self._sync_locked(initial=True):
+                    self._save_index()
+                self._migrate_legacy()
+            self._loaded = True
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if index.get("version") == INDEX_VERSION:
+                    self._index = {**_empty_index(), **index}
+                    self._sketch = QuestionSketch(registers=self._index["question_sketch"])
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[WARNING] Rebuilding correction index: {e}")
+
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size < self._index["bytes"]:
+            print("[WARNING] Correction log is shorter than its index; rebuilding")
+            self._index = _empty_index()
+            self._sketch = QuestionSketch()
+
+    def _sync_locked(self, initial: bool = False) -> int:
+        """Read lines not seen yet for trace offsets; folds in any the index misses.
+
+        The first pass reads the whole log but only folds the tail past the
+        sidecar's byte count. A log replaced or removed by another worker is
+        re-indexed from scratch. Returns the number of records folded.
+        """
+        reset, records = self._log.read_new()
+        if reset and not initial:
+            self._index = _empty_index()
+            self._sketch = QuestionSketch()
+            self._offsets = {}
+            self._questions = {}
+        indexed_bytes = self._index["bytes"] if initial else 0
+        folded = 0
+        for line_offset, record in records:
+            if record.get("trace_id"):
+                self._remember(record, line_offset)
+            if line_offset >= indexed_bytes or not reset:
+                self._fold(record)
+                folded += 1
+        self._index["bytes"] = self._log.offset
+        return folded
+
+    def _sync(self):
+        self._ensure_loaded()
+        if self._log.changed():
+            with self._lock, self._log.locked(shared=True):
+                self._sync_locked()
+
+    def _migrate_legacy(self):
+        """Append legacy corrected responses not already in the log, then move the file aside."""
+        if not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                legacy = json.load(f).get("corrected_responses", [])
+            migrated = 0
+            for entry in legacy:
+                if entry.get("trace_id") in self._offsets:
+                    continue
+                self._append_locked({
+                    "input": entry.get("original_question"),
+                    "bad_output": None,
+                    "corrected_output": entry.get("corrected_response"),
+                    "trace_id": entry.get("trace_id"),
+                    "user_comment": entry.get("user_comment"),
+                    "timestamp": entry.get("timestamp") or datetime.now().isoformat(),
+                    "status": entry.get("status", "corrected")
+                })
+                migrated += 1
+            os.replace(self.legacy_path, self.legacy_path + ".migrated")
+            print(f"[OK] Migrated {migrated} legacy corrected responses into {self.path}")
+        except Exception as e:
+            print(f"[WARNING] Could not migrate legacy corrected responses: {e}")
+
+    # ---------------- Index maintenance ----------------
+
+    def _fold(self, record: Dict[str, Any]):
+        index = self._index
+        index["count"] += 1
+        if record.get("input") and record.get("corrected_output"):
+            index["trainable_count"] += 1
+        status = record.get("status") or "unknown"
+        index["status_counts"][status] = index["status_counts"].get(status, 0) + 1
+        day = (record.get("timestamp") or "")[:10]
+        if day:
+            index["daily_counts"][day] = index["daily_counts"].get(day, 0) + 1
+        normalized = normalize_question(record.get("input") or "")
+        if normalized:
+            self._sketch.add(normalized)
+
+    def _save_index(self):
+        self._index["question_sketch"] = self._sketch.registers
+        self._index["updated_at"] = datetime.now().isoformat()
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    def _remember(self, record: Dict[str, Any], offset: int):
+        self._offsets[record["trace_id"]] = offset
+        if record.get("input"):
+            self._questions[record["trace_id"]] = record["input"]
+        else:
+            self._questions.pop(record["trace_id"], None)
+
+    def _append_locked(self, record: Dict[str, Any]):
+        """Append one record (thread lock and exclusive file lock held)."""
+        self._sync_locked()
+        offset = self._log.append(record)
+        if record.get("trace_id"):
+            self._remember(record, offset)
+        self._index["bytes"] = self._log.offset
+        self._fold(record)
+        self._save_index()
+
+    # ---------------- Public API ----------------
+
+    def append(self, trace_id: str, corrected_output: str, question: Optional[str] = None,
+               bad_output: Optional[str] = None, user_comment: Optional[str] = None,
+               status: str = "auto_corrected") -> Dict[str, Any]:
+        """Append one correction and update the sidecar index."""
+        self._ensure_loaded()
+        record = {
+            "input": question,
+            "bad_output": bad_output,
+            "corrected_output": corrected_output,
+            "trace_id": trace_id,
+            "user_comment": user_comment,
+            "timestamp": datetime.now().isoformat(),
+            "status": status
+        }
+        with self._lock, self._log.locked():
+            self._append_locked(record)
+        return record
+
+    def append_record(self, record: Dict[str, Any]):
+        """Append an already-built record as is (used when merging legacy files)."""
+        self._ensure_loaded()
+        with self._lock, self._log.locked():
+            self._append_locked(record)
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """Latest correction for a trace, read with a single seek."""
+        self._sync()
+        offset = self._offsets.get(trace_id)
+        if offset is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def has(self, trace_id: str) -> bool:
+        self._sync()
+        return trace_id in self._offsets
+
+    def corrected_questions(self) -> List[Tuple[str, str]]:
+        """(trace_id, question) of every corrected trace, after a single sync."""
+        self._sync()
+        with self._lock:
+            return list(self._questions.items())
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Stream every correction without loading the file."""
+        self._ensure_loaded()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts, unique-question estimate and recent volume straight from the index."""
+        self._sync()
+        with self._lock:
+            today = datetime.now().date()
+            recent_days = {(today - timedelta(days=d)).isoformat() for d in range(RECENT_DAYS + 1)}
+            return {
+                "count": self._index["count"],
+                "trainable_count": self._index["trainable_count"],
+                "unique_questions": self._sketch.estimate(),
+                "recent_count": sum(n for day, n in self._index["daily_counts"].items() if day in recent_days),
+                "status_counts": dict(self._index["status_counts"])
+            }
+
+    def export_openai(self, out_path: str, system_prompt: str = FINE_TUNING_SYSTEM_PROMPT) -> int:
+        """Stream trainable corrections into an OpenAI chat fine-tuning JSONL file."""
+        written = 0
+        with open(out_path, "w", encoding="utf-8") as out:
+            for record in self.iter_records():
+                if not (record.get("input") and record.get("corrected_output")):
+                    continue
+                out.write(json.dumps({
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": record["input"]},
+                        {"role": "assistant", "content": record["corrected_output"]}
+                    ]
+                }, ensure_ascii=False) + "\n")
+                written += 1
+        return written
+
+    def clear(self) -> bool:
+        """Delete the log and its index. Returns False if there was nothing to clear."""
+        with self._lock, self._log.locked():
+            existed = os.path.exists(self.path)
+            self._log.remove()
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            self._index = _empty_index()
+            self._sketch = QuestionSketch()
+            self._offsets = {}
+            self._questions = {}
+            self._loaded = False
+            return existed
+
+
+# Global dataset
+correction_dataset = CorrectionDataset()
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Background job queue for auto-corrections triggered by thumbs-down feedback.
+
+Jobs are persisted as an append-only JSONL state log (the last line for a job
+id wins), so queued and interrupted jobs survive a restart. Submissions are
+deduplicated by trace id and by normalized question, a fixed pool of workers
+bounds how many corrections run at once, and failed jobs are retried with
+exponential backoff. Question dedup only applies while a job is queued or
+running, so a new thumbs-down on an already corrected question (including one
+on the corrected answer itself) is corrected again.
+
+The log is loaded on first use, not at import, and every read or write of it
+(under its file lock) runs in a thread rather than on the event loop. With
+several server workers any of them can submit (appends and dedup checks happen
+under the log's file lock), but only the one holding ``correction_workers.lock``
+runs the worker pool. It polls the log for jobs the other workers queued; the
+rest keep retrying the lock so a replacement takes over if the leader exits.
+"""
+
+import asyncio
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.feedback_store import normalize_question
+from app.shared_files import FileLock, SharedLog
+
+CORRECTION_JOBS_FILE = "./data/correction_jobs.jsonl"
+CORRECTION_LEADER_LOCK = "./data/correction_workers.lock"
+
+# Worker tuning
+CORRECTION_CONCURRENCY = 2    # Corrections running at the same time
+CORRECTION_MAX_ATTEMPTS = 3   # Tries per job before it is marked failed
+CORRECTION_RETRY_DELAY = 5.0  # Seconds before the first retry (doubles each time)
+CORRECTION_POLL_INTERVAL = 1.0  # Leader: seconds between checks for jobs other workers queued
+CORRECTION_LEADER_RETRY = 10.0  # Others: seconds between attempts to take over the worker pool
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class CorrectionJobQueue:
+    """Persistent, deduplicating queue drained by a bounded pool of async workers."""
+
+    def __init__(self, path: str = CORRECTION_JOBS_FILE, concurrency: int = CORRECTION_CONCURRENCY,
+                 max_attempts: int = CORRECTION_MAX_ATTEMPTS, retry_delay: float = CORRECTION_RETRY_DELAY):
+        self.path = path
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._by_trace: Dict[str, str] = {}
+        self._by_question: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._log = SharedLog(path)
+        self._leader_lock = FileLock(CORRECTION_LEADER_LOCK)
+        self._queue: Optional[asyncio.Queue] = None
+        self._scheduled: Set[str] = set()  # job ids waiting in the queue or for a retry
+        self._workers = []
+        self._tasks = []
+        self._retries: Set[asyncio.Task] = set()  # pending _retry_later sleeps
+        self._handler: Optional[Callable[[Dict[str, Any]], Awaitable[str]]] = None
+        self._loaded = False
+
+    # ---------------- Persistence ----------------
+
+    def _ensure_loaded(self):
+        """Rebuild job state from the log and compact it to one line per job (first use only)."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with self._log.locked():
+                self._sync_locked()
+                if self.jobs:
+                    self._log.rewrite(self.jobs.values())
+            self._loaded = True
+
+    def _sync_locked(self):
+        """Apply job lines other workers appended (the last line per job wins)."""
+        reset, records = self._log.read_new()
+        if reset:
+            self._by_trace, self._by_question = {}, {}
+        for _, job in records:
+            if "job_id" not in job:
+                print("[WARNING] Skipping corrupt correction job line")
+                continue
+            if job["job_id"] in self.jobs:
+                self._unindex(self.jobs[job["job_id"]])
+                self.jobs[job["job_id"]].update(job)  # workers hold references to these dicts
+            else:
+                self.jobs[job["job_id"]] = job
+        if reset:
+            for job in self.jobs.values():
+                self._index(job)
+        else:
+            for _, job in records:
+                if "job_id" in job:
+                    self._index(self.jobs[job["job_id"]])
+
+    def _sync(self):
+        self._ensure_loaded()
+        if self._log.changed():
+            with self._lock, self._log.locked(shared=True):
+                self._sync_locked()
+
+    def _index(self, job: Dict[str, Any]):
+        if job["status"] == "failed":
+            return
+        self._by_trace[job["trace_id"]] = job["job_id"]
+        if job["status"] in ACTIVE_STATUSES and job.get("normalized_question"):
+            self._by_question[job["normalized_question"]] = job["job_id"]
+
+    def _unindex_question(self, job: Dict[str, Any]):
+        if self._by_question.get(job.get("normalized_question")) == job["job_id"]:
+            del self._by_question[job["normalized_question"]]
+
+    def _unindex(self, job: Dict[str, Any]):
+        if self._by_trace.get(job["trace_id"]) == job["job_id"]:
+            del self._by_trace[job["trace_id"]]
+        self._unindex_question(job)
+
+    # ---------------- Public API ----------------
+
+    async def submit(self, trace_id: str, question: str, bad_response: str,
+                     user_comment: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """Queue a correction; returns (job, created). Duplicates return the existing job."""
+        job, created = await asyncio.to_thread(self._submit, trace_id, question, bad_response, user_comment)
+        if created:
+            self._enqueue(job["job_id"])
+        return job, created
+
+    def _submit(self, trace_id: str, question: str, bad_response: str,
+                user_comment: Optional[str]) -> Tuple[Dict[str, Any], bool]:
+        normalized = normalize_question(question)
+        self._ensure_loaded()
+        with self._lock, self._log.locked():
+            self._sync_locked()
+            existing_id = self._by_trace.get(trace_id) or (normalized and self._by_question.get(normalized))
+            if existing_id:
+                return dict(self.jobs[existing_id]), False
+
+            job = {
+                "job_id": f"corr_{uuid.uuid4().hex[:16]}",
+                "trace_id": trace_id,
+                "question": question,
+                "normalized_question": normalized,
+                "bad_response": bad_response,
+                "user_comment": user_comment,
+                "status": "queued",
+                "attempts": 0,
+                "error": None,
+                "created_at": datetime.now().isoformat()
+            }
+            self.jobs[job["job_id"]] = job
+            self._index(job)
+            job["updated_at"] = job["created_at"]
+            self._log.append(job)
+            return dict(job), True
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        await asyncio.to_thread(self._sync)
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    def stats(self) -> Dict[str, int]:
+        self._sync()
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    # ---------------- Workers ----------------
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_lock.held
+
+    async def start(self, handler: Callable[[Dict[str, Any]], Awaitable[str]]):
+        """Run the worker pool here if no other worker does, otherwise stand by."""
+        self._handler = handler
+        if not await self._become_leader():
+            self._tasks = [asyncio.create_task(self._stand_by())]
+
+    async def _become_leader(self) -> bool:
+        """Take the leader lock and re-queue jobs left queued or running by a restart."""
+        if not self._leader_lock.acquire(blocking=False):
+            return False
+        self._queue = asyncio.Queue()
+        self._scheduled = set()
+        await asyncio.to_thread(self._sync)
+        for job in list(self.jobs.values()):
+            if job["status"] in ACTIVE_STATUSES:
+                self._enqueue(job["job_id"])
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._poll()))
+        return True
+
+    async def _stand_by(self):
+        while not await self._become_leader():
+            await asyncio.sleep(CORRECTION_LEADER_RETRY)
+        print(f"[OK] Correction workers taken over by this process ({self.concurrency})")
+
+    async def _poll(self):
+        """Leader: pick up jobs queued by the other workers."""
+        while True:
+            await asyncio.sleep(CORRECTION_POLL_INTERVAL)
+            try:
+                await asyncio.to_thread(self._sync)
+                for job in list(self.jobs.values()):
+                    if job["status"] == "queued" and job.get("attempts", 0) == 0:
+                        self._enqueue(job["job_id"])
+            except Exception as e:
+                print(f"[WARNING] Could not read correction jobs: {e}")
+
+    def _enqueue(self, job_id: str):
+        if self._queue is not None and job_id not in self._scheduled:
+            self._scheduled.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def stop(self):
+        """Cancel the workers; unfinished jobs stay queued in the log for the next start."""
+        tasks = self._workers + self._tasks + list(self._retries)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._tasks = [], []
+        self._retries.clear()
+        self._queue = None
+        self._leader_lock.release()
+
+    def _update(self, job: Dict[str, Any], **changes):
+        """Apply changes to a job and append its new state to the log."""
+        with self._lock, self._log.locked():
+            self._sync_locked()
+            job.update(changes, updated_at=datetime.now().isoformat())
+            if job["status"] == "failed":
+                self._unindex(job)
+            elif job["status"] == "succeeded":
+                self._unindex_question(job)
+            self._log.append(job)
+
+    async def _retry_later(self, job_id: str, delay: float):
+        await asyncio.sleep(delay)
+        self._scheduled.discard(job_id)
+        self._enqueue(job_id)
+
+    async def _worker(self, worker_number: int):
+        while True:
+            job_id = await self._queue.get()
+            self._scheduled.discard(job_id)
+            job = self.jobs.get(job_id)
+            try:
+                if job is None or job["status"] not in ACTIVE_STATUSES:
+                    continue
+                await asyncio.to_thread(self._update, job, status="running", attempts=job["attempts"] + 1)
+                try:
+                    corrected = await self._handler(dict(job))
+                    await asyncio.to_thread(self._update, job, status="succeeded", error=None,
+                                            corrected_response=corrected)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if job["attempts"] < self.max_attempts:
+                        delay = self.retry_delay * (2 ** (job["attempts"] - 1))
+                        await asyncio.to_thread(self._update, job, status="queued", error=str(e))
+                        self._scheduled.add(job_id)
+                        retry = asyncio.create_task(self._retry_later(job_id, delay))
+                        self._retries.add(retry)
+                        retry.add_done_callback(self._retries.discard)
+                    else:
+                        await asyncio.to_thread(self._update, job, status="failed", error=str(e))
+                        print(f"[ERROR] Correction job {job_id} failed after {job['attempts']} attempts: {e}")
+            finally:
+                self._queue.task_done()
+
+
+# Global queue (per server process); log loaded on first use, workers started in the lifespan
+correction_queue = CorrectionJobQueue()
@@ -118,6 +118,7 @@ def process_doc_directory(doc_directory: str) -> List[Document]:
                         "source": doc_file,
                         "source_type": source_type,
                         "file_path": doc_path,
+                        "modified_at": int(os.path.getmtime(doc_path)),
                         "file_format": doc_file.split('.')[-1].lower(),
                         "content_type": "word_document",
                         "searchable_terms": " ".join(text.split()[:20])  # Add first 20 words for better searchability
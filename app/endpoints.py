@@ -1,129 +1,84 @@
 # -*- coding: utf-8 -*-
-from fastapi import APIRouter, Request
-from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 import uuid
-import httpx
 import os
 import json
 import asyncio
-import re
 from datetime import datetime
 
-from app.llm import setup_qa_chain
-from app.vectorstore import retriever, vectorstore
-from app.mongodb_memory import add_to_conversation, get_conversation_context, get_user_chat_history, clear_user_chat_history
+from app.llm import (
+    model_registry,
+    CONVERSATIONAL_MODEL_PROFILE, CORRECTION_MODEL_PROFILE
+)
+from app.prompts import RAG_PROMPT, CONVERSATIONAL_PROMPT, CORRECTION_PROMPT, rag_prompt_overhead
+from app.vectorstore import KB_VERSION, vectorstore
+from app.mongodb_memory import add_to_conversation, get_conversation_window, get_user_chat_history, clear_user_chat_history
 from app.helpers import strip_markdown, preserve_markdown
 from app.langfuse_integration import langfuse_tracker
-from config import SYSTEM_PROMPT, MICROSOFT_CLIENT_ID, MICROSOFT_CLIENT_SECRET, MICROSOFT_TENANT
-from langchain_core.prompts import ChatPromptTemplate
+from app.feedback_store import feedback_store
+from app.correction_queue import correction_queue
+from app.trace_store import trace_store
+from app.correction_dataset import correction_dataset
+from app.intent_router import intent_router
+from app.retrieval import parse_filters, source_config
+from app import retrieval
+from app.microsoft_auth import microsoft_auth, MicrosoftAuthError
+from app.metrics import ChatTurn, metrics_registry
+from app.tokens import count_tokens, count_message_tokens
+from app.shared_files import atomic_write_json
+from app.admission import AdmissionRejected, admission_controller
+from app.coalescing import normalize_question, stream_coalescer
+from app.conversation import conversation_summarizer, history_block, is_follow_up, query_condenser
+from app.prefetch import prefetch_admission, prefetch_cache, worth_prefetching
+from app.model_routing import ROUTING_SEARCH_K, ROUTING_TIERS, model_router, routing_report
+from app.chunk_store import chunk_store
 
 
 router = APIRouter()
 
-qa_chain = setup_qa_chain(retriever)
+# The intent classifier shares the vectorstore's embedding model
+intent_router.embeddings = vectorstore.embeddings
 
-# File path for corrected responses
-CORRECTED_RESPONSES_FILE = "./data/corrected_responses/corrected_responses.json"
+def find_corrected_match(question: str, threshold: float = 0.7):
+    """Closest question with a corrected response: {'trace_id', 'similarity', 'original_question'}.
 
-def load_corrected_responses():
-    """Load corrected responses from JSON file."""
-    try:
-        if os.path.exists(CORRECTED_RESPONSES_FILE):
-            with open(CORRECTED_RESPONSES_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('corrected_responses', [])
-    except Exception as e:
-        print(f"Error loading corrected responses: {e}")
-    return []
-
-def find_similar_corrected_response(question: str, threshold: float = 0.7):
-    """Check if there's a corrected response for a similar question."""
+    'response' is filled in only when the similarity reaches ``threshold``; below
+    it the match is still returned so model routing can see a near miss.
+    """
     from difflib import SequenceMatcher
     
-    corrected_responses = load_corrected_responses()
-    
-    if not corrected_responses:
-        return None
-    
-    # Get the original questions from feedback history to match against
-    feedback_file = "./data/feedback_history.json"
-    if os.path.exists(feedback_file):
-        try:
-            with open(feedback_file, 'r', encoding='utf-8') as f:
-                feedback_history = json.load(f)
-                
-                best_match = None
-                best_score = 0
-                
-                for feedback in feedback_history:
-                    if feedback.get('rating') == 'thumbs_down':
-                        original_question = feedback.get('question', '')
-                        trace_id = feedback.get('trace_id', '')
-                        
-                        # Calculate similarity
-                        similarity = SequenceMatcher(None, question.lower(), original_question.lower()).ratio()
-                        
-                        if similarity > best_score and similarity >= threshold:
-                            # Find the corrected response for this trace_id
-                            for corrected in corrected_responses:
-                                if corrected.get('trace_id') == trace_id:
-                                    best_score = similarity
-                                    best_match = {
-                                        'response': corrected.get('corrected_response'),
-                                        'similarity': similarity,
-                                        'original_question': original_question
-                                    }
-                                    break
-                
-                if best_match:
-                    print(f"✅ Found corrected response (similarity: {best_match['similarity']:.2%})")
-                    print(f"   Original question: {best_match['original_question']}")
-                    return best_match['response']
-                    
-        except Exception as e:
-            print(f"Error checking feedback history: {e}")
+    # Match against the original questions of corrected (thumbs-down) traces
+    try:
+        best_match = None
+        best_score = 0
+        
+        for trace_id, original_question in correction_dataset.corrected_questions():
+            # Calculate similarity
+            similarity = SequenceMatcher(None, question.lower(), original_question.lower()).ratio()
+            
+            if similarity > best_score:
+                best_score = similarity
+                best_match = {
+                    'trace_id': trace_id,
+                    'similarity': similarity,
+                    'original_question': original_question
+                }
+        
+        if best_match and best_match['similarity'] >= threshold:
+            # Only the winning correction is read from disk
+            best_match['response'] = correction_dataset.get(best_match['trace_id'])['corrected_output']
+            print(f"✅ Found corrected response (similarity: {best_match['similarity']:.2%})")
+            print(f"   Original question: {best_match['original_question']}")
+        return best_match
+            
+    except Exception as e:
+        print(f"Error checking feedback history: {e}")
     
     return None
 
-def is_conversational_query(question: str) -> bool:
-    """Determine if a query is conversational/social rather than informational."""
-    question_lower = question.lower().strip()
-    
-    # Common conversational patterns
-    conversational_patterns = [
-        r'^(hi|hello|hey|hiya|howdy)',
-        r'^(how are you|how\'re you|how do you do)',
-        r'^(what\'s up|whats up|wassup)',
-        r'^(good morning|good afternoon|good evening)',
-        r'^(thanks|thank you|thx)',
-        r'^(bye|goodbye|see you|farewell)',
-        r'^(yes|no|ok|okay|sure|alright)',
-        r'^(what|who|where|when|why|how)\s+(are you|is it|was it)',
-        r'^(tell me about yourself|who are you)',
-        r'^(what can you do|what do you do)',
-        r'^(help|can you help)',
-        r'^(sorry|excuse me|pardon)',
-        r'^(nice|good|great|awesome|cool|wow)',
-        r'^(please|pls)',
-    ]
-    
-    # Check if question matches conversational patterns
-    for pattern in conversational_patterns:
-        if re.match(pattern, question_lower):
-            return True
-    
-    # Check for very short queries (likely conversational)
-    if len(question.strip()) < 10 and not any(word in question_lower for word in ['what', 'how', 'why', 'when', 'where', 'who', 'which']):
-        return True
-    
-    # Check if it's a simple greeting or social interaction
-    social_words = ['hi', 'hello', 'hey', 'thanks', 'bye', 'good', 'nice', 'great', 'cool', 'awesome']
-    if any(word in question_lower for word in social_words) and len(question.split()) <= 3:
-        return True
-    
-    return False
-
 class ChatRequest(BaseModel):
     question: str
     user_id: str = None
@@ -134,10 +89,298 @@ class FeedbackRequest(BaseModel):
     rating: str  # "thumbs_up" or "thumbs_down"
     comment: str = None
 
+def search_documents(query: str, k: int, turn: ChatTurn, query_embedding: list = None, where: dict = None):
+    """Embed the query and search the vectorstore, timing each step separately.
+
+    Returns the (chunk id, similarity) hits and the query embedding, for a deeper search later.
+    """
+    try:
+        if query_embedding is None:
+            with turn.stage("query_embedding") as span:
+                query_embedding = vectorstore.embeddings.embed_query(query)
+                span["query_tokens"] = count_tokens(query)
+        with turn.stage("vector_search", k=k, filtered=bool(where)) as span:
+            hits = retrieval.search_ids(vectorstore, query_embedding, k, where)
+            span["results"] = len(hits)
+        return hits, query_embedding
+    except Exception as e:
+        print(f"Error during document search: {e}")
+        return [], query_embedding
+
+def usage_summary(turn: ChatTurn = None):
+    """Token counts and time to first token of a turn's generation, for the local trace log."""
+    info = turn.generation_info() if turn is not None else None
+    if not info:
+        return None
+    return {key: info.get(key) for key in ("prompt_tokens", "completion_tokens", "cached_tokens",
+                                            "time_to_first_token_ms")}
+
+def record_trace(conversation_id: str, session_id: str, question: str, answer: str, metadata: dict,
+                 model: str = None, turn: ChatTurn = None, chunk_ids: list = None) -> str:
+    """Store the finished turn locally and forward it to Langfuse; returns the trace id."""
+    trace_id = str(uuid.uuid4())
+    trace_store.record(
+        trace_id,
+        question=question,
+        answer=answer,
+        model=model,
+        chunk_ids=chunk_ids,
+        user_id=conversation_id,
+        endpoint=metadata.get("endpoint"),
+        route=metadata.get("route"),
+        usage=usage_summary(turn)
+    )
+    langfuse_tracker.create_trace(
+        user_id=conversation_id,
+        question=question,
+        answer=answer,
+        session_id=session_id,
+        metadata=metadata,
+        model=model,
+        turn=turn,
+        trace_id=trace_id
+    )
+    return trace_id
+
+async def save_turn(conversation_id: str, question: str, answer: str):
+    """Store the question and answer, then refresh the rolling summary in the background."""
+    await add_to_conversation(conversation_id, "user", question)
+    await add_to_conversation(conversation_id, "assistant", answer)
+    conversation_summarizer.schedule(conversation_id)
+
+def rag_flight_key(question: str, where: dict = None, intent_reason: str = "",
+                   corrected_similarity: float = 0.0) -> tuple:
+    """Coalescing key of a history-free retrieval turn: same question, KB, filters and routing inputs."""
+    return (normalize_question(question), KB_VERSION, json.dumps(where, sort_keys=True),
+            intent_reason, round(corrected_similarity, 3))
+
+async def rag_answer_events(search_query: str, question: str, turn: ChatTurn, history: str = "",
+                            query_embedding: list = None, where: dict = None, hits: list = None,
+                            intent_reason: str = "", corrected_similarity: float = 0.0):
+    """Retrieval then the streamed RAG answer, as events: one "documents", then "token"s.
+
+    ``hits`` (scored chunk ids, from a prefetch) replace the search. The model,
+    number of documents and answer length are routed per turn from the question
+    and hits; the context is joined from the shared chunk store.
+    """
+    if hits is None:
+        # Embedding call and vector search are blocking: run them off the event loop
+        hits, query_embedding = await asyncio.to_thread(search_documents, search_query, ROUTING_SEARCH_K, turn,
+                                                        query_embedding=query_embedding, where=where)
+    
+    with turn.stage("model_routing") as span:
+        route = model_router.route(question, hits, intent_reason=intent_reason,
+                                   corrected_similarity=corrected_similarity)
+        span.update(tier=route["tier"], reason=route["reason"], model=route["model"], k=route["k"])
+    if route["k"] > len(hits) >= ROUTING_SEARCH_K:
+        # Only complex turns search deeper than the standard k
+        hits, _ = await asyncio.to_thread(search_documents, search_query, route["k"], turn,
+                                          query_embedding=query_embedding, where=where)
+    chunk_ids = [chunk_id for chunk_id, _ in hits[:route["k"]]]
+    
+    # Shared streaming LLM for document-based queries
+    llm = model_registry.get_profile(route["model_profile"])
+    
+    # Cached snippets and token counts: only chunks this process has not seen are read and tokenized
+    with turn.stage("context_assembly", documents=len(chunk_ids)) as span:
+        chunks = await asyncio.to_thread(retrieval.load_chunks, vectorstore, chunk_ids)
+        context_text, context_tokens = chunk_store.context(chunks)
+        messages = RAG_PROMPT.format_messages(context=context_text, question=question, history=history)
+        prompt_tokens = (rag_prompt_overhead(llm.model_name) + context_tokens
+                         + count_tokens(history, llm.model_name) + count_tokens(question, llm.model_name))
+        span["prompt_tokens"] = prompt_tokens
+    yield {"type": "documents", "chunk_ids": [chunk["id"] for chunk in chunks], "model": llm.model_name,
+           "route": {key: value for key, value in route.items() if key != "model_profile"}}
+    
+    full_response = ""
+    turn.start_generation(llm.model_name, prompt_tokens)
+    async for chunk in llm.astream(messages):
+        if getattr(chunk, "usage_metadata", None):
+            turn.record_usage(chunk.usage_metadata)
+        if hasattr(chunk, 'content'):
+            token = chunk.content
+            if token:
+                turn.mark_token()
+            full_response += token
+            yield {"type": "token", "token": token}
+    turn.end_generation(count_tokens(full_response, llm.model_name))
+
+def admission_key(request: Request, user_id: str = None) -> str:
+    """Per-user admission key: the user id, else the client address (nginx sets X-Real-IP)."""
+    if user_id:
+        return f"user:{user_id}"
+    client = request.headers.get("x-real-ip") or (request.client.host if request.client else "unknown")
+    return f"ip:{client}"
+
+def admission_rejected(e: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"error": e.message, "reason": e.reason, "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+async def chat_events(request: Request, question: str, conversation_id: str, session_id: str,
+                      where: dict = None, endpoint: str = "/chat/stream"):
+    """The chat pipeline shared by /chat and /chat/stream, as events.
+
+    Yields {"type": "thinking_complete"} once the answer is about to start,
+    {"type": "token", "token"} pieces (``"replay": True`` for a stored answer
+    sent in one piece) and finally {"type": "done", "full_response", "trace_id"}.
+    Errors propagate to the endpoint.
+    """
+    turn = ChatTurn(endpoint)
+    model, chunk_ids = None, []
+
+    # Route once per request: canned reply, conversational or retrieval
+    with turn.stage("intent_routing") as span:
+        intent = await intent_router.route(request, question)
+        span.update(intent=intent["intent"], reason=intent["reason"])
+    metadata = {
+        "endpoint": endpoint,
+        "intent": intent["intent"],
+        "intent_reason": intent["reason"],
+        "streaming": endpoint == "/chat/stream"
+    }
+    
+    # Check if we have a corrected response for this question (not needed for canned replies)
+    corrected_answer, corrected_similarity = None, 0.0
+    if intent["intent"] != "canned":
+        with turn.stage("corrected_answer_lookup") as span:
+            match = await asyncio.to_thread(find_corrected_match, question)
+            if match:
+                corrected_answer, corrected_similarity = match.get("response"), match["similarity"]
+            span["hit"] = bool(corrected_answer)
+    
+    if intent["intent"] == "canned":
+        # Greetings, thanks, goodbyes: templated reply, no LLM call
+        turn.path = "canned"
+        full_response = intent["reply"]
+        yield {"type": "thinking_complete"}
+        yield {"type": "token", "token": full_response}
+    elif corrected_answer:
+        # Use the corrected response
+        turn.path = "corrected"
+        metadata["used_corrected_response"] = True
+        full_response = corrected_answer
+        yield {"type": "thinking_complete"}
+        yield {"type": "token", "token": full_response, "replay": True}
+    else:
+        # Get conversation context BEFORE adding current question
+        with turn.stage("history_fetch"):
+            window = await get_conversation_window(conversation_id, with_summary=conversation_summarizer.enabled)
+        
+        full_response = ""
+        if intent["intent"] == "conversational":
+            # Handle conversational queries directly without document retrieval
+            turn.path = "conversational"
+            yield {"type": "thinking_complete"}
+            
+            llm = model_registry.get_profile(CONVERSATIONAL_MODEL_PROFILE)
+            model = llm.model_name
+            with turn.stage("context_assembly") as span:
+                messages = CONVERSATIONAL_PROMPT.format_messages(
+                    history=history_block(window["messages"], model=model, summary=window["summary"]),
+                    question=question
+                )
+                span["prompt_tokens"] = prompt_tokens = count_message_tokens(messages, model)
+            turn.start_generation(model, prompt_tokens)
+            async for chunk in llm.astream(messages):
+                if getattr(chunk, "usage_metadata", None):
+                    turn.record_usage(chunk.usage_metadata)
+                if hasattr(chunk, 'content'):
+                    token = chunk.content
+                    if token:
+                        turn.mark_token()
+                    full_response += token
+                    yield {"type": "token", "token": token}
+            turn.end_generation(count_tokens(full_response, model))
+        else:
+            # PHASE 1: THINKING - Document retrieval and processing
+            # This happens while the frontend shows "Thinking..." animation
+            # PHASE 2: STREAMING - Generate and stream response
+            # This happens after the frontend clears the "Thinking..." animation
+            
+            # Follow-ups are searched with a short standalone query; the history
+            # goes to the prompt as a separate, token-budgeted block
+            search_query = await query_condenser.condense(conversation_id, question, window["messages"], turn,
+                                                          summary=window["summary"])
+            
+            # Documents prefetched while the user was typing skip the embedding and search
+            with turn.stage("prefetch_lookup") as span:
+                prefetched = prefetch_cache.lookup(conversation_id, search_query, where, KB_VERSION)
+                span["match"] = prefetched["match"] if prefetched else None
+            if prefetched and prefetched["match"] == "exact":
+                query_embedding = prefetched["query_embedding"]
+            else:
+                # Reuse the router's embedding when the search query is the bare question
+                query_embedding = intent["query_embedding"] if search_query == question else None
+            
+            # Without history the answer depends only on the question, so identical
+            # turns in flight at the same time share one retrieval and one LLM stream
+            flight_key = (None if window["messages"] or window["summary"]
+                          else rag_flight_key(question, where, intent["reason"], corrected_similarity))
+            events = stream_coalescer.stream(
+                flight_key, turn,
+                lambda flight_turn: rag_answer_events(
+                    search_query, question, flight_turn,
+                    history=history_block(window["messages"], summary=window["summary"]),
+                    query_embedding=query_embedding,
+                    where=where,
+                    hits=prefetched["hits"] if prefetched else None,
+                    intent_reason=intent["reason"],
+                    corrected_similarity=corrected_similarity
+                )
+            )
+            try:
+                async for event in events:
+                    if event["type"] == "documents":
+                        chunk_ids, model = event["chunk_ids"], event["model"]
+                        metadata["route"] = event["route"]
+                        # Signal that thinking is complete and the answer will start
+                        yield {"type": "thinking_complete"}
+                    else:
+                        full_response += event["token"]
+                        yield {"type": "token", "token": event["token"]}
+            finally:
+                await events.aclose()
+            metadata["coalesced"] = turn.path == "coalesced"
+    
+    # Add both user question and bot response to conversation AFTER processing
+    with turn.stage("persistence"):
+        await save_turn(conversation_id, question, full_response)
+    turn.finish()
+    
+    # Record the trace locally and in Langfuse (don't fail the answer if this fails)
+    trace_id = None
+    try:
+        # Appends to the shared trace log under its file lock
+        trace_id = await asyncio.to_thread(record_trace, conversation_id, session_id, question, full_response,
+                                           metadata=metadata, model=model, turn=turn, chunk_ids=chunk_ids)
+    except Exception as e:
+        print(f"[WARNING] Trace recording failed: {e}")
+    
+    yield {"type": "done", "full_response": full_response, "trace_id": trace_id}
+
 @router.post("/chat")
 async def chat(request: Request):
-    """Chat endpoint: returns full answer from vectorstore."""
+    """Chat endpoint: returns the full answer (the streaming pipeline, collected)."""
     data = await request.json()
+    try:
+        where = parse_filters(data.get("filters"))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    try:
+        ticket = await admission_controller.acquire(admission_key(request, data.get("user_id")))
+    except AdmissionRejected as e:
+        return admission_rejected(e)
+    try:
+        return await answer_chat(request, data, where)
+    finally:
+        ticket.release()
+
+async def answer_chat(request: Request, data: dict, where: dict = None):
+    """One admitted /chat turn."""
     question = data.get("question", "")
     user_id = data.get("user_id")
     session_id = data.get("session_id", str(uuid.uuid4()))
@@ -145,55 +388,10 @@ async def chat(request: Request):
     # Use user_id if provided, otherwise fall back to session_id for backward compatibility
     conversation_id = user_id if user_id else session_id
 
-    # FIRST: Check if we have a corrected response for this question
-    corrected_answer = find_similar_corrected_response(question)
-    
-    if corrected_answer:
-        # Use the corrected response
-        answer = corrected_answer
-    # Check if this is a conversational query
-    elif is_conversational_query(question):
-        # Handle conversational queries directly without document retrieval
-        from langchain_openai import ChatOpenAI
-        from langchain_core.prompts import ChatPromptTemplate
-        
-        llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.7)
-        
-        # Simple conversational prompt
-        conversational_prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a friendly and helpful AI assistant. Respond naturally to conversational queries like greetings, 'how are you', etc. Be warm and engaging."),
-            ("human", "{question}")
-        ])
-        
-        # Get conversation context for continuity
-        conversation_context = await get_conversation_context(conversation_id)
-        enhanced_query = f"{conversation_context}\n\nUser: {question}" if conversation_context else question
-        
-        chain = conversational_prompt | llm
-        result = chain.invoke({"question": enhanced_query})
-        answer = result.content
-    else:
-        # Handle informational queries with document retrieval
-        conversation_context = await get_conversation_context(conversation_id)
-        enhanced_query = f"{conversation_context}\n\nUser: {question}" if conversation_context else question
-        result = qa_chain.invoke({"query": enhanced_query})
-        answer = result["result"]
-
-    # Add both user question and bot response to conversation AFTER processing
-    await add_to_conversation(conversation_id, "user", question)
-    await add_to_conversation(conversation_id, "assistant", answer)
-
-    # Log to Langfuse for observability
-    trace_id = langfuse_tracker.create_trace(
-        user_id=conversation_id,
-        question=question,
-        answer=answer,
-        session_id=session_id,
-        metadata={
-            "endpoint": "/chat",
-            "conversational_query": is_conversational_query(question)
-        }
-    )
+    answer, trace_id = "", None
+    async for event in chat_events(request, question, conversation_id, session_id, where, endpoint="/chat"):
+        if event["type"] == "done":
+            answer, trace_id = event["full_response"], event["trace_id"]
 
     clean_answer = preserve_markdown(answer)
     return {"answer": clean_answer, "user_id": user_id, "session_id": session_id, "trace_id": trace_id}
@@ -206,192 +404,44 @@ async def chat_stream(request: Request):
     question = data.get("question", "")
     user_id = data.get("user_id")
     session_id = data.get("session_id", str(uuid.uuid4()))
+    try:
+        where = parse_filters(data.get("filters"))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
 
     # Use user_id if provided, otherwise fall back to session_id for backward compatibility
     conversation_id = user_id if user_id else session_id
 
+    # Take an admission slot before streaming starts; it is held until the stream ends
+    try:
+        ticket = await admission_controller.acquire(admission_key(request, user_id))
+    except AdmissionRejected as e:
+        return admission_rejected(e)
+
     async def generate_stream():
+        events = chat_events(request, question, conversation_id, session_id, where, endpoint="/chat/stream")
         try:
-            # FIRST: Check if we have a corrected response for this question
-            corrected_answer = find_similar_corrected_response(question)
-            
-            if corrected_answer:
-                # Use the corrected response
-                yield f"data: {json.dumps({'type': 'thinking_complete'})}\n\n"
-                
-                # Stream the corrected answer token by token
-                full_response = corrected_answer
-                for i, char in enumerate(corrected_answer):
-                    yield f"data: {json.dumps({'token': char, 'type': 'token'})}\n\n"
-                    if i % 5 == 0:  # Add slight delay every 5 characters
-                        await asyncio.sleep(0.01)
-                
-                # Add to conversation
-                await add_to_conversation(conversation_id, "user", question)
-                await add_to_conversation(conversation_id, "assistant", full_response)
-                
-                # Log to Langfuse
-                trace_id = None
-                try:
-                    trace_id = langfuse_tracker.create_trace(
-                        user_id=conversation_id,
-                        question=question,
-                        answer=full_response,
-                        session_id=session_id,
-                        metadata={
-                            "endpoint": "/chat/stream",
-                            "used_corrected_response": True
-                        }
-                    )
-                except Exception as e:
-                    print(f"Warning: Langfuse logging failed: {e}")
-                
-                yield f"data: {json.dumps({'type': 'done', 'full_response': full_response, 'trace_id': trace_id})}\n\n"
-                return
-            
-            # Get conversation context BEFORE adding current question
-            conversation_context = await get_conversation_context(conversation_id)
-
-            # Combine question with conversation context for better continuity
-            enhanced_query = f"{conversation_context}\n\nUser: {question}" if conversation_context else question
-            
-            # Check if this is a conversational query
-            is_conv = is_conversational_query(question)
-            
-            if is_conv:
-                # Handle conversational queries directly without document retrieval
-                yield f"data: {json.dumps({'type': 'thinking_complete'})}\n\n"
-                
-                from langchain_openai import ChatOpenAI
-                from langchain_core.prompts import ChatPromptTemplate
-                
-                llm = ChatOpenAI(
-                    model_name="gpt-4o-mini", 
-                    streaming=True, 
-                    temperature=0.7,
-                    max_tokens=500
-                )
-                
-                # Simple conversational prompt
-                conversational_prompt = ChatPromptTemplate.from_messages([
-                    ("system", "You are a friendly and helpful AI assistant. Respond naturally to conversational queries like greetings, 'how are you', etc. Be warm and engaging."),
-                    ("human", "{question}")
-                ])
-                
-                # Stream the response
-                full_response = ""
-                messages = conversational_prompt.format_messages(question=enhanced_query)
-                async for chunk in llm.astream(messages):
-                    if hasattr(chunk, 'content'):
-                        token = chunk.content
-                        full_response += token
-                        yield f"data: {json.dumps({'token': token, 'type': 'token'})}\n\n"
-                        await asyncio.sleep(0.01)
-                
-                # Add to conversation
-                await add_to_conversation(conversation_id, "user", question)
-                await add_to_conversation(conversation_id, "assistant", full_response)
-                
-                # Log to Langfuse (don't block response if this fails)
-                trace_id = None
-                try:
-                    trace_id = langfuse_tracker.create_trace(
-                        user_id=conversation_id,
-                        question=question,
-                        answer=full_response,
-                        session_id=session_id,
-                        metadata={
-                            "endpoint": "/chat/stream",
-                            "conversational_query": True,
-                            "streaming": True
-                        }
-                    )
-                except Exception as e:
-                    print(f"Langfuse logging failed: {e}")
-                
-                # Send completion signal with trace_id
-                yield f"data: {json.dumps({'type': 'done', 'full_response': full_response, 'trace_id': trace_id})}\n\n"
-                return
-            
-            # PHASE 1: THINKING - Document retrieval and processing
-            # This happens while the frontend shows "Thinking..." animation
-            
-            try:
-                # Enhanced semantic search with better coverage
-                final_docs = vectorstore.similarity_search(enhanced_query, k=25)
-            except Exception as e:
-                print(f"Error during document search: {e}")
-                final_docs = []
-            
-            # Format the documents properly
-            context_text = "\n\n".join([f"Document {i+1}:\n{doc.page_content}" for i, doc in enumerate(final_docs)])
-            
-            # Send signal that thinking is complete and streaming will start
-            yield f"data: {json.dumps({'type': 'thinking_complete'})}\n\n"
-            
-            # PHASE 2: STREAMING - Generate and stream response
-            # This happens after the frontend clears the "Thinking..." animation
-            
-            # Import ChatOpenAI for document-based queries
-            from langchain_openai import ChatOpenAI
-            
-            # Create streaming LLM
-            llm = ChatOpenAI(
-                model_name="gpt-4o-mini", 
-                streaming=True, 
-                temperature=0.3,
-                max_tokens=1500
-            )
-            
-            # Create the prompt template
-            from langchain_core.prompts import ChatPromptTemplate
-            from config import SYSTEM_PROMPT
-            
-            prompt_template = ChatPromptTemplate.from_messages([
-                ("system", SYSTEM_PROMPT),
-                ("human", "Context: {context}\n\nQuestion: {question}")
-            ])
-            
-            # Stream the response with real-time streaming
-            full_response = ""
-            messages = prompt_template.format_messages(context=context_text, question=enhanced_query)
-            async for chunk in llm.astream(messages):
-                if hasattr(chunk, 'content'):
-                    token = chunk.content
-                    full_response += token
-                    yield f"data: {json.dumps({'token': token, 'type': 'token'})}\n\n"
+            async for event in events:
+                if event["type"] == "token" and event.get("replay"):
+                    # Stored answers are streamed character by character, like a live one
+                    for i, char in enumerate(event["token"]):
+                        yield f"data: {json.dumps({'token': char, 'type': 'token'})}\n\n"
+                        if i % 5 == 0:  # Add slight delay every 5 characters
+                            await asyncio.sleep(0.01)
+                elif event["type"] == "token":
+                    yield f"data: {json.dumps({'token': event['token'], 'type': 'token'})}\n\n"
                     await asyncio.sleep(0.01)  # Small delay for better streaming effect
-            
-            
-            # Add both user question and bot response to conversation AFTER processing
-            await add_to_conversation(conversation_id, "user", question)
-            await add_to_conversation(conversation_id, "assistant", full_response)
-            
-            # Log to Langfuse (don't block response if this fails)
-            trace_id = None
-            try:
-                trace_id = langfuse_tracker.create_trace(
-                    user_id=conversation_id,
-                    question=question,
-                    answer=full_response,
-                    session_id=session_id,
-                    metadata={
-                        "endpoint": "/chat/stream",
-                        "conversational_query": is_conversational_query(question),
-                        "streaming": True
-                    }
-                )
-            except Exception as e:
-                print(f"⚠️ Langfuse logging failed: {e}")
-            
-            # Send completion signal with trace_id
-            yield f"data: {json.dumps({'type': 'done', 'full_response': full_response, 'trace_id': trace_id})}\n\n"
+                else:
+                    yield f"data: {json.dumps(event)}\n\n"
             
         except Exception as e:
             print(f"❌ ERROR in generate_stream: {e}")
             import traceback
             traceback.print_exc()
             yield f"data: {json.dumps({'error': str(e), 'type': 'error'})}\n\n"
+        finally:
+            await events.aclose()
+            ticket.release()
 
     return StreamingResponse(
         generate_stream(),
@@ -400,9 +450,88 @@ async def chat_stream(request: Request):
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "Content-Type": "text/event-stream",
-        }
+        },
+        background=BackgroundTask(ticket.release)  # also frees the slot if the client left before the stream began
     )
 
+# ---------------- Speculative Prefetch Endpoint ----------------
+
+def prefetch_hits(query_embedding: list, where: dict = None) -> list:
+    """Scored chunk ids for a prefetch, with their chunks loaded into the store ahead of the send."""
+    hits = retrieval.search_ids(vectorstore, query_embedding, ROUTING_SEARCH_K, where)
+    retrieval.load_chunks(vectorstore, [chunk_id for chunk_id, _ in hits])
+    return hits
+
+@router.post("/chat/prefetch")
+async def chat_prefetch(request: Request):
+    """Warm retrieval for the question being typed (the frontend sends debounced input)."""
+    data = await request.json()
+    text = (data.get("text") or "").strip()
+    user_id = data.get("user_id")
+    conversation_id = user_id or data.get("session_id")
+    if not conversation_id:
+        return JSONResponse(status_code=400, content={"error": "user_id or session_id is required"})
+    try:
+        where = parse_filters(data.get("filters"))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    # Speculative work only: skip anything that would not be searched as typed, and yield to real turns
+    if not prefetch_cache.enabled:
+        return {"status": "skipped", "reason": "disabled"}
+    if not worth_prefetching(text):
+        return {"status": "skipped", "reason": "too_short"}
+    decision = intent_router.quick_decision(text)
+    if decision is not None and decision["intent"] != "rag":
+        return {"status": "skipped", "reason": "not_retrieval"}
+    if admission_controller.in_flight >= admission_controller.max_in_flight:
+        return {"status": "skipped", "reason": "busy"}
+
+    try:
+        ticket = await prefetch_admission.acquire(f"conversation:{conversation_id}")
+    except AdmissionRejected as e:
+        return admission_rejected(e)
+    try:
+        window = await get_conversation_window(conversation_id, with_summary=conversation_summarizer.enabled)
+        if (window["messages"] or window["summary"]) and query_condenser.enabled and is_follow_up(text):
+            # The final question will be condensed into a different search query
+            return {"status": "skipped", "reason": "follow_up"}
+        documents = await prefetch_cache.prefetch(
+            conversation_id, text, where, KB_VERSION, vectorstore.embeddings,
+            lambda query_embedding: prefetch_hits(query_embedding, where)
+        )
+        return {"status": "ready", "documents": documents}
+    except Exception as e:
+        print(f"[WARNING] Prefetch failed: {e}")
+        return {"error": str(e)}
+    finally:
+        ticket.release()
+
+# ---------------- Metrics and Operational Endpoints ----------------
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus-style per-stage latency and token metrics (this server process, labelled worker="<pid>")."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/admission")
+async def admission_status():
+    """Current admission slots, queue depth and limits (this server process)."""
+    return {**admission_controller.stats(), "prefetch": prefetch_admission.stats()}
+
+@router.get("/routing")
+async def routing():
+    """Model routing tiers, and per tier the tokens, latency and feedback of the retained traces."""
+    report = await asyncio.to_thread(lambda: routing_report(trace_store.values(), feedback_store.get_stats))
+    tiers = {name: {"model": tier["model_profile"][0], "max_tokens": tier["model_profile"][2], "k": tier["k"]}
+             for name, tier in ROUTING_TIERS.items()}
+    return {"enabled": model_router.enabled, "tiers": tiers, "report": report}
+
+@router.get("/chunk-store")
+async def chunk_store_status():
+    """Cached chunks and hit rate of the chunk store (this server process)."""
+    return chunk_store.stats()
+
 # ---------------- User Chat History Endpoints ----------------
 
 @router.get("/chat/history/{user_id}")
@@ -440,31 +569,37 @@ async def submit_feedback(request: FeedbackRequest):
             comment=request.comment
         )
         
+        # Resolve the original question and response from the local trace store
+        original_data = await get_trace_data(request.trace_id)
+        
         # Track feedback history for smart auto-correction
-        await track_feedback_history(request.trace_id, request.rating, request.comment)
+        await track_feedback_history(
+            request.trace_id, request.rating, request.comment,
+            question=original_data["question"] if original_data else None
+        )
         
-        # If thumbs down, trigger auto-correction immediately
+        # If thumbs down, queue auto-correction for the background workers
+        correction_job = None
         if request.rating == "thumbs_down":
             try:
-                # Get the original question and response from the trace
-                original_data = await get_trace_data(request.trace_id)
                 if original_data:
-                    # Trigger auto-correction
-                    corrected_response = await trigger_auto_correction_workflow(
+                    correction_job, _ = await correction_queue.submit(
                         trace_id=request.trace_id,
-                        user_query=original_data.get("question", ""),
+                        question=original_data.get("question", ""),
                         bad_response=original_data.get("response", ""),
                         user_comment=request.comment
                     )
             except Exception as e:
-                print(f"Auto-correction failed: {e}")
+                print(f"Could not queue auto-correction: {e}")
         
         if success:
             return {
                 "status": "success",
                 "message": "Feedback recorded successfully",
                 "trace_id": request.trace_id,
-                "auto_correction_triggered": request.rating == "thumbs_down"
+                "auto_correction_triggered": correction_job is not None,
+                "correction_job_id": correction_job["job_id"] if correction_job else None,
+                "correction_status": correction_job["status"] if correction_job else None
             }
         else:
             return {
@@ -475,106 +610,38 @@ async def submit_feedback(request: FeedbackRequest):
     except Exception as e:
         return {"error": f"Failed to submit feedback: {str(e)}"}
 
+@router.get("/feedback/corrections/{job_id}")
+async def get_correction_job(job_id: str):
+    """Poll the status of a queued auto-correction job."""
+    job = await correction_queue.get(job_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"error": f"Unknown correction job {job_id}"})
+    
+    return {
+        "job_id": job["job_id"],
+        "trace_id": job["trace_id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "updated_at": job.get("updated_at"),
+        "corrected_response": job.get("corrected_response")
+    }
+
 # ---------------- Auto-Correction System ----------------
 
-async def track_feedback_history(trace_id: str, rating: str, comment: str = None):
+async def track_feedback_history(trace_id: str, rating: str, comment: str = None, question: str = None):
     """Track feedback history for smart auto-correction decisions."""
     try:
-        feedback_file = "./data/feedback_history.json"
-        
-        # Load existing data
-        if os.path.exists(feedback_file):
-            with open(feedback_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        else:
-            data = {"feedback_history": {}}
-        
-        # Initialize trace data if not exists
-        if trace_id not in data["feedback_history"]:
-            data["feedback_history"][trace_id] = {
-                "negative_count": 0,
-                "positive_count": 0,
-                "total_count": 0,
-                "question_asked_before": False,
-                "feedback_history": []
-            }
-        
-        # Update counts
-        trace_data = data["feedback_history"][trace_id]
-        trace_data["total_count"] += 1
-        
-        if rating == "thumbs_down":
-            trace_data["negative_count"] += 1
-        else:
-            trace_data["positive_count"] += 1
-        
-        # Add to feedback history
-        feedback_entry = {
-            "rating": rating,
-            "comment": comment,
-            "timestamp": datetime.now().isoformat()
-        }
-        trace_data["feedback_history"].append(feedback_entry)
-        
-        # Save updated data
-        with open(feedback_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
+        # O(1) append to the feedback log under its file lock, off the event loop
+        await asyncio.to_thread(feedback_store.record, trace_id, rating, comment, question=question)
     except Exception as e:
         print(f"Error tracking feedback history: {e}")
 
-async def should_trigger_auto_correction(trace_id: str, user_comment: str = None) -> bool:
-    """Simplified auto-correction logic - more effective and predictable."""
-    try:
-        # Load feedback history
-        feedback_stats = await get_feedback_stats_for_question(trace_id)
-        negative_count = feedback_stats.get('negative_count', 0)
-        
-        # SIMPLIFIED RULES - More predictable and effective
-        
-        # Rule 1: Always correct if user provides specific feedback
-        if user_comment and len(user_comment.strip()) > 15:
-            return True
-        
-        # Rule 2: Correct if 2+ negative feedbacks (simple threshold)
-        if negative_count >= 2:
-            return True
-        
-        # Rule 3: Correct if this is a recurring problem (same question, multiple negatives)
-        if negative_count >= 1 and feedback_stats.get('question_asked_before', False):
-            return True
-        
-        # Rule 4: Don't correct for single negative feedback
-        return False
-            
-    except Exception as e:
-        print(f"Error in auto-correction logic: {e}")
-        return False
-
 async def get_feedback_stats_for_question(trace_id: str) -> dict:
     """Get feedback statistics for a question to make smart decisions."""
     try:
-        # In a real implementation, you'd query Langfuse API for feedback history
-        # For now, we'll simulate with local data
-        
-        # Check if we have feedback data for this trace
-        feedback_file = "./data/feedback_history.json"
-        
-        if os.path.exists(feedback_file):
-            with open(feedback_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Find feedback for this trace
-            trace_feedback = data.get('feedback_history', {}).get(trace_id, {})
-            return trace_feedback
-        else:
-            # No history, treat as first time
-            return {
-                'negative_count': 0,
-                'total_count': 0,
-                'question_asked_before': False
-            }
-            
+        return await asyncio.to_thread(feedback_store.get_stats, trace_id)
     except Exception as e:
         print(f"Error getting feedback stats: {e}")
         return {
@@ -583,115 +650,23 @@ async def get_feedback_stats_for_question(trace_id: str) -> dict:
             'question_asked_before': False
         }
 
-async def trigger_auto_correction(trace_id: str, user_comment: str = None):
-    """Trigger auto-correction for a thumbs down feedback."""
-    try:
-        # Get the original trace data from Langfuse
-        # For now, we'll simulate getting the original question and answer
-        # In a real implementation, you'd fetch this from Langfuse API
-        
-        # Create auto-correction prompt
-        correction_prompt = f"""
-        The user gave negative feedback (👎) on this response. Please provide a better, improved version.
-        
-        Original question: [QUESTION_PLACEHOLDER]
-        Original answer: [ANSWER_PLACEHOLDER]
-        User feedback: {user_comment or "User indicated the response was not helpful"}
-        
-        Please provide an improved response that:
-        1. Directly addresses the user's question
-        2. Is more helpful and accurate
-        3. Provides specific, actionable information
-        4. Is clear and well-structured
-        
-        Improved response:
-        """
-        
-        # Use LLM to generate improved response
-        from langchain_openai import ChatOpenAI
-        from langchain_core.prompts import ChatPromptTemplate
-        
-        llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.3)
-        
-        # For now, we'll create a generic improved response
-        # In a real implementation, you'd fetch the original Q&A from Langfuse
-        improved_response = await generate_improved_response(correction_prompt, llm)
-        
-        # Save to dataset
-        save_corrected_response(trace_id, improved_response, user_comment)
-        
-    except Exception as e:
-        print(f"Auto-correction failed: {e}")
-        raise e
-
-async def generate_improved_response(prompt: str, llm):
-    """Generate an improved response using LLM."""
-    try:
-        # Create a simple prompt template
-        template = ChatPromptTemplate.from_messages([
-            ("system", "You are an expert AI assistant. Improve the given response to be more helpful and accurate."),
-            ("human", "{prompt}")
-        ])
-        
-        chain = template | llm
-        result = chain.invoke({"prompt": prompt})
-        return result.content
-        
-    except Exception as e:
-        print(f"Error generating improved response: {e}")
-        return "I apologize, but I'm having trouble generating an improved response at the moment."
-
-def save_corrected_response(trace_id: str, corrected_response: str, user_comment: str = None):
-    """Save the corrected response to the dataset."""
-    try:
-        # Create dataset directory if it doesn't exist
-        dataset_dir = "./data/corrected_responses"
-        os.makedirs(dataset_dir, exist_ok=True)
-        
-        # Create dataset entry
-        dataset_entry = {
-            "trace_id": trace_id,
-            "corrected_response": corrected_response,
-            "user_comment": user_comment,
-            "timestamp": datetime.now().isoformat(),
-            "status": "corrected"
-        }
-        
-        # Save to JSON file
-        dataset_file = f"{dataset_dir}/corrected_responses.json"
-        
-        # Load existing data
-        if os.path.exists(dataset_file):
-            with open(dataset_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        else:
-            data = {"corrected_responses": []}
-        
-        # Add new entry
-        data["corrected_responses"].append(dataset_entry)
-        
-        # Save back to file
-        with open(dataset_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
-    except Exception as e:
-        print(f"Error saving corrected response: {e}")
-
 @router.get("/dataset/corrected-responses")
-async def get_corrected_responses():
-    """Get all corrected responses from the dataset."""
+async def get_corrected_responses(offset: int = 0, limit: int = 100):
+    """Page through corrected responses, streaming the dataset instead of loading it."""
     try:
-        dataset_file = "./data/corrected_responses/corrected_responses.json"
-        
-        if not os.path.exists(dataset_file):
-            return {"corrected_responses": [], "count": 0}
-        
-        with open(dataset_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        page = []
+        for i, record in enumerate(correction_dataset.iter_records()):
+            if i < offset:
+                continue
+            if len(page) >= limit:
+                break
+            page.append(record)
         
         return {
-            "corrected_responses": data.get("corrected_responses", []),
-            "count": len(data.get("corrected_responses", []))
+            "corrected_responses": page,
+            "count": correction_dataset.stats()["count"],
+            "offset": offset,
+            "limit": limit
         }
         
     except Exception as e:
@@ -701,10 +676,7 @@ async def get_corrected_responses():
 async def clear_corrected_responses():
     """Clear all corrected responses from the dataset."""
     try:
-        dataset_file = "./data/corrected_responses/corrected_responses.json"
-        
-        if os.path.exists(dataset_file):
-            os.remove(dataset_file)
+        if correction_dataset.clear():
             return {"message": "Corrected responses dataset cleared"}
         else:
             return {"message": "No dataset found to clear"}
@@ -712,6 +684,26 @@ async def clear_corrected_responses():
     except Exception as e:
         return {"error": f"Failed to clear dataset: {str(e)}"}
 
+# ---------------- Retrieval Source Weighting ----------------
+
+class SourceConfigUpdate(BaseModel):
+    enabled: bool = None
+    weights: dict = None
+    k: dict = None
+
+@router.get("/retrieval/sources")
+async def get_source_config():
+    """Current per-source retrieval weights and sub-query sizes."""
+    return source_config.get()
+
+@router.put("/retrieval/sources")
+async def update_source_config(update: SourceConfigUpdate):
+    """Update per-source weights / k, or toggle per-source fan-out."""
+    try:
+        return source_config.update(enabled=update.enabled, weights=update.weights, k=update.k)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
 # ---------------- Manual Fine-Tuning System ----------------
 
 @router.post("/fine-tuning/trigger")
@@ -763,23 +755,19 @@ async def get_fine_tuning_status():
 async def check_dataset_quality():
     """Check if dataset is ready for fine-tuning."""
     try:
-        dataset_file = "./data/corrected_responses/corrected_responses.json"
+        # Counts come from the dataset's sidecar index, not a full read
+        stats = correction_dataset.stats()
+        current_count = stats["count"]
+        min_required = 10  # Minimum samples needed
         
-        if not os.path.exists(dataset_file):
+        if current_count == 0:
             return {
                 "ready_for_training": False,
                 "current_count": 0,
-                "min_required": 10,
+                "min_required": min_required,
                 "recommendations": ["Collect more negative feedback data"]
             }
         
-        with open(dataset_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        corrected_responses = data.get("corrected_responses", [])
-        current_count = len(corrected_responses)
-        min_required = 10  # Minimum samples needed
-        
         # Quality checks
         quality_score = 0
         recommendations = []
@@ -790,19 +778,14 @@ async def check_dataset_quality():
             recommendations.append(f"Need {min_required - current_count} more samples")
         
         # Check for diverse feedback
-        unique_questions = len(set([item.get("original_question", "") for item in corrected_responses]))
+        unique_questions = stats["unique_questions"]
         if unique_questions >= 5:
             quality_score += 30
         else:
             recommendations.append("Need more diverse question types")
         
         # Check for recent data
-        recent_count = 0
-        for item in corrected_responses:
-            timestamp = datetime.fromisoformat(item.get("timestamp", ""))
-            if (datetime.now() - timestamp).days <= 7:
-                recent_count += 1
-        
+        recent_count = stats["recent_count"]
         if recent_count >= 3:
             quality_score += 30
         else:
@@ -846,10 +829,9 @@ async def start_fine_tuning_process():
             "progress": 0
         }
         
-        # Save training status
+        # Save training status (atomically: other workers may be reading it)
         status_file = "./data/fine_tuning_status.json"
-        with open(status_file, 'w', encoding='utf-8') as f:
-            json.dump(training_status, f, indent=2, ensure_ascii=False)
+        atomic_write_json(status_file, training_status, indent=2)
         
         return training_status
         
@@ -896,13 +878,17 @@ async def get_fine_tuning_recommendations():
 # ---------------- Auto-Correction Workflow ----------------
 
 async def get_trace_data(trace_id: str):
-    """Get original question and response from trace data."""
+    """Get original question and response from the local trace store."""
     try:
-        # In a real implementation, you would retrieve this from Langfuse
-        # For now, we'll simulate it
+        trace = trace_store.get(trace_id)
+        if not trace:
+            print(f"[WARNING] Trace {trace_id} not found in local trace store")
+            return None
         return {
-            "question": "Sample question from trace",
-            "response": "Sample response from trace"
+            "question": trace["question"],
+            "response": trace["answer"],
+            "model": trace.get("model"),
+            "chunk_ids": trace.get("chunk_ids", [])
         }
     except Exception as e:
         print(f"Error retrieving trace data: {e}")
@@ -926,102 +912,71 @@ async def trigger_auto_correction_workflow(trace_id: str, user_query: str, bad_r
         print(f"Auto-correction workflow failed: {e}")
         raise e
 
+async def run_correction_job(job: dict) -> str:
+    """Correction queue handler: run the workflow for one queued job."""
+    return await trigger_auto_correction_workflow(
+        trace_id=job["trace_id"],
+        user_query=job["question"],
+        bad_response=job["bad_response"],
+        user_comment=job.get("user_comment")
+    )
+
+def correction_chunks(user_query: str, k: int = 25) -> list:
+    """Top-k chunks for an auto-correction (blocking: embeds the question)."""
+    hits = retrieval.search_ids(vectorstore, vectorstore.embeddings.embed_query(user_query), k)
+    return retrieval.load_chunks(vectorstore, [chunk_id for chunk_id, _ in hits])
+
 async def generate_improved_response(user_query: str, bad_response: str, user_comment: str = None):
-    """Use LLM with RAG to generate an improved response using the knowledge base."""
-    try:
-        from langchain_openai import ChatOpenAI
-        
-        # CRITICAL: Retrieve relevant documents from vectorstore for context
-        # This ensures the corrected response is based on actual knowledge base
-        relevant_docs = vectorstore.similarity_search(user_query, k=25)
-        
-        # Format the retrieved documents as context
-        context_text = "\n\n".join([f"Document {i+1}:\n{doc.page_content}" for i, doc in enumerate(relevant_docs)])
-        
-        # Create LLM for auto-correction
-        llm = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            temperature=0.3,
-            max_tokens=1000
-        )
-        
-        # Create auto-correction prompt WITH knowledge base context
-        correction_prompt = f"""
-You are an expert assistant specializing in Slack to Microsoft Teams migrations via CloudFuze.
-
-KNOWLEDGE BASE CONTEXT:
-{context_text}
-
-PREVIOUS INTERACTION:
-User's Question: "{user_query}"
-Bot's Poor Response: "{bad_response}"
-{f"User's Feedback: {user_comment}" if user_comment else ""}
-
-TASK:
-Using ONLY the information from the KNOWLEDGE BASE CONTEXT above, provide a much better, more accurate, and helpful response that:
-1. Directly answers the user's question about Slack to Teams migration
-2. Uses specific information from the knowledge base documents
-3. Provides actionable information about CloudFuze's capabilities
-4. Is clear, professional, and helpful
-5. Follows the same style and formatting as the system prompt
-
-IMPORTANT: Base your answer strictly on the knowledge base context provided above.
-
-Improved response:
-"""
-        
-        # Generate improved response with knowledge base context
-        improved_response = llm.invoke(correction_prompt).content
-        return improved_response
-        
-    except Exception as e:
-        print(f"Error generating improved response: {e}")
-        return f"I apologize for the previous response. Let me provide a better answer to your question: {user_query}. For detailed information about Slack to Teams migration, please contact our CloudFuze support team."
+    """Use LLM with RAG to generate an improved response using the knowledge base.
+    
+    Errors propagate so the correction queue can retry instead of saving a fallback answer.
+    """
+    # CRITICAL: Retrieve relevant documents from vectorstore for context
+    # This ensures the corrected response is based on actual knowledge base
+    chunks = await asyncio.to_thread(correction_chunks, user_query)
+    
+    # Same cached snippets as the chat path
+    context_text, _ = chunk_store.context(chunks)
+    
+    # Shared LLM for auto-correction
+    llm = model_registry.get_profile(CORRECTION_MODEL_PROFILE)
+    
+    # Create auto-correction prompt WITH knowledge base context
+    correction_prompt = CORRECTION_PROMPT.format_messages(
+        context=context_text,
+        user_query=user_query,
+        bad_response=bad_response,
+        feedback_line=f"User's Feedback: {user_comment}" if user_comment else ""
+    )
+    
+    # Generate improved response with knowledge base context
+    result = await llm.ainvoke(correction_prompt)
+    return result.content
 
 async def save_correction_to_dataset(user_query: str, bad_response: str, improved_response: str, trace_id: str, user_comment: str = None):
     """Save the correction to JSONL dataset."""
     try:
-        import os
-        from datetime import datetime
-        
-        # Create dataset directory if it doesn't exist
-        dataset_dir = "./data/fine_tuning_dataset"
-        os.makedirs(dataset_dir, exist_ok=True)
-        
-        # Create JSONL record
-        correction_record = {
-            "input": user_query,
-            "bad_output": bad_response,
-            "corrected_output": improved_response,
-            "trace_id": trace_id,
-            "user_comment": user_comment,
-            "timestamp": datetime.now().isoformat(),
-            "status": "auto_corrected"
-        }
-        
-        # Save to single JSONL file (append mode)
-        jsonl_file = f"{dataset_dir}/corrections.jsonl"
-        
-        with open(jsonl_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(correction_record, ensure_ascii=False) + '\n')
-        
-        # Also save to the existing corrected_responses.json for compatibility
-        save_corrected_response(trace_id, improved_response, user_comment)
-        
+        # One append to the unified dataset; its index serves both lookups and stats
+        correction_dataset.append(
+            trace_id,
+            improved_response,
+            question=user_query,
+            bad_output=bad_response,
+            user_comment=user_comment
+        )
     except Exception as e:
         print(f"Error saving correction to dataset: {e}")
 
 async def update_langfuse_trace(trace_id: str, improved_response: str):
     """Update Langfuse trace with corrected response."""
     try:
-        if langfuse_tracker and langfuse_tracker.client:
-            # Log the auto-correction as a score/annotation
-            langfuse_tracker.client.score(
-                trace_id=trace_id,
-                name="auto_correction",
-                value=1,
-                comment=f"Auto-corrected response: {improved_response[:200]}..."
-            )
+        # Log the auto-correction as a score/annotation (queued, non-blocking)
+        langfuse_tracker.add_score(
+            trace_id=trace_id,
+            name="auto_correction",
+            value=1,
+            comment=f"Auto-corrected response: {improved_response[:200]}..."
+        )
     except Exception as e:
         print(f"Could not update Langfuse trace: {e}")
 
@@ -1046,60 +1001,27 @@ async def test_post_endpoint(data: dict):
 async def microsoft_oauth_callback(request: MicrosoftCallbackRequest):
     """Handle Microsoft OAuth callback and exchange code for tokens."""
     try:
-        # Get Microsoft OAuth configuration
-        client_id = MICROSOFT_CLIENT_ID
-        client_secret = MICROSOFT_CLIENT_SECRET
-        tenant = MICROSOFT_TENANT
-        
-        # Exchange authorization code for access token
-        token_url = f"https://login.microsoftonline.com/{tenant}/oauth2/v2.0/token"
-        
-        token_data = {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "code": request.code,
-            "redirect_uri": request.redirect_uri,
-            "code_verifier": request.code_verifier,
-            "grant_type": "authorization_code"
-        }
-        
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post(token_url, data=token_data)
-            
-            if token_response.status_code != 200:
-                return {"error": "Failed to exchange code for token", "details": token_response.text}
-            
-            token_info = token_response.json()
-            access_token = token_info.get("access_token")
-            
-            if not access_token:
-                return {"error": "No access token received"}
-            
-            # Get user information from Microsoft Graph
-            graph_response = await client.get(
-                "https://graph.microsoft.com/v1.0/me",
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
-            
-            if graph_response.status_code != 200:
-                return {"error": "Failed to get user information", "details": graph_response.text}
-            
-            user_info = graph_response.json()
-            
-            # Create user ID from Microsoft user ID
-            user_id = user_info.get("id")
-            user_name = user_info.get("displayName", "User")
-            user_email = user_info.get("mail") or user_info.get("userPrincipalName", "")
-            
-            result = {
-                "user_id": user_id,
-                "name": user_name,
-                "email": user_email,
-                "access_token": access_token,
-                "refresh_token": token_info.get("refresh_token", "")
-            }
-            
-            return result
-            
+        return await microsoft_auth.login(
+            code=request.code,
+            redirect_uri=request.redirect_uri,
+            code_verifier=request.code_verifier
+        )
+    except MicrosoftAuthError as e:
+        if e.details:
+            return {"error": e.message, "details": e.details}
+        return {"error": e.message}
+    except Exception as e:
+        return {"error": f"OAuth callback failed: {str(e)}"}
+
+@router.get("/auth/microsoft/profile")
+async def microsoft_profile(authorization: str = Header(None)):
+    """Return the signed-in user's profile from the server-side cache."""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return JSONResponse(status_code=401, content={"error": "Missing bearer token"})
+    
+    try:
+        return await microsoft_auth.get_profile(authorization[7:].strip())
+    except MicrosoftAuthError as e:
+        return JSONResponse(status_code=401, content={"error": e.message, "details": e.details})
     except Exception as e:
-        return {"error": f"OAuth callback failed: {str(e)}"}
\ No newline at end of file
+        return JSONResponse(status_code=502, content={"error": f"Profile lookup failed: {str(e)}"})
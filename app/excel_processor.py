@@ -118,6 +118,7 @@ def process_excel_directory(excel_directory: str) -> List[Document]:
                         "source": excel_file,
                         "source_type": source_type,
                         "file_path": excel_path,
+                        "modified_at": int(os.path.getmtime(excel_path)),
                         "file_format": excel_file.split('.')[-1].lower(),
                         "content_type": "excel_data",
                         "searchable_terms": " ".join(text.split()[:20])  # Add first 20 words for better searchability
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only feedback history store.
+
+Every thumbs-up/down is appended as one JSON line to ``feedback_history.jsonl``
+and folded into an in-memory per-trace index, so recording feedback and looking
+up a trace's counters are O(1) regardless of history size. Compaction rewrites
+the log as one snapshot line per trace on a background thread once it has grown
+well past the number of traces.
+
+The log is shared by all server workers (``app.shared_files.SharedLog``):
+appends are serialized with a file lock and each worker folds in the lines the
+others appended before answering.
+
+The legacy ``feedback_history.json`` (one big dict rewritten on every click) is
+migrated into the log the first time the store loads.
+"""
+
+import json
+import os
+import re
+import threading
+from copy import deepcopy
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.shared_files import SharedLog
+
+FEEDBACK_LOG_FILE = "./data/feedback_history.jsonl"
+LEGACY_FEEDBACK_FILE = "./data/feedback_history.json"
+
+# Compact when the log holds this many more lines than there are traces
+COMPACT_MIN_LINES = 1000
+COMPACT_RATIO = 2
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace for question matching."""
+    return " ".join(re.sub(r"[^\w\s]", " ", (question or "").lower()).split())
+
+
+def _empty_stats() -> Dict[str, Any]:
+    return {
+        "negative_count": 0,
+        "positive_count": 0,
+        "total_count": 0,
+        "question_asked_before": False,
+        "feedback_history": []
+    }
+
+
+class FeedbackStore:
+    """JSONL feedback log plus an in-memory index keyed by trace_id."""
+
+    def __init__(self, log_path: str = FEEDBACK_LOG_FILE, legacy_path: str = LEGACY_FEEDBACK_FILE):
+        self.log_path = log_path
+        self.legacy_path = legacy_path
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._questions: Dict[str, set] = {}  # normalized question -> trace ids
+        self._log = SharedLog(log_path)
+        self._log_lines = 0
+        self._compacting = False
+
+    # ---------------- Loading ----------------
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            with self._log.locked():
+                self._sync_locked()
+                self._migrate_legacy()
+            self._loaded = True
+
+    def _sync_locked(self):
+        """Fold in lines other workers appended; rebuild if the log was rewritten."""
+        reset, records = self._log.read_new()
+        if reset:
+            self._index, self._questions, self._log_lines = {}, {}, 0
+        for _, record in records:
+            self._apply(record)
+        self._log_lines += len(records)
+
+    def _sync(self):
+        self._ensure_loaded()
+        if self._log.changed():
+            with self._lock, self._log.locked(shared=True):
+                self._sync_locked()
+
+    def _migrate_legacy(self):
+        """Fold the old whole-file JSON history into the log, then move it aside."""
+        if not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            for trace_id, stats in legacy.get("feedback_history", {}).items():
+                if trace_id not in self._index:
+                    self._write({"type": "snapshot", "trace_id": trace_id, **stats})
+            os.replace(self.legacy_path, self.legacy_path + ".migrated")
+            print(f"[OK] Migrated legacy feedback history into {self.log_path}")
+        except Exception as e:
+            print(f"[WARNING] Could not migrate legacy feedback history: {e}")
+
+    # ---------------- Index maintenance ----------------
+
+    def _apply(self, record: Dict[str, Any]):
+        trace_id = record.get("trace_id")
+        if not trace_id:
+            return
+        if record.get("type") == "snapshot":
+            stats = {**_empty_stats(), **{k: v for k, v in record.items() if k not in ("type", "trace_id")}}
+            self._index[trace_id] = stats
+            self._link_question(trace_id, stats)
+            return
+
+        stats = self._index.get(trace_id)
+        if stats is None:
+            stats = self._index[trace_id] = _empty_stats()
+        stats["total_count"] += 1
+        if record.get("rating") == "thumbs_down":
+            stats["negative_count"] += 1
+        else:
+            stats["positive_count"] += 1
+        stats["feedback_history"].append({
+            "rating": record.get("rating"),
+            "comment": record.get("comment"),
+            "timestamp": record.get("timestamp")
+        })
+        if record.get("question") and not stats.get("question"):
+            stats["question"] = record["question"]
+        self._link_question(trace_id, stats)
+
+    def _link_question(self, trace_id: str, stats: Dict[str, Any]):
+        normalized = normalize_question(stats.get("question", ""))
+        if not normalized:
+            return
+        traces = self._questions.setdefault(normalized, set())
+        traces.add(trace_id)
+        if len(traces) > 1:
+            for other_id in traces:
+                self._index[other_id]["question_asked_before"] = True
+
+    def _write(self, record: Dict[str, Any]):
+        """Append and apply one record (thread lock and exclusive file lock held)."""
+        self._log.append(record)
+        self._log_lines += 1
+        self._apply(record)
+
+    # ---------------- Public API ----------------
+
+    def record(self, trace_id: str, rating: str, comment: Optional[str] = None,
+               question: Optional[str] = None) -> Dict[str, Any]:
+        """Append one feedback event and return the trace's updated counters."""
+        self._ensure_loaded()
+        record = {
+            "trace_id": trace_id,
+            "rating": rating,
+            "comment": comment,
+            "timestamp": datetime.now().isoformat()
+        }
+        if question:
+            record["question"] = question
+        with self._lock, self._log.locked():
+            self._sync_locked()
+            self._write(record)
+            stats = deepcopy(self._index[trace_id])
+        self._maybe_compact()
+        return stats
+
+    def get_stats(self, trace_id: str) -> Dict[str, Any]:
+        """Counters and history for one trace (empty stats if never rated)."""
+        self._sync()
+        with self._lock:
+            stats = self._index.get(trace_id)
+            return deepcopy(stats) if stats else _empty_stats()
+
+    def __len__(self) -> int:
+        self._sync()
+        return len(self._index)
+
+    # ---------------- Compaction ----------------
+
+    def _maybe_compact(self):
+        with self._lock:
+            if self._compacting:
+                return
+            if self._log_lines < COMPACT_MIN_LINES or self._log_lines < COMPACT_RATIO * len(self._index):
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="feedback-compaction", daemon=True).start()
+
+    def compact(self):
+        """Rewrite the log as one snapshot per trace, keeping appends made meanwhile."""
+        self._sync()
+        with self._lock:
+            self._compacting = True
+            snapshot = deepcopy(self._index)
+            snapshot_position, snapshot_lines = self._log.position(), self._log_lines
+
+        try:
+            with self._lock, self._log.locked():
+                # Lines appended after the snapshot (by any worker) are carried over
+                self._sync_locked()
+                if self._log.rewrite(({"type": "snapshot", "trace_id": trace_id, **stats}
+                                      for trace_id, stats in snapshot.items()), since=snapshot_position):
+                    self._log_lines = len(snapshot) + self._log_lines - snapshot_lines
+        except Exception as e:
+            print(f"[WARNING] Feedback log compaction failed: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+
+# Global store
+feedback_store = FeedbackStore()
@@ -1,16 +1,18 @@
 import os
+import time
 import requests
 import json
 import markdown
 from bs4 import BeautifulSoup
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
 from config import CHROMA_DB_PATH, BLOG_POSTS_PER_PAGE, BLOG_MAX_PAGES
 from app.pdf_processor import process_pdf_directory, chunk_pdf_documents
 from app.excel_processor import process_excel_directory, chunk_excel_documents
 from app.doc_processor import process_doc_directory, chunk_doc_documents
+from app.llm import model_registry
+from app.chroma_index import hnsw_metadata
 
 
 def fetch_posts(base_url: str, per_page=10, max_pages=6):
@@ -39,8 +41,12 @@ def fetch_posts(base_url: str, per_page=10, max_pages=6):
 
 def load_webpage(url: str):
     """Fetch posts from WordPress API and return raw text."""
+    # Local JSON export of posts (same shape as the WordPress API response)
+    if os.path.isfile(url):
+        with open(url, 'r', encoding='utf-8') as f:
+            data = json.load(f)
     # Check if URL contains pagination parameters to determine if we should use pagination
-    if "per_page=" in url and "page=" in url:
+    elif "per_page=" in url and "page=" in url:
         # Single page request - use original method
         response = requests.get(url)
         data = response.json()
@@ -71,6 +77,14 @@ def preserve_markdown(md_text: str) -> str:
     # Return the clean Markdown text (don't convert to HTML)
     return clean_text
 
+def tag_web_documents(docs):
+    """Source metadata for blog chunks, filterable the same way as file chunks."""
+    fetched_at = int(time.time())
+    for doc in docs:
+        doc.metadata["source_type"] = "web"
+        doc.metadata["source"] = "cloudfuze_blog"
+        doc.metadata["modified_at"] = fetched_at
+
 def build_vectorstore(url: str):
     """Build and persist embeddings for web documents."""
     raw_text = load_webpage(url)
@@ -88,8 +102,10 @@ def build_vectorstore(url: str):
         separators=["\n\n", "\n", ". ", " ", ""]  # Smart splitting by paragraphs, sentences
     )
     docs = splitter.create_documents([clean_text])
-    embeddings = OpenAIEmbeddings()
-    vectorstore = Chroma.from_documents(docs, embeddings, persist_directory=CHROMA_DB_PATH)
+    tag_web_documents(docs)
+    embeddings = model_registry.embeddings()
+    vectorstore = Chroma.from_documents(docs, embeddings, persist_directory=CHROMA_DB_PATH,
+                                        collection_metadata=hnsw_metadata())
     return vectorstore
 
 def build_combined_vectorstore(url: str, pdf_directory: str, excel_directory: str = None, doc_directory: str = None):
@@ -112,9 +128,7 @@ def build_combined_vectorstore(url: str, pdf_directory: str, excel_directory: st
     web_docs = web_splitter.create_documents([clean_text])
     
     # Add source metadata to web docs
-    for doc in web_docs:
-        doc.metadata["source_type"] = "web"
-        doc.metadata["source"] = "cloudfuze_blog"
+    tag_web_documents(web_docs)
     
     print("Processing PDF documents...")
     pdf_docs = process_pdf_directory(pdf_directory)
@@ -147,8 +161,9 @@ def build_combined_vectorstore(url: str, pdf_directory: str, excel_directory: st
     print(f"  - Word documents: {len(doc_chunks)}")
     
     # Create embeddings and vectorstore
-    embeddings = OpenAIEmbeddings()
-    vectorstore = Chroma.from_documents(all_docs, embeddings, persist_directory=CHROMA_DB_PATH)
+    embeddings = model_registry.embeddings()
+    vectorstore = Chroma.from_documents(all_docs, embeddings, persist_directory=CHROMA_DB_PATH,
+                                        collection_metadata=hnsw_metadata())
     
     print("Combined knowledge base created successfully!")
     return vectorstore
\ No newline at end of file
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Intent router: decides once per request how a chat message is answered.
+
+- ``canned``: the whole message is a greeting, thanks or goodbye. Answered
+  from a template, no LLM call. Bare "yes" / "no" / "ok" are not canned: they
+  usually answer the assistant's own question and need the history.
+- ``conversational``: social or meta questions about the assistant itself.
+  Answered by the conversational model without retrieval.
+- ``rag``: everything else goes through document retrieval.
+
+A single compiled alternation regex handles the clear cases. Messages that
+only start like small talk ("can you help me move our shared channels?") are
+settled by a nearest-centroid classifier over the query embedding, and that
+embedding is handed back so retrieval can reuse it.
+"""
+
+import asyncio
+import math
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+
+# Whole-message small talk -> template reply (trailing filler and punctuation allowed)
+CANNED_RE = re.compile(
+    r"^\s*(?:"
+    r"(?P<greeting>hi|hello|hey|hiya|howdy|yo|good\s+(?:morning|afternoon|evening))"
+    r"|(?P<how_are_you>how\s+are\s+you(?:\s+doing)?|how'?re\s+you|how\s+do\s+you\s+do|what'?s\s+up|wassup)"
+    r"|(?P<thanks>thanks|thank\s+you|thx|ty|cheers)"
+    r"|(?P<goodbye>bye|goodbye|see\s+you(?:\s+later)?|farewell)"
+    r")(?:[\s,!.?]+(?:there|all|team|bot|again|so\s+much|a\s+lot|very\s+much|today))*[\s,!.?:)]*$",
+    re.IGNORECASE
+)
+
+# Conversational openers; on their own they are not proof the user is only chatting
+CONVERSATIONAL_RE = re.compile(
+    r"^\s*(?:hi|hello|hey|good\s+(?:morning|afternoon|evening)|thanks|thank\s+you"
+    r"|who\s+are\s+you|tell\s+me\s+about\s+yourself|what\s+(?:can|do)\s+you\s+do|what\s+are\s+you"
+    r"|are\s+you\s+(?:a\s+)?(?:bot|human|real)|can\s+you\s+help|help|sorry|excuse\s+me|pardon|please|pls"
+    r"|yes|no|ok|okay|sure|alright|nice|good|great|awesome|cool|wow|perfect|got\s+it)\b",
+    re.IGNORECASE
+)
+
+# Product vocabulary: any of these means the user wants knowledge-base answers
+DOMAIN_RE = re.compile(
+    r"\b(?:slack|teams|microsoft|migrat\w*|cloudfuze|channels?|messages?|workspaces?|tenants?|files?"
+    r"|attachments?|threads?|users?|emojis?|pric\w*|cost|licen[cs]\w*|export\w*|import\w*|onedrive|sharepoint"
+    r"|guests?|admins?|permissions?|dms?|reactions?|integrations?|apps?|bots?|delta|cutover|timeline)\b",
+    re.IGNORECASE
+)
+
+QUESTION_WORD_RE = re.compile(r"\b(?:what|how|why|when|where|who|which)\b", re.IGNORECASE)
+SHORT_MESSAGE_CHARS = 10  # "lol", "hmm ok": chat, unless it names a product term
+
+CANNED_REPLIES = {
+    "greeting": "Hello! 👋 I'm the CloudFuze assistant. Ask me anything about migrating from Slack to Microsoft Teams.",
+    "how_are_you": "I'm doing great, thanks for asking! How can I help with your Slack to Teams migration today?",
+    "thanks": "You're welcome! Let me know if there's anything else you'd like to know about your migration.",
+    "goodbye": "Goodbye! Feel free to come back any time you have migration questions.",
+}
+
+# Prototype utterances for the embedding classifier
+CONVERSATIONAL_EXAMPLES = [
+    "who are you", "tell me about yourself", "what can you do", "are you a bot",
+    "are you a real person", "what is your name", "how can you help me", "can you help me",
+    "what are you able to answer", "nice to meet you", "you are very helpful",
+    "sorry I did not mean that", "that was a great answer", "I have a question",
+]
+INFORMATIONAL_EXAMPLES = [
+    "can you help me migrate slack channels to teams", "how do I move private channels",
+    "help me understand how direct messages are migrated", "what does the migration cost",
+    "please explain how file attachments are handled", "how long does a migration take",
+    "are emoji reactions preserved", "can you migrate guest accounts",
+    "what happens to threaded replies", "do you support delta migration",
+    "tell me about user mapping", "how are permissions transferred",
+]
+
+CLASSIFIER_MARGIN = 0.02  # Conversational centroid must win by this much
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _centroid(vectors: List[List[float]]) -> List[float]:
+    return _normalize([sum(values) / len(vectors) for values in zip(*vectors)])
+
+
+def _dot(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+class IntentRouter:
+    """Regex fast path plus a nearest-centroid classifier over query embeddings."""
+
+    def __init__(self, embeddings=None):
+        self.embeddings = embeddings
+        self._centroids: Optional[Dict[str, List[float]]] = None
+        self._lock = threading.Lock()
+
+    def _ensure_centroids(self) -> Dict[str, List[float]]:
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    vectors = self.embeddings.embed_documents(CONVERSATIONAL_EXAMPLES + INFORMATIONAL_EXAMPLES)
+                    split = len(CONVERSATIONAL_EXAMPLES)
+                    self._centroids = {
+                        "conversational": _centroid(vectors[:split]),
+                        "rag": _centroid(vectors[split:]),
+                    }
+        return self._centroids
+
+    def warm_up(self):
+        """Embed the prototype utterances now instead of on the first ambiguous query."""
+        if self.embeddings is not None:
+            try:
+                self._ensure_centroids()
+            except Exception as e:
+                print(f"[WARNING] Intent classifier warm-up failed: {e}")
+
+    def _regex_decision(self, text: str) -> Optional[Dict[str, Any]]:
+        """Decide from the regexes alone; None when the classifier is needed."""
+        match = CANNED_RE.match(text)
+        if match:
+            kind = match.lastgroup
+            return {"intent": "canned", "reason": "canned_regex", "canned_kind": kind,
+                    "reply": CANNED_REPLIES[kind], "query_embedding": None}
+        if not text:
+            return {"intent": "conversational", "reason": "empty", "query_embedding": None}
+        if len(text) < SHORT_MESSAGE_CHARS and not DOMAIN_RE.search(text) and not QUESTION_WORD_RE.search(text):
+            return {"intent": "conversational", "reason": "short_message", "query_embedding": None}
+        if not CONVERSATIONAL_RE.match(text):
+            return {"intent": "rag", "reason": "no_conversational_cue", "query_embedding": None}
+        if DOMAIN_RE.search(text):
+            return {"intent": "rag", "reason": "domain_terms", "query_embedding": None}
+        if self.embeddings is None:
+            return {"intent": "conversational", "reason": "conversational_regex", "query_embedding": None}
+        return None
+
+    def _classifier_decision(self, text: str) -> Dict[str, Any]:
+        """Nearest centroid over the query embedding (blocking: embeds the question)."""
+        try:
+            centroids = self._ensure_centroids()
+            query_embedding = self.embeddings.embed_query(text)
+        except Exception as e:
+            print(f"[WARNING] Intent classifier unavailable, using regex decision: {e}")
+            return {"intent": "conversational", "reason": "conversational_regex", "query_embedding": None}
+
+        unit = _normalize(query_embedding)
+        conversational_score = _dot(unit, centroids["conversational"])
+        rag_score = _dot(unit, centroids["rag"])
+        intent = "conversational" if conversational_score - rag_score > CLASSIFIER_MARGIN else "rag"
+        return {"intent": intent, "reason": "embedding_classifier", "query_embedding": query_embedding,
+                "scores": {"conversational": round(conversational_score, 4), "rag": round(rag_score, 4)}}
+
+    def quick_decision(self, question: str) -> Optional[Dict[str, Any]]:
+        """Regex-only decision (never embeds); None when the classifier would be needed."""
+        return self._regex_decision((question or "").strip())
+
+    def classify(self, question: str) -> Dict[str, Any]:
+        """Route one message (blocking)."""
+        text = (question or "").strip()
+        return self._regex_decision(text) or self._classifier_decision(text)
+
+    async def route(self, request: Request, question: str) -> Dict[str, Any]:
+        """Classify once per request; the decision is cached on request.state."""
+        decision = getattr(request.state, "intent", None)
+        if decision is None:
+            text = (question or "").strip()
+            # Only ambiguous messages pay for an embedding, off the event loop
+            decision = self._regex_decision(text) or await asyncio.to_thread(self._classifier_decision, text)
+            request.state.intent = decision
+        return decision
+
+
+# Global router; embeddings are attached in app.endpoints once the vectorstore is loaded
+intent_router = IntentRouter()
@@ -1,107 +1,260 @@
 # -*- coding: utf-8 -*-
 """
-Basic Langfuse Integration - Trace Logging Only
+Non-blocking Langfuse Integration - Batched Trace Logging
 
 This module handles logging all chat interactions to Langfuse for observability.
+Trace ids are generated locally and events are handed to a background worker
+that batches them to the Langfuse ingestion API, so tracing never adds latency
+to a chat turn. The queue is bounded; when it is full new events are dropped.
 """
 
-import os
-from datetime import datetime
-from typing import Optional, Dict, Any
-from langfuse import Langfuse
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+import httpx
 from config import LANGFUSE_PUBLIC_KEY, LANGFUSE_SECRET_KEY, LANGFUSE_HOST
 
-# Initialize Langfuse client
-try:
-    # Debug: Print the keys to see if they're loaded
-    print("[*] Langfuse keys check:")
-    print(f"   Public key: {LANGFUSE_PUBLIC_KEY[:20]}..." if LANGFUSE_PUBLIC_KEY else "   Public key: NOT_FOUND")
-    print(f"   Secret key: {LANGFUSE_SECRET_KEY[:20]}..." if LANGFUSE_SECRET_KEY else "   Secret key: NOT_FOUND")
-    print(f"   Host: {LANGFUSE_HOST}")
-    
-    if not LANGFUSE_SECRET_KEY or not LANGFUSE_PUBLIC_KEY:
-        print("[!] Langfuse keys not found, skipping initialization")
-        langfuse_client = None
-    else:
-        langfuse_client = Langfuse(
-            public_key=LANGFUSE_PUBLIC_KEY,
-            secret_key=LANGFUSE_SECRET_KEY,
-            host=LANGFUSE_HOST
-        )
-        print("[OK] Langfuse client initialized successfully")
-        print(f"   Host: {LANGFUSE_HOST}")
-except Exception as e:
-    print(f"[!] Warning: Failed to initialize Langfuse client: {e}")
-    langfuse_client = None
+logger = logging.getLogger(__name__)
+
+# Worker tuning
+MAX_QUEUE_SIZE = 10000      # Events held in memory before new ones are dropped
+BATCH_SIZE = 50             # Events per ingestion request
+FLUSH_INTERVAL = 1.0        # Seconds to wait before sending a partial batch
+MAX_RETRIES = 3             # Attempts per batch on network / 5xx / 429 errors
+RETRY_BACKOFF = 0.5         # Seconds before the first retry, doubled after each attempt
+
+_STOP = object()
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
 
 
 class LangfuseTracker:
-    """Handles Langfuse trace logging"""
-    
-    def __init__(self):
-        self.client = langfuse_client
-    
+    """Handles Langfuse trace logging through a background batching worker"""
+
+    def __init__(
+        self,
+        host: Optional[str] = LANGFUSE_HOST,
+        public_key: Optional[str] = LANGFUSE_PUBLIC_KEY,
+        secret_key: Optional[str] = LANGFUSE_SECRET_KEY,
+        max_queue_size: int = MAX_QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        retry_backoff: float = RETRY_BACKOFF
+    ):
+        self.enabled = bool(host and public_key and secret_key)
+        self.ingestion_url = f"{(host or '').rstrip('/')}/api/public/ingestion"
+        self._auth = (public_key or "", secret_key or "")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_backoff = retry_backoff
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.dropped_events = 0
+        self.failed_events = 0
+        self.sent_events = 0
+
+        if not self.enabled:
+            print("[!] Langfuse keys not found, trace logging disabled")
+
+    # ---------------- Worker lifecycle ----------------
+
+    def start(self):
+        """Start the background worker (idempotent)."""
+        if not self.enabled:
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="langfuse-ingestion", daemon=True)
+                self._thread.start()
+
+    def shutdown(self, timeout: float = 10.0):
+        """Flush pending events and stop the worker."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Langfuse queue full at shutdown, pending events dropped")
+            return
+        self._thread.join(timeout)
+        self._thread = None
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until every queued event has been sent (for scripts and tests)."""
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def _run(self):
+        with httpx.Client(auth=self._auth, timeout=httpx.Timeout(10.0, connect=5.0)) as client:
+            stopping = False
+            while not stopping:
+                batch: List[Dict[str, Any]] = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        self._queue.task_done()
+                        stopping = True
+                        break
+                    batch.append(item)
+                if batch:
+                    self._send(client, batch)
+                    for _ in batch:
+                        self._queue.task_done()
+
+    def _send(self, client: httpx.Client, batch: List[Dict[str, Any]]):
+        for attempt in range(MAX_RETRIES):
+            try:
+                response = client.post(self.ingestion_url, json={"batch": batch})
+                if response.status_code < 500 and response.status_code != 429:
+                    if response.status_code >= 400:
+                        logger.warning(f"Langfuse rejected batch ({response.status_code}): {response.text[:200]}")
+                        self.failed_events += len(batch)
+                    else:
+                        self.sent_events += len(batch)
+                    return
+            except httpx.HTTPError as e:
+                logger.debug(f"Langfuse ingestion attempt {attempt + 1} failed: {e}")
+            if attempt + 1 < MAX_RETRIES:
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        logger.warning(f"Dropping {len(batch)} Langfuse events after {MAX_RETRIES} attempts")
+        self.failed_events += len(batch)
+
+    def _enqueue(self, event_type: str, body: Dict[str, Any]) -> bool:
+        if not self.enabled:
+            return False
+        if self._thread is None:
+            self.start()
+        event = {
+            "id": str(uuid.uuid4()),
+            "type": event_type,
+            "timestamp": _now_iso(),
+            "body": body
+        }
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped_events += 1
+            return False
+
+    # ---------------- Public API ----------------
+
     def create_trace(
-        self, 
-        user_id: str, 
-        question: str, 
+        self,
+        user_id: str,
+        question: str,
         answer: str,
         session_id: Optional[str] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+        turn: Optional[Any] = None,
+        trace_id: Optional[str] = None
     ) -> Optional[str]:
         """
         Create a new trace in Langfuse for a chat interaction
-        
+
         Args:
             user_id: User identifier
             question: User's question
             answer: Bot's answer
             session_id: Session identifier
             metadata: Additional metadata
-        
+            model: Model that produced the answer (None for non-LLM answers)
+            turn: Optional app.metrics.ChatTurn with stage spans and generation stats
+            trace_id: Id to use (e.g. one already recorded in the local trace store)
+
         Returns:
-            trace_id: Unique identifier for this trace, or None if logging fails
+            trace_id: Trace identifier, or None if tracing is disabled
         """
-        if not self.client:
-            print("[!] Langfuse client not initialized, skipping trace logging")
+        if not self.enabled:
             return None
-        
-        try:
-            # Create trace with input/output at trace level for UI display
-            trace = self.client.trace(
-                name="chat_interaction",
-                user_id=user_id,
-                session_id=session_id or user_id,
-                input=question,  # Set input at trace level
-                output=answer,   # Set output at trace level
-                metadata={
-                    **(metadata or {}),
-                    "timestamp": datetime.now().isoformat(),
-                },
-                tags=["chat", "slack2teams"]
-            )
-            
-            # Also add generation span for detailed LLM metrics
-            generation = trace.generation(
-                name="chat_response",
-                model="gpt-4o-mini",
-                input=question,
-                output=answer,
-                metadata={
-                    "timestamp": datetime.now().isoformat(),
-                    "user_id": user_id
+
+        trace_id = trace_id or str(uuid.uuid4())
+        timestamp = _now_iso()
+
+        # Trace with input/output at trace level for UI display
+        self._enqueue("trace-create", {
+            "id": trace_id,
+            "name": "chat_interaction",
+            "userId": user_id,
+            "sessionId": session_id or user_id,
+            "input": question,
+            "output": answer,
+            "metadata": {**(metadata or {}), "timestamp": timestamp},
+            "tags": ["chat", "slack2teams"],
+            "timestamp": timestamp
+        })
+
+        # Stage-level spans (lookup, history, embedding, search, persistence...)
+        for span in (turn.spans if turn is not None else []):
+            self._enqueue("span-create", {
+                "id": str(uuid.uuid4()),
+                "traceId": trace_id,
+                "name": span["name"],
+                "startTime": span["start_time"],
+                "endTime": span["end_time"],
+                "metadata": {**span["metadata"], "duration_ms": span["duration_ms"]}
+            })
+
+        # Generation span for detailed LLM metrics
+        generation_info = turn.generation_info() if turn is not None else None
+        generation = {
+            "id": str(uuid.uuid4()),
+            "traceId": trace_id,
+            "name": "chat_response",
+            "model": model or (generation_info or {}).get("model"),
+            "input": question,
+            "output": answer,
+            "startTime": timestamp,
+            "endTime": timestamp,
+            "metadata": {"user_id": user_id}
+        }
+        if generation_info:
+            generation.update({
+                "startTime": generation_info["start_time"],
+                "endTime": generation_info["end_time"],
+                "usage": {
+                    "input": generation_info["prompt_tokens"],
+                    "output": generation_info["completion_tokens"],
+                    "unit": "TOKENS"
                 }
-            )
-            
-            trace_id = trace.id
-            print(f"[OK] Trace logged to Langfuse: {trace_id}")
-            
-            return trace_id
-            
-        except Exception as e:
-            print(f"[ERROR] Error creating Langfuse trace: {e}")
-            return None
-    
+            })
+            if generation_info.get("completion_start_time"):
+                generation["completionStartTime"] = generation_info["completion_start_time"]
+            generation["metadata"]["tokens_per_second"] = generation_info["tokens_per_second"]
+            generation["metadata"]["cached_tokens"] = generation_info["cached_tokens"]
+        # Answers that never reached an LLM (e.g. corrected responses) get no generation
+        if generation["model"]:
+            self._enqueue("generation-create", generation)
+
+        return trace_id
+
+    def add_score(self, trace_id: str, name: str, value: float, comment: Optional[str] = None) -> bool:
+        """Queue a score on a trace. Returns False if tracing is disabled or the queue is full."""
+        return self._enqueue("score-create", {
+            "id": str(uuid.uuid4()),
+            "traceId": trace_id,
+            "name": name,
+            "value": value,
+            "comment": comment or ""
+        })
+
     def add_feedback(
         self,
         trace_id: str,
@@ -110,40 +263,19 @@ class LangfuseTracker:
     ) -> bool:
         """
         Add user feedback to a trace in Langfuse
-        
+
         Args:
             trace_id: The trace ID to add feedback to
             rating: "thumbs_up" or "thumbs_down"
             comment: Optional comment from the user
-        
+
         Returns:
-            bool: True if feedback was recorded successfully, False otherwise
+            bool: True if feedback was queued successfully, False otherwise
         """
-        if not self.client:
-            print("[!] Langfuse client not initialized, skipping feedback logging")
-            return False
-        
-        try:
-            # Convert rating to numeric value
-            # thumbs_up = 1, thumbs_down = 0
-            feedback_value = 1 if rating == "thumbs_up" else 0
-            
-            # Add feedback to Langfuse
-            self.client.score(
-                trace_id=trace_id,
-                name="user_rating",
-                value=feedback_value,
-                comment=comment or ""
-            )
-            
-            print(f"[OK] Feedback logged to Langfuse: trace_id={trace_id}, rating={rating}")
-            return True
-            
-        except Exception as e:
-            print(f"[ERROR] Error adding feedback to Langfuse: {e}")
-            return False
+        # thumbs_up = 1, thumbs_down = 0
+        feedback_value = 1 if rating == "thumbs_up" else 0
+        return self.add_score(trace_id, "user_rating", feedback_value, comment)
 
 
-# Global tracker instance
+# Global tracker instance, started in the FastAPI lifespan
 langfuse_tracker = LangfuseTracker()
-
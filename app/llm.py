@@ -1,9 +1,29 @@
 
 import asyncio
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+import openai
 from langchain.callbacks.base import BaseCallbackHandler
-from langchain_openai import ChatOpenAI
-from langchain.chains import RetrievalQA
-from config import SYSTEM_PROMPT
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+# Keep-alive pool shared by every OpenAI client the app builds
+OPENAI_POOL_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=60.0
+)
+OPENAI_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+# Named model profiles: (model, temperature, max_tokens)
+CHAT_MODEL_PROFILE = ("gpt-4o-mini", 0.3, 1500)
+SIMPLE_CHAT_MODEL_PROFILE = ("gpt-4.1-nano", 0.3, 500)
+COMPLEX_CHAT_MODEL_PROFILE = ("gpt-4o-mini", 0.3, 2500)
+CONVERSATIONAL_MODEL_PROFILE = ("gpt-4o-mini", 0.7, 500)
+CORRECTION_MODEL_PROFILE = ("gpt-4o-mini", 0.3, 1000)
+CONDENSE_MODEL_PROFILE = ("gpt-4.1-nano", 0.0, 60)
+SUMMARY_MODEL_PROFILE = ("gpt-4.1-nano", 0.2, 400)
 
 
 class AsyncStreamHandler(BaseCallbackHandler):
@@ -13,93 +33,109 @@ class AsyncStreamHandler(BaseCallbackHandler):
     def on_llm_new_token(self, token: str, **kwargs):
         self.queue.put_nowait(token)
 
-def setup_qa_chain(retriever):
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_core.runnables import RunnablePassthrough
-    from langchain.chains.combine_documents import create_stuff_documents_chain
-    
-    # Create a custom prompt template with system message
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_PROMPT),
-        ("human", "Context: {context}\n\nQuestion: {question}")
-    ])
-    
-    llm = ChatOpenAI(
-        model_name="gpt-4.1-nano", 
-        streaming=True, 
-        temperature=0.3,  # Balanced temperature for good responses
-        max_tokens=1500   # Allow longer responses for comprehensive answers
-    )
-    
-    # Create the document chain using the modern approach
-    document_chain = create_stuff_documents_chain(llm, prompt_template)
-    
-    # Create a wrapper to maintain compatibility with the existing interface
-    class SemanticRetrievalQA:
-        def __init__(self, document_chain, retriever):
-            self.document_chain = document_chain
-            self.retriever = retriever
-        
-        def invoke(self, inputs):
-            # Extract the query from the inputs dict
-            query = inputs.get("query", "")
-            
-            # Get relevant documents using pure semantic search
-            from app.vectorstore import vectorstore
-            
-            # PURE SEMANTIC SEARCH - Let the vectorstore handle semantic understanding
-            # No predefined keywords, no hardcoded terms, no forced inclusions
-            
-            # Primary semantic search with the original query
-            relevant_docs = vectorstore.similarity_search(query, k=25)
-            
-            # Secondary semantic search with query rephrasing for better coverage
-            # This helps catch semantically similar but differently worded content
-            try:
-                # Use the LLM to create a semantic variation of the query
-                rephrase_prompt = f"""
-                Rephrase this question in 2-3 different ways to help find relevant information:
-                Original: {query}
-                
-                Provide 2-3 alternative phrasings that mean the same thing but use different words.
-                Each rephrasing should be on a new line and be concise.
-                """
-                
-                rephrase_result = llm.invoke(rephrase_prompt)
-                rephrased_queries = [line.strip() for line in rephrase_result.content.split('\n') if line.strip()]
-                
-                # Search with each rephrased query
-                for rephrased_query in rephrased_queries[:2]:  # Limit to 2 rephrasings
-                    additional_docs = vectorstore.similarity_search(rephrased_query, k=12)
-                    relevant_docs.extend(additional_docs)
-                    
-            except Exception as e:
-                # If rephrasing fails, continue with original query only
-                print(f"Query rephrasing failed: {e}")
-                pass
-            
-            # Deduplicate documents while preserving relevance order
-            seen_ids = set()
-            unique_docs = []
-            
-            for doc in relevant_docs:
-                # Create a unique identifier for the document
-                doc_id = f"{doc.metadata.get('source', '')}_{doc.page_content[:50]}"
-                if doc_id not in seen_ids:
-                    seen_ids.add(doc_id)
-                    unique_docs.append(doc)
-            
-            # Limit to reasonable number of documents for processing
-            # Too many documents can overwhelm the LLM and reduce quality
-            final_docs = unique_docs[:30]
-            
-            # Invoke the document chain with the semantically relevant documents
-            result = self.document_chain.invoke({
-                "context": final_docs,
-                "question": query
-            })
-            
-            return {"result": result}
-    
-    qa_chain = SemanticRetrievalQA(document_chain, retriever)
-    return qa_chain
+
+class ModelRegistry:
+    """Pre-built LLM and embedding clients sharing one keep-alive HTTP pool.
+
+    Clients are cached per (model, temperature, max_tokens) profile so request
+    handlers never construct ChatOpenAI or open new TLS sessions themselves.
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, float, Optional[int]], ChatOpenAI] = {}
+        self._embeddings: Dict[str, OpenAIEmbeddings] = {}
+        self._lock = threading.Lock()
+        self._http_client: Optional[httpx.Client] = None
+        self._async_http_client: Optional[httpx.AsyncClient] = None
+        self._openai_client: Optional[openai.OpenAI] = None
+        self._async_openai_client: Optional[openai.AsyncOpenAI] = None
+        # Optional replacements used by the offline benchmark harness
+        self._chat_factory: Optional[Callable[[str, float, Optional[int]], ChatOpenAI]] = None
+        self._embeddings_factory: Optional[Callable[[str], OpenAIEmbeddings]] = None
+
+    def set_factories(self, chat_factory=None, embeddings_factory=None):
+        """Build clients with custom factories instead of OpenAI (e.g. fake models for benchmarks)."""
+        with self._lock:
+            self._chat_factory = chat_factory
+            self._embeddings_factory = embeddings_factory
+            self._models.clear()
+            self._embeddings.clear()
+
+    def start(self):
+        """Open the shared HTTP pools (idempotent)."""
+        with self._lock:
+            if self._openai_client is None:
+                self._http_client = httpx.Client(limits=OPENAI_POOL_LIMITS, timeout=OPENAI_TIMEOUT)
+                self._async_http_client = httpx.AsyncClient(limits=OPENAI_POOL_LIMITS, timeout=OPENAI_TIMEOUT)
+                self._openai_client = openai.OpenAI(http_client=self._http_client)
+                self._async_openai_client = openai.AsyncOpenAI(http_client=self._async_http_client)
+
+    async def aclose(self):
+        """Close the shared HTTP pools and drop cached clients."""
+        with self._lock:
+            http_client, async_http_client = self._http_client, self._async_http_client
+            self._models.clear()
+            self._embeddings.clear()
+            self._http_client = None
+            self._async_http_client = None
+            self._openai_client = None
+            self._async_openai_client = None
+        if async_http_client is not None:
+            await async_http_client.aclose()
+        if http_client is not None:
+            http_client.close()
+
+    def get(self, model_name: str, temperature: float, max_tokens: Optional[int] = None) -> ChatOpenAI:
+        """Return the shared chat client for a (model, temperature, max_tokens) profile."""
+        key = (model_name, temperature, max_tokens)
+        llm = self._models.get(key)
+        if llm is not None:
+            return llm
+
+        self.start()
+        with self._lock:
+            llm = self._models.get(key)
+            if llm is None and self._chat_factory is not None:
+                llm = self._models[key] = self._chat_factory(model_name, temperature, max_tokens)
+            if llm is None:
+                llm = ChatOpenAI(
+                    model_name=model_name,
+                    streaming=True,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    # Token usage (including prompt tokens served from OpenAI's prompt
+                    # cache) arrives as usage_metadata on the last streamed chunk
+                    stream_usage=True
+                )
+                # Route both sync and async calls through the shared pools
+                llm.client = self._openai_client.chat.completions
+                llm.async_client = self._async_openai_client.chat.completions
+                self._models[key] = llm
+        return llm
+
+    def get_profile(self, profile: Tuple[str, float, Optional[int]]) -> ChatOpenAI:
+        """Return the shared chat client for one of the named *_MODEL_PROFILE tuples."""
+        return self.get(*profile)
+
+    def embeddings(self, model: str = "text-embedding-ada-002") -> OpenAIEmbeddings:
+        """Return the shared embeddings client for a model."""
+        embeddings = self._embeddings.get(model)
+        if embeddings is not None:
+            return embeddings
+
+        self.start()
+        with self._lock:
+            embeddings = self._embeddings.get(model)
+            if embeddings is None and self._embeddings_factory is not None:
+                embeddings = self._embeddings[model] = self._embeddings_factory(model)
+            if embeddings is None:
+                embeddings = OpenAIEmbeddings(model=model)
+                embeddings.client = self._openai_client.embeddings
+                embeddings.async_client = self._async_openai_client.embeddings
+                self._embeddings[model] = embeddings
+        return embeddings
+
+
+# Global registry, started in the FastAPI lifespan
+model_registry = ModelRegistry()
+
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+CF Chatbot API application, imported by each server worker (see server.py).
+
+Every worker imports the app: one builds the vectorstore under a file lock
+while the rest wait and then open it, file-backed stores under ./data are
+shared through file locks, and only one worker runs the correction queue.
+Metrics and caches stay per worker.
+"""
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from app.endpoints import router as chat_router
+from app.mongodb_memory import close_mongodb_connection
+import asyncio
+from contextlib import asynccontextmanager
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Manage application lifespan events."""
+    # Startup
+    from app.mongodb_memory import mongodb_memory
+    from app.llm import model_registry
+    from app.microsoft_auth import microsoft_auth
+    from app.langfuse_integration import langfuse_tracker
+    model_registry.start()
+    print("✅ Model registry ready (shared OpenAI connection pool)")
+    await microsoft_auth.start()
+    langfuse_tracker.start()
+    from app.endpoints import run_correction_job
+    from app.intent_router import intent_router
+    await asyncio.to_thread(intent_router.warm_up)
+    print("✅ Intent router ready")
+    from app.correction_queue import correction_queue
+    await correction_queue.start(run_correction_job)
+    if correction_queue.is_leader:
+        print(f"✅ Correction workers started ({correction_queue.concurrency})")
+    else:
+        print("✅ Correction workers run in another server process")
+    try:
+        await mongodb_memory.connect()
+        print("✅ MongoDB connected successfully")
+    except Exception as e:
+        print(f"❌ Failed to connect to MongoDB: {e}")
+    
+    yield
+    
+    # Shutdown
+    await correction_queue.stop()
+    try:
+        await asyncio.to_thread(langfuse_tracker.shutdown)
+        print("✅ Langfuse events flushed")
+    except Exception as e:
+        print(f"⚠️ Error flushing Langfuse events: {e}")
+    
+    try:
+        await close_mongodb_connection()
+        print("✅ MongoDB connection closed")
+    except Exception as e:
+        print(f"⚠️ Error closing MongoDB connection: {e}")
+    
+    try:
+        await microsoft_auth.aclose()
+        await model_registry.aclose()
+        print("✅ Model registry and auth client closed")
+    except Exception as e:
+        print(f"⚠️ Error closing model registry: {e}")
+
+app = FastAPI(lifespan=lifespan)
+
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Allow all origins
+    allow_credentials=True,  # Enable credentials for OAuth
+    allow_methods=["*"],  # Allow all methods
+    allow_headers=["*"],  # Allow all headers
+)
+
+# Add a simple health check endpoint
+@app.get("/")
+async def root():
+    return {"message": "CF Chatbot API is running"}
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "message": "Server is running"}
+
+app.include_router(chat_router)
@@ -2,8 +2,11 @@ from typing import List, Dict
 import json
 import os
 
+from app.shared_files import FileLock, atomic_write_json
+
 # File to store user chat histories
 CHAT_HISTORY_FILE = "data/user_chat_histories.json"
+CHAT_HISTORY_LOCK = CHAT_HISTORY_FILE + ".lock"
 
 def load_chat_histories() -> Dict[str, List[Dict[str, str]]]:
     """Load chat histories from file."""
@@ -17,28 +20,35 @@ def load_chat_histories() -> Dict[str, List[Dict[str, str]]]:
 
 def save_chat_histories(conversation_memory: Dict[str, List[Dict[str, str]]]):
     """Save chat histories to file."""
-    os.makedirs(os.path.dirname(CHAT_HISTORY_FILE), exist_ok=True)
-    with open(CHAT_HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(conversation_memory, f, ensure_ascii=False, indent=2)
+    atomic_write_json(CHAT_HISTORY_FILE, conversation_memory, indent=2)
+
+def _reload():
+    """Pick up what other server workers saved (call with the lock held)."""
+    conversation_memory.clear()
+    conversation_memory.update(load_chat_histories())
 
 # Load existing chat histories
 conversation_memory: Dict[str, List[Dict[str, str]]] = load_chat_histories()
 
 def get_or_create_user_conversation(user_id: str) -> List[Dict[str, str]]:
     """Get or create a conversation for a specific user."""
-    if user_id not in conversation_memory:
-        conversation_memory[user_id] = []
-        save_chat_histories(conversation_memory)
-    return conversation_memory[user_id]
+    with FileLock(CHAT_HISTORY_LOCK):
+        _reload()
+        if user_id not in conversation_memory:
+            conversation_memory[user_id] = []
+            save_chat_histories(conversation_memory)
+        return conversation_memory[user_id]
 
 def add_to_conversation(user_id: str, role: str, content: str):
     """Add a message to the user's conversation history."""
-    conversation = get_or_create_user_conversation(user_id)
-    conversation.append({"role": role, "content": content})
-    # Keep only last 20 messages to prevent context overflow
-    if len(conversation) > 20:
-        conversation.pop(0)
-    save_chat_histories(conversation_memory)
+    with FileLock(CHAT_HISTORY_LOCK):
+        _reload()
+        conversation = conversation_memory.setdefault(user_id, [])
+        conversation.append({"role": role, "content": content})
+        # Keep only last 20 messages to prevent context overflow
+        if len(conversation) > 20:
+            conversation.pop(0)
+        save_chat_histories(conversation_memory)
 
 def get_conversation_context(user_id: str) -> str:
     """Get formatted conversation context for a user."""
@@ -59,6 +69,8 @@ def get_user_chat_history(user_id: str) -> List[Dict[str, str]]:
 
 def clear_user_chat_history(user_id: str):
     """Clear chat history for a specific user."""
-    if user_id in conversation_memory:
-        conversation_memory[user_id] = []
-        save_chat_histories(conversation_memory)
\ No newline at end of file
+    with FileLock(CHAT_HISTORY_LOCK):
+        _reload()
+        if user_id in conversation_memory:
+            conversation_memory[user_id] = []
+            save_chat_histories(conversation_memory)
\ No newline at end of file
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Per-stage latency and token instrumentation for chat turns.
+
+Metrics are kept in-process and rendered in the Prometheus text exposition
+format by the /metrics endpoint. With SERVER_WORKERS > 1 every worker keeps
+its own registry, so each series carries a worker="<pid>" label and a scrape
+only returns the worker that served it; aggregate across workers in the
+query, e.g. sum without (worker) (rate(chat_turns_total[5m])). Each chat turn
+also collects its stage spans so they can be forwarded to Langfuse alongside
+the trace.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATE_BUCKETS = (5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], *extra: str) -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    parts.extend(label for label in extra if label)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self, const: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key, const)} {value}")
+        return lines
+
+
+class Gauge:
+    """Value that can go up and down, with optional labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self, const: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key, const)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self, const: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, const, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                cumulative += series[len(self.buckets)]
+                labels = _format_labels(self.labelnames, key, const, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key, const)} {series[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key, const)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together for /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        # Read at render time: workers may fork after this module is imported
+        worker = f'worker="{os.getpid()}"'
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(worker))
+        return "\n".join(lines) + "\n"
+
+
+# Global registry and chat-turn metrics
+metrics_registry = MetricsRegistry()
+
+CHAT_TURNS = metrics_registry.counter(
+    "chat_turns_total", "Chat turns handled, by endpoint and answer path", ("endpoint", "path"))
+STAGE_SECONDS = metrics_registry.histogram(
+    "chat_stage_seconds", "Latency of each chat turn stage", ("endpoint", "stage"))
+TIME_TO_FIRST_TOKEN = metrics_registry.histogram(
+    "chat_time_to_first_token_seconds", "Time from LLM request to first streamed token", ("endpoint", "model"))
+GENERATION_TOKENS_PER_SECOND = metrics_registry.histogram(
+    "chat_generation_tokens_per_second", "Completion tokens per second after the first token", ("model",), RATE_BUCKETS)
+PROMPT_TOKENS = metrics_registry.counter(
+    "chat_prompt_tokens_total", "Prompt tokens sent to the LLM", ("model",))
+COMPLETION_TOKENS = metrics_registry.counter(
+    "chat_completion_tokens_total", "Completion tokens received from the LLM", ("model",))
+CACHED_PROMPT_TOKENS = metrics_registry.counter(
+    "chat_cached_prompt_tokens_total", "Prompt tokens the provider served from its prompt cache", ("model",))
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class ChatTurn:
+    """Collects stage spans and generation stats for one chat turn."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.path = "rag"
+        self.spans: List[Dict[str, Any]] = []
+        self.model: Optional[str] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.usage: Optional[Dict[str, Any]] = None
+        self.generation_start: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.generation_end: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str, **metadata):
+        """Time a stage; extra metadata can be added to the yielded dict."""
+        span_metadata = dict(metadata)
+        start_wall, start = time.time(), time.perf_counter()
+        try:
+            yield span_metadata
+        finally:
+            duration = time.perf_counter() - start
+            STAGE_SECONDS.observe(duration, endpoint=self.endpoint, stage=name)
+            self.spans.append({
+                "name": name,
+                "start_time": _iso(start_wall),
+                "end_time": _iso(start_wall + duration),
+                "duration_ms": round(duration * 1000, 2),
+                "metadata": span_metadata
+            })
+
+    def start_generation(self, model: str, prompt_tokens: int):
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.generation_start = time.time()
+
+    def record_usage(self, usage: Dict[str, Any]):
+        """Token usage reported by the API (LangChain ``usage_metadata``); replaces the local estimates."""
+        self.usage = usage
+        self.prompt_tokens = usage.get("input_tokens") or self.prompt_tokens
+        self.cached_tokens = (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+    def mark_token(self):
+        """Record time-to-first-token on the first streamed token."""
+        if self.first_token_at is None and self.generation_start is not None:
+            self.first_token_at = time.time()
+            TIME_TO_FIRST_TOKEN.observe(self.first_token_at - self.generation_start,
+                                        endpoint=self.endpoint, model=self.model)
+
+    def end_generation(self, completion_tokens: int):
+        self.generation_end = time.time()
+        self.completion_tokens = (self.usage or {}).get("output_tokens") or completion_tokens
+        PROMPT_TOKENS.inc(self.prompt_tokens, model=self.model)
+        COMPLETION_TOKENS.inc(self.completion_tokens, model=self.model)
+        CACHED_PROMPT_TOKENS.inc(self.cached_tokens, model=self.model)
+        STAGE_SECONDS.observe(self.generation_end - self.generation_start, endpoint=self.endpoint, stage="generation")
+        rate = self.tokens_per_second
+        if rate is not None:
+            GENERATION_TOKENS_PER_SECOND.observe(rate, model=self.model)
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        if self.generation_end is None or not self.completion_tokens:
+            return None
+        started = self.first_token_at or self.generation_start
+        elapsed = self.generation_end - started
+        return self.completion_tokens / elapsed if elapsed > 0 else None
+
+    def adopt(self, other: "ChatTurn"):
+        """Take the spans and generation stats of a turn whose work this one shared.
+
+        Metrics are not recorded again; they were recorded by ``other``.
+        """
+        self.spans.extend(dict(span, metadata=dict(span["metadata"], shared=True)) for span in other.spans)
+        self.model, self.prompt_tokens, self.completion_tokens = other.model, other.prompt_tokens, other.completion_tokens
+        self.cached_tokens, self.usage = other.cached_tokens, other.usage
+        self.generation_start, self.first_token_at = other.generation_start, other.first_token_at
+        self.generation_end = other.generation_end
+
+    def finish(self):
+        CHAT_TURNS.inc(endpoint=self.endpoint, path=self.path)
+
+    def generation_info(self) -> Optional[Dict[str, Any]]:
+        """Generation details for the Langfuse generation span."""
+        if self.generation_start is None:
+            return None
+        info = {
+            "model": self.model,
+            "start_time": _iso(self.generation_start),
+            "end_time": _iso(self.generation_end or time.time()),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "usage_reported": self.usage is not None,
+            "tokens_per_second": self.tokens_per_second
+        }
+        if self.first_token_at is not None:
+            info["completion_start_time"] = _iso(self.first_token_at)
+            info["time_to_first_token_ms"] = round((self.first_token_at - self.generation_start) * 1000, 2)
+        return info
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Microsoft OAuth client with connection reuse and a short-TTL Graph profile cache.
+
+Profiles are cached by the Azure AD object id (``oid``). Access tokens are only
+mapped to a cached profile after Microsoft has vouched for them, either because
+they came straight from the token endpoint or because Graph ``/me`` accepted them.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.cache import TTLCache
+from config import (
+    MICROSOFT_CLIENT_ID, MICROSOFT_CLIENT_SECRET, MICROSOFT_TENANT,
+    MICROSOFT_LOGIN_URL, MICROSOFT_GRAPH_URL, MICROSOFT_PROFILE_CACHE_TTL
+)
+
+
+class MicrosoftAuthError(Exception):
+    """Raised when Microsoft rejects a token exchange or profile lookup."""
+
+    def __init__(self, message: str, details: str = ""):
+        super().__init__(message)
+        self.message = message
+        self.details = details
+
+
+def decode_token_claims(token: Optional[str]) -> Dict[str, Any]:
+    """Decode the payload of a JWT without verifying it (empty dict if opaque)."""
+    if not token or token.count(".") != 2:
+        return {}
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload.encode("ascii")))
+    except Exception:
+        return {}
+
+
+def _token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+
+class MicrosoftAuthClient:
+    """Shared HTTP client for the Microsoft identity platform and Graph."""
+
+    def __init__(self, ttl_seconds: int = MICROSOFT_PROFILE_CACHE_TTL):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_lock = asyncio.Lock()
+        # oid -> profile dict
+        self.profiles = TTLCache(ttl_seconds, max_entries=10000)
+        # sha256(access_token) -> oid, only for tokens Microsoft has accepted
+        self.tokens = TTLCache(ttl_seconds, max_entries=20000)
+        # In-flight Graph lookups so a login burst for one user makes one call
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def start(self):
+        """Open the shared connection pool (idempotent)."""
+        async with self._client_lock:
+            if self._client is None:
+                self._client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0),
+                    timeout=httpx.Timeout(15.0, connect=5.0)
+                )
+
+    async def aclose(self):
+        """Close the shared connection pool."""
+        async with self._client_lock:
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+    async def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    async def exchange_code(self, code: str, redirect_uri: str, code_verifier: str) -> Dict[str, Any]:
+        """Exchange an authorization code for tokens."""
+        client = await self._http()
+        token_response = await client.post(
+            f"{MICROSOFT_LOGIN_URL}/{MICROSOFT_TENANT}/oauth2/v2.0/token",
+            data={
+                "client_id": MICROSOFT_CLIENT_ID,
+                "client_secret": MICROSOFT_CLIENT_SECRET,
+                "code": code,
+                "redirect_uri": redirect_uri,
+                "code_verifier": code_verifier,
+                "grant_type": "authorization_code"
+            }
+        )
+        if token_response.status_code != 200:
+            raise MicrosoftAuthError("Failed to exchange code for token", token_response.text)
+
+        token_info = token_response.json()
+        if not token_info.get("access_token"):
+            raise MicrosoftAuthError("No access token received")
+        return token_info
+
+    async def _fetch_graph_profile(self, access_token: str) -> Dict[str, Any]:
+        client = await self._http()
+        graph_response = await client.get(
+            f"{MICROSOFT_GRAPH_URL}/me",
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        if graph_response.status_code != 200:
+            raise MicrosoftAuthError("Failed to get user information", graph_response.text)
+
+        user_info = graph_response.json()
+        return {
+            "user_id": user_info.get("id"),
+            "name": user_info.get("displayName", "User"),
+            "email": user_info.get("mail") or user_info.get("userPrincipalName", "")
+        }
+
+    async def _lookup_profile(self, flight_key: str, access_token: str) -> Dict[str, Any]:
+        """Fetch /me once per flight_key even when many logins arrive together."""
+        future = self._inflight.get(flight_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        try:
+            profile = await self._fetch_graph_profile(access_token)
+            future.set_result(profile)
+            return profile
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a burst with no other waiters doesn't log noise
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(flight_key, None)
+
+    def _remember(self, access_token: str, claims: Dict[str, Any], profile: Dict[str, Any]):
+        """Cache a profile and bind this access token to it until the token expires."""
+        oid = claims.get("oid") or profile.get("user_id")
+        if not oid:
+            return
+        ttl = self.tokens.ttl_seconds
+        if claims.get("exp"):
+            ttl = max(0, min(ttl, int(claims["exp"]) - int(time.time())))
+        self.profiles.set(oid, profile)
+        if ttl:
+            self.tokens.set(_token_key(access_token), oid, ttl_seconds=ttl)
+
+    async def login(self, code: str, redirect_uri: str, code_verifier: str) -> Dict[str, Any]:
+        """Complete the OAuth callback, skipping Graph when the profile is cached."""
+        token_info = await self.exchange_code(code, redirect_uri, code_verifier)
+        access_token = token_info["access_token"]
+
+        # Tokens from the token endpoint are trusted, so their oid can key the cache
+        claims = decode_token_claims(token_info.get("id_token")) or decode_token_claims(access_token)
+        oid = claims.get("oid")
+
+        profile = self.profiles.get(oid) if oid else None
+        if profile is None:
+            profile = await self._lookup_profile(oid or _token_key(access_token), access_token)
+        self._remember(access_token, claims, profile)
+
+        return {
+            **profile,
+            "access_token": access_token,
+            "refresh_token": token_info.get("refresh_token", "")
+        }
+
+    async def get_profile(self, access_token: str) -> Dict[str, Any]:
+        """Return the profile for an access token, calling Graph only on a cache miss."""
+        oid = self.tokens.get(_token_key(access_token))
+        if oid:
+            profile = self.profiles.get(oid)
+            if profile is not None:
+                return profile
+
+        # Unknown token: Graph validates it for us
+        profile = await self._lookup_profile(_token_key(access_token), access_token)
+        self._remember(access_token, decode_token_claims(access_token), profile)
+        return profile
+
+
+# Global instance, started in the FastAPI lifespan
+microsoft_auth = MicrosoftAuthClient()
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped local vector backend.
+
+An alternative to querying Chroma at runtime: the collection is exported once
+into a directory of plain files that every worker memory-maps read-only, so
+N uvicorn workers share one page-cache copy and startup is just an ``open``.
+
+- ``vectors.npy``: float32 unit vectors, N x D (memory-mapped)
+- ``meta.jsonl`` + ``offsets.npy``: one ``{"id", "page_content", "metadata"}``
+  line per row; rows are read with ``pread`` only for the hits
+- ``columns.json``: the filterable metadata fields per row (``source_type``,
+  ``source``, ``modified_at``), loaded on the first filtered search
+- ``ivf_centroids.npy`` + ``ivf_offsets.npy``: for large corpora rows are
+  grouped by nearest k-means centroid so a query scans only ``nprobe``
+  contiguous lists; small corpora use exact blocked dot products
+- ``index.json``: manifest (counts, dims, nlist, source metadata timestamp)
+
+``MmapVectorStore`` implements the LangChain ``VectorStore`` search methods the
+app uses (``similarity_search``, ``similarity_search_by_vector``, relevance
+scores, ``as_retriever``) and accepts the same Chroma-style ``where`` filters.
+"""
+
+import json
+import math
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from config import MMAP_INDEX_PATH, MMAP_IVF_MIN_VECTORS, MMAP_IVF_NPROBE
+
+INDEX_VERSION = 1
+EXPORT_BATCH_SIZE = 1000
+SEARCH_BLOCK_ROWS = 16384
+FILTER_COLUMNS = ("source_type", "source", "modified_at")
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores, best first."""
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+# ---------------- Where filters ----------------
+
+_OPERATORS: Dict[str, Callable[[np.ndarray, Any], np.ndarray]] = {
+    "$eq": lambda column, value: column == value,
+    "$ne": lambda column, value: column != value,
+    "$gt": lambda column, value: column > value,
+    "$gte": lambda column, value: column >= value,
+    "$lt": lambda column, value: column < value,
+    "$lte": lambda column, value: column <= value,
+    "$in": lambda column, value: np.isin(column, list(value)),
+    "$nin": lambda column, value: ~np.isin(column, list(value)),
+}
+
+
+def evaluate_where(where: Dict[str, Any], columns: Dict[str, np.ndarray], count: int) -> np.ndarray:
+    """Boolean row mask for a Chroma-style where clause over the filter columns."""
+    mask = np.ones(count, dtype=bool)
+    for key, condition in where.items():
+        if key == "$and":
+            for clause in condition:
+                mask &= evaluate_where(clause, columns, count)
+        elif key == "$or":
+            mask &= np.logical_or.reduce([evaluate_where(clause, columns, count) for clause in condition])
+        else:
+            if key not in columns:
+                raise ValueError(f"'{key}' is not filterable in the mmap backend (filterable: {FILTER_COLUMNS})")
+            column = columns[key]
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, value in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+                with np.errstate(invalid="ignore"):
+                    mask &= _OPERATORS[operator](column, value)
+    return mask
+
+
+# ---------------- Export ----------------
+
+def _kmeans(sample: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means (Lloyd) on a sample; returns unit centroids."""
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = ~sums.any(axis=1)
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS])
+        lists[start:start + SEARCH_BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+    return lists
+
+
+def export_collection(collection, path: str = MMAP_INDEX_PATH, source_timestamp: Optional[str] = None,
+                      ivf_min_vectors: int = MMAP_IVF_MIN_VECTORS, seed: int = 7) -> Dict[str, Any]:
+    """Stream a Chroma collection into a memory-mappable index at ``path`` (atomic swap)."""
+    count = collection.count()
+    if count == 0:
+        raise ValueError("Collection is empty; nothing to export")
+    dims = len(collection.get(include=["embeddings"], limit=1)["embeddings"][0])
+
+    tmp_path = f"{path}.building.{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    # Pass 1: collection order
+    raw = np.lib.format.open_memmap(os.path.join(tmp_path, "raw.npy"), mode="w+", dtype=np.float32,
+                                    shape=(count, dims))
+    raw_offsets = np.zeros(count + 1, dtype=np.int64)
+    columns = {key: [] for key in FILTER_COLUMNS}
+    row = 0
+    with open(os.path.join(tmp_path, "raw.jsonl"), "wb") as meta:
+        for offset in range(0, count, EXPORT_BATCH_SIZE):
+            batch = collection.get(include=["embeddings", "documents", "metadatas"],
+                                   limit=EXPORT_BATCH_SIZE, offset=offset)
+            vectors = _normalize(np.asarray(batch["embeddings"], dtype=np.float32))
+            raw[row:row + len(vectors)] = vectors
+            for doc_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                metadata = metadata or {}
+                meta.write((json.dumps({"id": doc_id, "page_content": text or "", "metadata": metadata},
+                                       ensure_ascii=False) + "\n").encode("utf-8"))
+                raw_offsets[row + 1] = meta.tell()
+                for key in FILTER_COLUMNS:
+                    columns[key].append(metadata.get(key))
+                row += 1
+    if row != count:
+        raise RuntimeError(f"Collection changed while exporting ({row} of {count} records)")
+    raw.flush()
+
+    # IVF for large corpora: reorder rows so each list is one contiguous slice
+    nlist = int(4 * math.sqrt(count)) if count >= ivf_min_vectors else 0
+    if nlist:
+        rng = np.random.default_rng(seed)
+        sample_size = min(count, nlist * KMEANS_SAMPLE_PER_LIST)
+        sample = np.asarray(raw[np.sort(rng.choice(count, sample_size, replace=False))])
+        centroids = _kmeans(sample, nlist, rng)
+        lists = _assign(raw, centroids)
+        order = np.argsort(lists, kind="stable")
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(lists, minlength=nlist))
+        np.save(os.path.join(tmp_path, "ivf_centroids.npy"), centroids)
+        np.save(os.path.join(tmp_path, "ivf_offsets.npy"), list_offsets)
+    else:
+        order = np.arange(count)
+
+    # Pass 2: final row order
+    vectors = np.lib.format.open_memmap(os.path.join(tmp_path, "vectors.npy"), mode="w+", dtype=np.float32,
+                                        shape=(count, dims))
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    with open(os.path.join(tmp_path, "raw.jsonl"), "rb") as source, \
+            open(os.path.join(tmp_path, "meta.jsonl"), "wb") as meta:
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            rows = order[start:start + SEARCH_BLOCK_ROWS]
+            vectors[start:start + len(rows)] = raw[rows]
+            for i, source_row in enumerate(rows, start):
+                source.seek(raw_offsets[source_row])
+                meta.write(source.read(raw_offsets[source_row + 1] - raw_offsets[source_row]))
+                offsets[i + 1] = meta.tell()
+    vectors.flush()
+    del raw, vectors
+    os.remove(os.path.join(tmp_path, "raw.npy"))
+    os.remove(os.path.join(tmp_path, "raw.jsonl"))
+
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    with open(os.path.join(tmp_path, "columns.json"), "w", encoding="utf-8") as f:
+        json.dump({key: [values[i] for i in order] for key, values in columns.items()}, f)
+    manifest = {
+        "version": INDEX_VERSION,
+        "count": count,
+        "dims": dims,
+        "nlist": nlist,
+        "source_timestamp": source_timestamp,
+        "built_at": time.time()
+    }
+    with open(os.path.join(tmp_path, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Readers keep their open mmaps of the old files; new loads see the new directory
+    old_path = f"{path}.old.{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return manifest
+
+
+def read_manifest(path: str = MMAP_INDEX_PATH) -> Optional[Dict[str, Any]]:
+    manifest_path = os.path.join(path, "index.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return manifest if manifest.get("version") == INDEX_VERSION else None
+
+
+# ---------------- Runtime store ----------------
+
+class MmapVectorStore(VectorStore):
+    """Read-only vector store over an exported, memory-mapped index."""
+
+    def __init__(self, path: str, embedding_function: Embeddings, nprobe: int = MMAP_IVF_NPROBE):
+        manifest = read_manifest(path)
+        if manifest is None:
+            raise FileNotFoundError(f"No mmap vector index at {path}")
+        self.path = path
+        self.manifest = manifest
+        self.nprobe = nprobe
+        self._embedding_function = embedding_function
+        self._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self._meta_fd = os.open(os.path.join(path, "meta.jsonl"), os.O_RDONLY)
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+        # Row <-> store id of every row a search has returned (ids live in meta.jsonl)
+        self._ids: Dict[int, str] = {}
+        self._rows: Dict[str, int] = {}
+        if manifest["nlist"]:
+            self._centroids = np.load(os.path.join(path, "ivf_centroids.npy"))
+            self._list_offsets = np.load(os.path.join(path, "ivf_offsets.npy"))
+
+    def __del__(self):
+        try:
+            os.close(self._meta_fd)
+        except Exception:
+            pass
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    # ---------------- Internals ----------------
+
+    def _filter_columns(self) -> Dict[str, np.ndarray]:
+        if self._columns is None:
+            with open(os.path.join(self.path, "columns.json"), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            columns = {}
+            for key, values in raw.items():
+                if all(isinstance(v, (int, float)) or v is None for v in values):
+                    columns[key] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+                else:
+                    columns[key] = np.array(["" if v is None else str(v) for v in values], dtype=object)
+            self._columns = columns
+        return self._columns
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows of the nprobe nearest IVF lists; None means scan everything."""
+        if not self.manifest["nlist"]:
+            return None
+        probes = _top_k(self._centroids @ query, min(self.nprobe, self.manifest["nlist"]))
+        return np.concatenate([np.arange(self._list_offsets[p], self._list_offsets[p + 1]) for p in np.sort(probes)])
+
+    def _scan(self, query: np.ndarray, k: int, rows: Optional[np.ndarray],
+              mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Blocked dot products over ``rows`` (or all rows); returns (rows, scores) best first."""
+        best_rows, best_scores = [], []
+        total = self.count() if rows is None else len(rows)
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            block_rows = np.arange(start, min(start + SEARCH_BLOCK_ROWS, total)) if rows is None \
+                else rows[start:start + SEARCH_BLOCK_ROWS]
+            if mask is not None:
+                block_rows = block_rows[mask[block_rows]]
+                if not len(block_rows):
+                    continue
+            block = self._vectors[block_rows[0]:block_rows[-1] + 1] if rows is None and mask is None \
+                else self._vectors[block_rows]
+            scores = block @ query
+            top = _top_k(scores, k)
+            best_rows.append(block_rows[top])
+            best_scores.append(scores[top])
+        if not best_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows_all, scores_all = np.concatenate(best_rows), np.concatenate(best_scores)
+        top = _top_k(scores_all, k)
+        return rows_all[top], scores_all[top]
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return json.loads(os.pread(self._meta_fd, end - start, start))
+
+    def _document(self, row: int) -> Document:
+        record = self._record(row)
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def _search_rows(self, embedding: List[float], k: int,
+                     filter: Optional[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        mask = evaluate_where(filter, self._filter_columns(), self.count()) if filter else None
+        rows = self._candidate_rows(query)
+        hit_rows, scores = self._scan(query, k, rows, mask)
+        if mask is not None and len(hit_rows) < k and rows is not None:
+            # Selective filter: the probed lists ran short, scan every allowed row instead
+            hit_rows, scores = self._scan(query, k, np.flatnonzero(mask), None)
+        return hit_rows, scores
+
+    # ---------------- VectorStore interface ----------------
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4,
+                                                          filter: Optional[Dict[str, Any]] = None,
+                                                          **kwargs: Any) -> List[Tuple[Document, float]]:
+        """(Document, cosine distance) pairs, best first."""
+        hit_rows, scores = self._search_rows(embedding, k, filter)
+        return [(self._document(int(row)), 1.0 - float(score)) for row, score in zip(hit_rows, scores)]
+
+    def similarity_search_ids_by_vector(self, embedding: List[float], k: int = 4,
+                                        filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """(chunk id, cosine distance) pairs, best first; ``get_chunks`` reads their text."""
+        hit_rows, scores = self._search_rows(embedding, k, filter)
+        hits = []
+        for row, score in zip(hit_rows, scores):
+            row = int(row)
+            chunk_id = self._ids.get(row)
+            if chunk_id is None:
+                chunk_id = self._ids[row] = self._record(row)["id"]
+                self._rows[chunk_id] = row
+            hits.append((chunk_id, 1.0 - float(score)))
+        return hits
+
+    def get_chunks(self, ids: List[str]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """(id, text, metadata) for ids returned by ``similarity_search_ids_by_vector``."""
+        chunks = []
+        for chunk_id in ids:
+            row = self._rows.get(chunk_id)
+            if row is not None:
+                record = self._record(row)
+                chunks.append((chunk_id, record["page_content"], record["metadata"]))
+        return chunks
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self._embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding_function.embed_query(query), k, filter)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return lambda distance: 1.0 - distance
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("MmapVectorStore is read-only; re-export it from the Chroma store")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   **kwargs: Any) -> "MmapVectorStore":
+        raise NotImplementedError("MmapVectorStore is built with export_collection from a Chroma collection")
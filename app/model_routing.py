@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive model routing for knowledge-base answers.
+
+Every retrieval turn used to get the same model, 25 documents and up to 1500
+completion tokens. ``ModelRouter.route`` picks a tier per turn from signals
+that are already at hand once retrieval is done:
+
+- the question: word count, several questions in one, scoping or comparison terms
+- how the intent router decided (regexes, or the embedding classifier when unsure)
+- retrieval confidence: the top cosine similarity and its lead over the mean of the hits
+- a corrected answer to a similar question (close, but below the reuse threshold)
+
+``simple`` answers with the small model, fewer documents and a short answer
+cap; ``complex`` gets more documents and room for a longer answer; the rest
+stays on the standard path. Each decision is stored with the trace, and
+``routing_report`` sets every tier's tokens and latency against its feedback.
+"""
+
+import re
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from app.llm import CHAT_MODEL_PROFILE, COMPLEX_CHAT_MODEL_PROFILE, SIMPLE_CHAT_MODEL_PROFILE
+from app.metrics import metrics_registry
+from config import (
+    MODEL_ROUTING, ROUTING_COMPLEX_MIN_WORDS, ROUTING_NEAR_CORRECTION, ROUTING_SIMPLE_MAX_WORDS,
+    ROUTING_SIMPLE_MIN_SCORE, ROUTING_SIMPLE_MIN_SPREAD
+)
+
+# Tier -> model profile and documents put in the prompt
+ROUTING_TIERS = {
+    "simple": {"model_profile": SIMPLE_CHAT_MODEL_PROFILE, "k": 8},
+    "standard": {"model_profile": CHAT_MODEL_PROFILE, "k": 25},
+    "complex": {"model_profile": COMPLEX_CHAT_MODEL_PROFILE, "k": 30},
+}
+# Retrieval depth before routing; complex turns top up to their own k afterwards
+ROUTING_SEARCH_K = ROUTING_TIERS["standard"]["k"]
+
+# Comparisons, plans and scoping need more context than a lookup
+COMPLEX_RE = re.compile(
+    r"\b(?:compar\w*|differen\w*|versus|vs|step[- ]by[- ]step|plan|planning|scop\w*|roadmap|architecture"
+    r"|requirements?|estimat\w*|trade-?offs?|pros\s+and\s+cons)\b",
+    re.IGNORECASE
+)
+# "1. ... 2. ..." or "- ..." lists inside one message
+LIST_RE = re.compile(r"(?:^|\n)\s*(?:\d+[.)]|[-*•])\s+\S.*\n\s*(?:\d+[.)]|[-*•])\s+\S")
+
+ROUTED_TURNS = metrics_registry.counter(
+    "chat_routed_turns_total", "Retrieval turns by routing tier and reason", ("tier", "reason"))
+
+
+class ModelRouter:
+    """Picks model, k and max_tokens for a retrieval turn."""
+
+    def __init__(self, enabled: bool = MODEL_ROUTING, simple_max_words: int = ROUTING_SIMPLE_MAX_WORDS,
+                 complex_min_words: int = ROUTING_COMPLEX_MIN_WORDS, simple_min_score: float = ROUTING_SIMPLE_MIN_SCORE,
+                 simple_min_spread: float = ROUTING_SIMPLE_MIN_SPREAD, near_correction: float = ROUTING_NEAR_CORRECTION):
+        self.enabled = enabled
+        self.simple_max_words = simple_max_words
+        self.complex_min_words = complex_min_words
+        self.simple_min_score = simple_min_score
+        self.simple_min_spread = simple_min_spread
+        self.near_correction = near_correction
+
+    def _decide(self, question: str, words: int, top: float, spread: float, intent_reason: str,
+                corrected_similarity: float) -> Tuple[str, str]:
+        if not self.enabled:
+            return "standard", "disabled"
+        if corrected_similarity >= self.near_correction:
+            # A similar question already got a thumbs-down answer
+            return "complex", "near_correction"
+        if words >= self.complex_min_words:
+            return "complex", "long_question"
+        if question.count("?") >= 2 or LIST_RE.search(question):
+            return "complex", "multi_part"
+        if COMPLEX_RE.search(question):
+            return "complex", "scoping_terms"
+        if words > self.simple_max_words:
+            return "standard", "default"
+        if intent_reason == "embedding_classifier":
+            return "standard", "ambiguous_intent"
+        if top < self.simple_min_score or spread < self.simple_min_spread:
+            return "standard", "low_retrieval_confidence"
+        return "simple", "short_confident"
+
+    def route(self, question: str, hits: List[Tuple[Any, float]], intent_reason: str = "",
+              corrected_similarity: float = 0.0) -> Dict[str, Any]:
+        """Tier for one turn given its scored hits: {"tier", "reason", "model_profile", "model", "k", "max_tokens", "signals"}."""
+        scores = [score for _, score in hits]
+        top = max(scores) if scores else 0.0
+        spread = top - sum(scores) / len(scores) if scores else 0.0
+        words = len(question.split())
+        tier, reason = self._decide(question, words, top, spread, intent_reason, corrected_similarity)
+        ROUTED_TURNS.inc(tier=tier, reason=reason)
+        profile = ROUTING_TIERS[tier]["model_profile"]
+        return {
+            "tier": tier,
+            "reason": reason,
+            "model_profile": profile,
+            "model": profile[0],
+            "k": ROUTING_TIERS[tier]["k"],
+            "max_tokens": profile[2],
+            "signals": {
+                "words": words,
+                "top_score": round(top, 4),
+                "score_spread": round(spread, 4),
+                "intent_reason": intent_reason,
+                "corrected_similarity": round(corrected_similarity, 3)
+            }
+        }
+
+
+def routing_report(traces: Iterable[Dict[str, Any]],
+                   feedback_stats: Callable[[str], Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per tier: turns, mean tokens, time to first token and thumbs up/down over routed traces."""
+    tiers: Dict[str, Dict[str, Any]] = {}
+    for trace in traces:
+        route = trace.get("route")
+        if not route:
+            continue
+        tier = tiers.setdefault(route["tier"], {"turns": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                                "ttft_ms": [], "thumbs_up": 0, "thumbs_down": 0})
+        usage = trace.get("usage") or {}
+        tier["turns"] += 1
+        tier["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        tier["completion_tokens"] += usage.get("completion_tokens") or 0
+        if usage.get("time_to_first_token_ms") is not None:
+            tier["ttft_ms"].append(usage["time_to_first_token_ms"])
+        stats = feedback_stats(trace["trace_id"])
+        tier["thumbs_up"] += stats["positive_count"]
+        tier["thumbs_down"] += stats["negative_count"]
+
+    report = {}
+    for name, tier in tiers.items():
+        ttft = sorted(tier["ttft_ms"])
+        rated = tier["thumbs_up"] + tier["thumbs_down"]
+        report[name] = {
+            "turns": tier["turns"],
+            "avg_prompt_tokens": round(tier["prompt_tokens"] / tier["turns"], 1),
+            "avg_completion_tokens": round(tier["completion_tokens"] / tier["turns"], 1),
+            "p50_time_to_first_token_ms": ttft[len(ttft) // 2] if ttft else None,
+            "thumbs_up": tier["thumbs_up"],
+            "thumbs_down": tier["thumbs_down"],
+            "thumbs_up_rate": round(tier["thumbs_up"] / rated, 3) if rated else None
+        }
+    return report
+
+
+# Global router (per server process)
+model_router = ModelRouter()
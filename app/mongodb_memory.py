@@ -5,7 +5,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure, DuplicateKeyError
 import logging
 
-from config import MONGODB_URL, MONGODB_DATABASE, MONGODB_CHAT_COLLECTION
+from config import MONGODB_URL, MONGODB_DATABASE, MONGODB_CHAT_COLLECTION, HISTORY_MESSAGES
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -91,7 +91,11 @@ class MongoDBMemoryManager:
         
         try:
             # Get current conversation
-            conversation = await self.get_or_create_user_conversation(user_id)
+            user_doc = await self.collection.find_one({"user_id": user_id}) or {}
+            conversation = user_doc.get("messages", [])
+            # Messages ever added (older ones are trimmed below); the rolling summary
+            # records how many of them it covers
+            message_total = user_doc.get("message_total", len(conversation)) + 1
             
             # Add new message
             new_message = {
@@ -111,8 +115,10 @@ class MongoDBMemoryManager:
                 {
                     "$set": {
                         "messages": conversation,
+                        "message_total": message_total,
                         "last_updated": datetime.utcnow()
-                    }
+                    },
+                    "$setOnInsert": {"created_at": datetime.utcnow()}
                 },
                 upsert=True
             )
@@ -135,6 +141,60 @@ class MongoDBMemoryManager:
         
         return context
     
+    async def get_conversation_window(self, user_id: str, limit: int = HISTORY_MESSAGES,
+                                      with_summary: bool = True) -> Dict:
+        """Rolling summary plus the messages it does not cover yet.
+
+        Returns {"summary", "messages" (last ``limit`` uncovered), "pending"
+        (all uncovered), "summarized_total"}. Without ``with_summary`` the
+        summary is ignored and messages are simply the last ``limit``.
+        """
+        await self.connect()
+        
+        window = {"summary": "", "messages": [], "pending": [], "summarized_total": 0}
+        try:
+            user_doc = await self.collection.find_one(
+                {"user_id": user_id},
+                {"messages": 1, "message_total": 1, "summary": 1, "summarized_total": 1}
+            )
+            if not user_doc:
+                return window
+            messages = user_doc.get("messages", [])
+            if not with_summary:
+                window.update(messages=messages[-limit:] if limit > 0 else [], pending=messages)
+                return window
+            summarized_total = user_doc.get("summarized_total", 0)
+            first_index = user_doc.get("message_total", len(messages)) - len(messages)
+            pending = messages[max(0, summarized_total - first_index):]
+            window.update(
+                summary=user_doc.get("summary", "") if summarized_total else "",
+                messages=pending[-limit:] if limit > 0 else [],
+                pending=pending,
+                summarized_total=summarized_total
+            )
+        except Exception as e:
+            logger.error(f"Error getting conversation window for user {user_id}: {e}")
+        return window
+    
+    async def update_summary(self, user_id: str, summary: str, summarized_total: int,
+                             expected_summarized_total: int) -> bool:
+        """Store a new rolling summary unless another writer (or a clear) got there first."""
+        await self.connect()
+        
+        try:
+            result = await self.collection.update_one(
+                {
+                    "user_id": user_id,
+                    "summarized_total": expected_summarized_total or {"$in": [0, None]},
+                    "message_total": {"$gte": summarized_total}
+                },
+                {"$set": {"summary": summary, "summarized_total": summarized_total}}
+            )
+            return result.modified_count == 1
+        except Exception as e:
+            logger.error(f"Error updating conversation summary for user {user_id}: {e}")
+            return False
+    
     async def get_user_chat_history(self, user_id: str) -> List[Dict[str, str]]:
         """Get full chat history for a user."""
         return await self.get_or_create_user_conversation(user_id)
@@ -149,6 +209,9 @@ class MongoDBMemoryManager:
                 {
                     "$set": {
                         "messages": [],
+                        "message_total": 0,
+                        "summary": "",
+                        "summarized_total": 0,
                         "last_updated": datetime.utcnow()
                     }
                 },
@@ -214,6 +277,14 @@ async def get_conversation_context(user_id: str) -> str:
     """Get formatted conversation context for a user."""
     return await mongodb_memory.get_conversation_context(user_id)
 
+async def get_conversation_window(user_id: str, limit: int = HISTORY_MESSAGES, with_summary: bool = True) -> Dict:
+    """Get the rolling summary and the recent messages it does not cover."""
+    return await mongodb_memory.get_conversation_window(user_id, limit, with_summary)
+
+async def update_summary(user_id: str, summary: str, summarized_total: int, expected_summarized_total: int) -> bool:
+    """Store a new rolling summary (compare-and-set on the covered message count)."""
+    return await mongodb_memory.update_summary(user_id, summary, summarized_total, expected_summarized_total)
+
 async def get_user_chat_history(user_id: str) -> List[Dict[str, str]]:
     """Get full chat history for a user."""
     return await mongodb_memory.get_user_chat_history(user_id)
@@ -105,7 +105,8 @@ def process_pdf_directory(pdf_directory: str) -> List[Document]:
                     metadata={
                         "source": pdf_file,
                         "source_type": source_type,
-                        "file_path": pdf_path
+                        "file_path": pdf_path,
+                        "modified_at": int(os.path.getmtime(pdf_path))
                     }
                 )
                 documents.append(doc)
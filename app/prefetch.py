@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Speculative retrieval while the user is typing.
+
+The frontend posts the debounced input to /chat/prefetch. If the text would
+be searched as it is (no follow-up that needs condensing), the query is
+embedded and searched off the event loop and the result is kept per
+conversation for a short time. When the final question arrives, a prefetch
+whose text matches it, or overlaps it closely, supplies the documents and the
+"Thinking..." phase skips the embedding and search.
+
+Prefetches are speculative, so they never queue: a small admission pool
+rejects them per session (rate, one at a time) and when the server is busy.
+"""
+
+import asyncio
+import json
+import re
+import time
+from typing import Any, Dict, Optional
+
+from app.admission import AdmissionController
+from app.cache import TTLCache
+from app.coalescing import normalize_question
+from app.metrics import metrics_registry
+from config import (
+    PREFETCH_ENABLED, PREFETCH_MAX_IN_FLIGHT, PREFETCH_MIN_CHARS, PREFETCH_MIN_OVERLAP,
+    PREFETCH_RATE_PER_MINUTE, PREFETCH_TTL
+)
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+PREFETCH_LOOKUPS = metrics_registry.counter(
+    "prefetch_lookups_total", "Final questions checked against a prefetch, by outcome", ("outcome",))
+
+
+def overlap(a: str, b: str) -> float:
+    """Word-set Jaccard similarity of two texts (0..1)."""
+    words_a, words_b = set(WORD_RE.findall(a.lower())), set(WORD_RE.findall(b.lower()))
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+class PrefetchCache:
+    """Latest prefetched retrieval per conversation, matched against the final question."""
+
+    def __init__(self, enabled: bool = PREFETCH_ENABLED, ttl_seconds: float = PREFETCH_TTL,
+                 min_overlap: float = PREFETCH_MIN_OVERLAP):
+        self.enabled = enabled
+        self.min_overlap = min_overlap
+        self._entries = TTLCache(ttl_seconds, max_entries=10000)
+
+    @staticmethod
+    def _filters_key(where: Optional[dict]) -> str:
+        return json.dumps(where, sort_keys=True)
+
+    def store(self, conversation_id: str, text: str, where: Optional[dict], kb_version: Any,
+              query_embedding: list, hits: list):
+        self._entries.set(conversation_id, {
+            "text": text,
+            "normalized": normalize_question(text),
+            "filters": self._filters_key(where),
+            "kb_version": kb_version,
+            "query_embedding": query_embedding,
+            "hits": hits,
+            "at": time.time()
+        })
+
+    def current(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(conversation_id)
+
+    def lookup(self, conversation_id: str, question: str, where: Optional[dict],
+               kb_version: Any) -> Optional[Dict[str, Any]]:
+        """The prefetch for this question, with ``match`` set to "exact" or "overlap"; None on a miss.
+
+        Exact matches (after normalization) also reuse the query embedding.
+        Overlapping text - the user kept typing, or edited a word - reuses the
+        documents only.
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.pop(conversation_id)
+        if entry is None:
+            PREFETCH_LOOKUPS.inc(outcome="none")
+            return None
+        if entry["filters"] != self._filters_key(where) or entry["kb_version"] != kb_version:
+            PREFETCH_LOOKUPS.inc(outcome="stale")
+            return None
+        if entry["normalized"] == normalize_question(question):
+            match = "exact"
+        elif overlap(entry["text"], question) >= self.min_overlap:
+            match = "overlap"
+        else:
+            PREFETCH_LOOKUPS.inc(outcome="mismatch")
+            return None
+        PREFETCH_LOOKUPS.inc(outcome=match)
+        return dict(entry, match=match)
+
+    async def prefetch(self, conversation_id: str, text: str, where: Optional[dict], kb_version: Any,
+                       embeddings, search) -> int:
+        """Embed and search ``text`` off the event loop and keep the scored hits; returns their count.
+
+        A repeat of the text already prefetched for this conversation is free.
+        """
+        entry = self.current(conversation_id)
+        if (entry and entry["normalized"] == normalize_question(text)
+                and entry["filters"] == self._filters_key(where) and entry["kb_version"] == kb_version):
+            return len(entry["hits"])
+        query_embedding = await asyncio.to_thread(embeddings.embed_query, text)
+        hits = await asyncio.to_thread(search, query_embedding)
+        self.store(conversation_id, text, where, kb_version, query_embedding, hits)
+        return len(hits)
+
+
+def worth_prefetching(text: str) -> bool:
+    return len(text.strip()) >= PREFETCH_MIN_CHARS
+
+
+# Global cache and admission pool (per server process): one prefetch per session at a time,
+# never queued, rate-limited per session
+prefetch_cache = PrefetchCache()
+prefetch_admission = AdmissionController(
+    max_in_flight=PREFETCH_MAX_IN_FLIGHT, queue_size=0, queue_timeout=0,
+    user_rate_per_minute=PREFETCH_RATE_PER_MINUTE, user_burst=5, user_max_concurrent=1, pool="prefetch"
+)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-compiled prompt templates shared by the chat and auto-correction paths.
+
+Templates are built once at import time so request handlers only format them.
+"""
+
+from functools import lru_cache
+
+from langchain_core.prompts import ChatPromptTemplate
+from app.tokens import count_message_tokens
+from config import SYSTEM_PROMPT
+
+# RAG_PROMPT is laid out for provider-side prompt caching, which matches on the
+# longest identical prefix: SYSTEM_PROMPT (with its static link list) first, then
+# the part that repeats across users (retrieved context), then per-conversation text.
+
+# Knowledge-base answers (/chat and /chat/stream)
+# {history} is the budgeted block from app/conversation.py, empty on a first turn
+RAG_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    ("human", "Context: {context}\n\n{history}Question: {question}")
+]).partial(history="")
+
+
+@lru_cache(maxsize=None)
+def rag_prompt_overhead(model: str) -> int:
+    """Tokens of RAG_PROMPT with empty context, history and question (counted once per model)."""
+    return count_message_tokens(RAG_PROMPT.format_messages(context="", history="", question=""), model)
+
+
+# Greetings and small talk, no document retrieval
+# Kept short on purpose: small-talk prompts never reach the 1024-token cache minimum,
+# so sharing SYSTEM_PROMPT would only add ~600 uncached tokens per turn
+CONVERSATIONAL_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a friendly and helpful AI assistant. Respond naturally to conversational queries like greetings, 'how are you', etc. Be warm and engaging."),
+    ("human", "{history}{question}")
+]).partial(history="")
+
+# Follow-up question -> standalone search query (conversation-aware retrieval)
+CONDENSE_PROMPT = ChatPromptTemplate.from_messages([
+    ("human", """Rewrite the user's latest message as one short, standalone search query for a knowledge base.
+Resolve pronouns and references ("it", "that", "the second option") using the conversation, and keep product names and specifics.
+Reply with the query only - no quotes, no explanation.
+
+Conversation:
+{history}
+
+Latest message: {question}
+
+Standalone search query:""")
+])
+
+# Knowledge-base grounded correction of a thumbs-down answer
+CORRECTION_PROMPT = ChatPromptTemplate.from_messages([
+    ("human", """
+You are an expert assistant specializing in Slack to Microsoft Teams migrations via CloudFuze.
+
+KNOWLEDGE BASE CONTEXT:
+{context}
+
+PREVIOUS INTERACTION:
+User's Question: "{user_query}"
+Bot's Poor Response: "{bad_response}"
+{feedback_line}
+
+TASK:
+Using ONLY the information from the KNOWLEDGE BASE CONTEXT above, provide a much better, more accurate, and helpful response that:
+1. Directly answers the user's question about Slack to Teams migration
+2. Uses specific information from the knowledge base documents
+3. Provides actionable information about CloudFuze's capabilities
+4. Is clear, professional, and helpful
+5. Follows the same style and formatting as the system prompt
+
+IMPORTANT: Base your answer strictly on the knowledge base context provided above.
+
+Improved response:
+""")
+])
+
+# Rolling conversation summary: fold older turns into the stored summary
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("human", """Update the running summary of a support conversation with the messages below.
+Keep what later questions may refer to: the user's goal, products and versions, numbers, decisions, open questions and what the assistant already explained.
+Drop greetings and filler. Write at most {max_words} words of plain prose, no headings.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:""")
+])
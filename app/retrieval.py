@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Filtered and per-source retrieval over the Chroma collection.
+
+Every chunk carries ``source_type`` (web / pdf / excel / doc), ``source``
+(file name, or ``cloudfuze_blog``) and ``modified_at`` (file mtime or fetch
+time, epoch seconds). ``build_where`` turns request filters into a Chroma
+``where`` clause so a search only scans the matching slice of the collection.
+
+``search_by_source`` fans one query out as a small sub-query per source type,
+runs them concurrently and merges the hits by weighted relevance. Weights and
+per-source k live in ``./data/source_weights.json`` and are edited through the
+admin endpoints; with fan-out disabled (the default) searches stay a single
+global top-k.
+
+``search_ids`` is the chat path's entry point: it returns (chunk id,
+cosine similarity) pairs without document payloads, and ``load_chunks`` resolves ids
+through the shared chunk store (app/chunk_store.py), fetching text only for
+chunks this process has not seen yet.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.chroma_index import CHROMA_DEFAULTS
+from app.chunk_store import chunk_store
+from app.compact_index import compact_search
+from app.shared_files import FileLock, atomic_write_json
+
+SOURCE_TYPES = ("web", "pdf", "excel", "doc")
+SOURCE_WEIGHTS_FILE = "./data/source_weights.json"
+
+DEFAULT_SOURCE_CONFIG = {
+    "enabled": False,  # Fan every search out per source type
+    "weights": {"web": 1.0, "pdf": 1.0, "excel": 1.0, "doc": 1.0},  # 0 skips a source
+    "k": {"web": 15, "pdf": 8, "excel": 4, "doc": 8}
+}
+
+FILTER_KEYS = ("source_types", "sources", "since", "until")
+
+_executor = ThreadPoolExecutor(max_workers=len(SOURCE_TYPES) * 2, thread_name_prefix="retrieval")
+
+
+def _timestamp(value: Any) -> int:
+    """Epoch seconds from a number or an ISO date/datetime string."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(str(value)).timestamp())
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r}")
+
+
+def _as_list(value: Any) -> List[str]:
+    return [value] if isinstance(value, str) else list(value or [])
+
+
+def build_where(source_types=None, sources=None, since=None, until=None) -> Optional[Dict[str, Any]]:
+    """Chroma ``where`` clause for the given filters; None when nothing is filtered."""
+    clauses = []
+    source_types = _as_list(source_types)
+    unknown = [t for t in source_types if t not in SOURCE_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown source types: {unknown}")
+    if source_types:
+        clauses.append({"source_type": {"$in": source_types}})
+    sources = _as_list(sources)
+    if sources:
+        clauses.append({"source": {"$in": sources}})
+    if since is not None:
+        clauses.append({"modified_at": {"$gte": _timestamp(since)}})
+    if until is not None:
+        clauses.append({"modified_at": {"$lte": _timestamp(until)}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def parse_filters(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Validate the ``filters`` object of a chat request and build its where clause."""
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    unknown = [key for key in filters if key not in FILTER_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown filter keys: {unknown}")
+    return build_where(**filters)
+
+
+def _and(*clauses: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _filtered_source_types(where: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """Source types a where clause already restricts to, so fan-out skips the rest."""
+    for clause in (where or {}).get("$and", [where] if where else []):
+        if "source_type" in clause:
+            return clause["source_type"]["$in"]
+    return None
+
+
+class SourceConfig:
+    """Admin-editable per-source weights and sub-query k, persisted as JSON.
+
+    Every server worker re-reads the file when its mtime changes, so an update
+    made through one worker applies to all of them.
+    """
+
+    def __init__(self, path: str = SOURCE_WEIGHTS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._config = None
+        self._mtime = None
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self) -> Dict[str, Any]:
+        mtime = self._file_mtime()
+        if self._config is None or mtime != self._mtime:
+            with self._lock:
+                self._config, self._mtime = self._load(), mtime
+        return self._config
+
+    def _load(self) -> Dict[str, Any]:
+        config = json.loads(json.dumps(DEFAULT_SOURCE_CONFIG))
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+                config["enabled"] = bool(stored.get("enabled", config["enabled"]))
+                config["weights"].update(stored.get("weights", {}))
+                config["k"].update(stored.get("k", {}))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[WARNING] Could not load source weights, using defaults: {e}")
+        return config
+
+    def update(self, enabled: Optional[bool] = None, weights: Optional[Dict[str, float]] = None,
+               k: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """Validate and persist a partial update; returns the new config."""
+        for name, values in (("weights", weights), ("k", k)):
+            unknown = [t for t in values or {} if t not in SOURCE_TYPES]
+            if unknown:
+                raise ValueError(f"Unknown source types in {name}: {unknown}")
+            if any(not isinstance(v, (int, float)) or v < 0 for v in (values or {}).values()):
+                raise ValueError(f"{name} must be non-negative numbers")
+
+        with self._lock, FileLock(self.path + ".lock"):
+            config = self._load()  # latest on disk, another worker may have changed it
+            if enabled is not None:
+                config["enabled"] = bool(enabled)
+            config["weights"].update({t: float(w) for t, w in (weights or {}).items()})
+            config["k"].update({t: int(n) for t, n in (k or {}).items()})
+
+            atomic_write_json(self.path, config, indent=2)
+            self._config, self._mtime = config, self._file_mtime()
+        return config
+
+
+# Global source configuration
+source_config = SourceConfig()
+
+
+def _backend(vectorstore):
+    """The compact index when compact mode is on, else the Chroma store itself."""
+    return compact_search(vectorstore) or vectorstore
+
+
+def _similarity_fn(backend):
+    """Distance -> cosine similarity, so scores mean the same on every backend and distance space."""
+    if hasattr(backend, "similarity_search_ids_by_vector"):
+        return lambda distance: 1.0 - distance  # compact and mmap indexes report cosine distance
+    space = (backend._collection.metadata or {}).get("hnsw:space", CHROMA_DEFAULTS["hnsw:space"])
+    if space == "l2":
+        # Chroma reports squared L2, which is 2 - 2 * cosine on unit-length embeddings
+        return lambda distance: 1.0 - distance / 2.0
+    return lambda distance: 1.0 - distance  # cosine, and ip on unit-length embeddings
+
+
+def search_scored(vectorstore, query_embedding: List[float], k: int,
+                  where: Optional[Dict[str, Any]] = None) -> List[Tuple[Any, float]]:
+    """Top-k (document, cosine similarity) restricted to ``where``."""
+    backend = _backend(vectorstore)
+    relevance = _similarity_fn(backend)
+    hits = backend.similarity_search_by_vector_with_relevance_scores(query_embedding, k=k, filter=where)
+    return [(doc, relevance(distance)) for doc, distance in hits]
+
+
+def search_ids_scored(vectorstore, query_embedding: List[float], k: int,
+                      where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+    """Top-k (chunk id, cosine similarity) restricted to ``where``; no documents are read."""
+    backend = _backend(vectorstore)
+    relevance = _similarity_fn(backend)
+    if hasattr(backend, "similarity_search_ids_by_vector"):
+        hits = backend.similarity_search_ids_by_vector(query_embedding, k=k, filter=where)
+    else:
+        result = backend._collection.query(query_embeddings=[query_embedding], n_results=k, where=where,
+                                           include=["distances"])
+        hits = zip(result["ids"][0], result["distances"][0])
+    return [(chunk_id, relevance(distance)) for chunk_id, distance in hits]
+
+
+def _merge_by_source(search_fn, vectorstore, query_embedding: List[float], k: int,
+                     where: Optional[Dict[str, Any]], config: Optional[Dict[str, Any]]) -> List[Tuple[Any, float]]:
+    """Run ``search_fn`` once per source type concurrently and merge its (hit, score) by weighted relevance."""
+    config = config or source_config.get()
+    source_types = _filtered_source_types(where) or SOURCE_TYPES
+    plans = [
+        (source_type, config["weights"].get(source_type, 1.0), config["k"].get(source_type, k))
+        for source_type in source_types
+    ]
+    plans = [(t, w, n) for t, w, n in plans if w > 0 and n > 0]
+
+    futures = [
+        (weight, _executor.submit(search_fn, vectorstore, query_embedding, sub_k,
+                                  _and({"source_type": source_type}, where)))
+        for source_type, weight, sub_k in plans
+    ]
+    merged = []
+    for weight, future in futures:
+        try:
+            merged.extend((score * weight, hit) for hit, score in future.result())
+        except Exception as e:
+            print(f"[WARNING] Source sub-query failed: {e}")
+
+    merged.sort(key=lambda hit: hit[0], reverse=True)
+    return [(hit, score) for score, hit in merged[:k]]
+
+
+def search_by_source_scored(vectorstore, query_embedding: List[float], k: int,
+                            where: Optional[Dict[str, Any]] = None,
+                            config: Optional[Dict[str, Any]] = None) -> List[Tuple[Any, float]]:
+    """One concurrent sub-query per source type, merged by weighted relevance: (document, weighted score)."""
+    return _merge_by_source(search_scored, vectorstore, query_embedding, k, where, config)
+
+
+def search_by_source(vectorstore, query_embedding: List[float], k: int,
+                     where: Optional[Dict[str, Any]] = None,
+                     config: Optional[Dict[str, Any]] = None) -> List[Any]:
+    """One concurrent sub-query per source type, merged by weighted relevance."""
+    return [doc for doc, _ in search_by_source_scored(vectorstore, query_embedding, k, where, config)]
+
+
+def search_with_scores(vectorstore, query_embedding: List[float], k: int,
+                       where: Optional[Dict[str, Any]] = None) -> List[Tuple[Any, float]]:
+    """Like ``search``, with each document's relevance (weighted when fanned out per source)."""
+    if source_config.get()["enabled"]:
+        return search_by_source_scored(vectorstore, query_embedding, k, where)
+    return search_scored(vectorstore, query_embedding, k, where)
+
+
+def search_ids(vectorstore, query_embedding: List[float], k: int,
+               where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+    """Like ``search_with_scores`` but (chunk id, similarity) pairs; resolve them with ``load_chunks``."""
+    if source_config.get()["enabled"]:
+        return _merge_by_source(search_ids_scored, vectorstore, query_embedding, k, where, None)
+    return search_ids_scored(vectorstore, query_embedding, k, where)
+
+
+def _fetch_chunks(vectorstore, chunk_ids: List[str]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """(id, text, metadata) of ``chunk_ids`` from the backend, in one batched read."""
+    if hasattr(vectorstore, "get_chunks"):
+        return vectorstore.get_chunks(chunk_ids)
+    found = vectorstore._collection.get(ids=chunk_ids, include=["documents", "metadatas"])
+    return list(zip(found["ids"], found["documents"], found["metadatas"]))
+
+
+def load_chunks(vectorstore, chunk_ids: List[str]) -> List[Dict[str, Any]]:
+    """Chunk store entries for ``chunk_ids`` in order; only unseen chunks are read from the backend."""
+    return chunk_store.get_many(chunk_ids, lambda missing: _fetch_chunks(vectorstore, missing))
+
+
+def search(vectorstore, query_embedding: List[float], k: int,
+           where: Optional[Dict[str, Any]] = None) -> List[Any]:
+    """Retrieval entry point: per-source fan-out when enabled, else one (filtered) top-k."""
+    if source_config.get()["enabled"]:
+        return search_by_source(vectorstore, query_embedding, k, where)
+    return _backend(vectorstore).similarity_search_by_vector(query_embedding, k=k, filter=where)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Process-safe building blocks for the file-backed stores.
+
+With several uvicorn / gunicorn workers every process holds its own copy of
+the module-level stores, all backed by the same files under ./data:
+
+- ``FileLock``: advisory ``flock`` on a sidecar ``.lock`` file, exclusive or
+  shared. The sidecar survives log rewrites, unlike a lock on the log itself
+- ``SharedLog``: append-only JSONL file many processes append to. Each process
+  remembers the generation and byte offset it has read up to, so catching up
+  with other workers is two ``stat`` calls when nothing changed and a read of
+  only the new tail when something did. A rewrite (compaction) bumps the
+  generation - the log's inode plus the lock file's mtime, which the rewriter
+  touches because a freed inode number can come back for the next rewrite
+- ``atomic_write_json``: temp file + ``os.replace`` so readers never see a
+  half-written JSON document
+
+Lock order is always: the store's thread lock first, then the file lock.
+"""
+
+import json
+import os
+from typing import Any, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, locks are no-ops (run a single worker)
+    fcntl = None
+
+
+class FileLock:
+    """Advisory inter-process lock on ``path`` (created on demand)."""
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock; with blocking=False returns False instead of waiting."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            flags = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(fd, flags if blocking else flags | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def atomic_write_json(path: str, data: Any, **dump_kwargs):
+    """Write JSON to a temp file next to ``path`` and swap it in."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+
+class SharedLog:
+    """JSONL log appended to by several processes, read incrementally by each."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.offset = 0
+        self._generation: Optional[tuple] = None
+        self._read = False
+
+    def _stat(self) -> Tuple[Optional[tuple], int]:
+        """(generation, size); generation is None when the log does not exist."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, 0
+        try:
+            stamp = os.stat(self.lock_path).st_mtime_ns
+        except FileNotFoundError:
+            stamp = 0
+        return (st.st_ino, stamp), st.st_size
+
+    def _bump_generation(self):
+        with open(self.lock_path, "a+b") as f:
+            f.seek(0)
+            count = int(f.read() or 0) + 1
+            f.truncate(0)
+            f.write(str(count).encode())
+
+    def changed(self) -> bool:
+        """True when another process appended to or rewrote the log (one stat)."""
+        generation, size = self._stat()
+        return not self._read or generation != self._generation or size != self.offset
+
+    def position(self) -> Tuple[Optional[tuple], int]:
+        """(generation, offset) read up to; pass to ``rewrite`` as ``since``."""
+        return self._generation, self.offset
+
+    def locked(self, shared: bool = False) -> FileLock:
+        return FileLock(self.lock_path, shared=shared)
+
+    def read_new(self) -> Tuple[bool, List[Tuple[int, dict]]]:
+        """(reset, [(offset, record)]) for lines not read yet; call with the lock held.
+
+        reset is True the first time and whenever the log was replaced or
+        removed - the records are then the whole file and the caller rebuilds
+        its state from scratch.
+        """
+        generation, size = self._stat()
+        reset = not self._read or generation != self._generation or size < self.offset
+        position = 0 if reset else self.offset
+        records = []
+        if generation is not None:
+            with open(self.path, "rb") as f:
+                f.seek(position)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # partial line of an interrupted write
+                    line_offset, position = position, position + len(raw)
+                    if not raw.strip():
+                        continue
+                    try:
+                        records.append((line_offset, json.loads(raw)))
+                    except json.JSONDecodeError:
+                        print(f"[WARNING] Skipping corrupt line in {self.path}")
+        self._generation, self.offset, self._read = generation, position, True
+        return reset, records
+
+    def append(self, record: dict) -> int:
+        """Append one record and return its byte offset; call with the exclusive lock held."""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        self._generation = self._stat()[0]
+        self.offset = offset + len(line)
+        return offset
+
+    def rewrite(self, records: Iterable[dict], since: Optional[Tuple[Optional[int], int]] = None) -> bool:
+        """Replace the log with ``records``; call with the exclusive lock held.
+
+        With ``since`` (a ``position()``), the records were snapshotted there and
+        any lines appended after it are carried over. Returns False (nothing
+        written) if the log was replaced since that position was taken.
+        """
+        generation, _ = self._stat()
+        if since is not None and generation != since[0]:
+            return False
+        tmp_path = f"{self.path}.compact.{os.getpid()}"
+        with open(tmp_path, "wb") as out:
+            for record in records:
+                out.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            if since is not None and generation is not None:
+                with open(self.path, "rb") as f:
+                    f.seek(since[1])
+                    while True:
+                        block = f.read(1 << 20)
+                        if not block:
+                            break
+                        out.write(block)
+        os.replace(tmp_path, self.path)
+        self._bump_generation()
+        self._generation, self.offset = self._stat()
+        return True
+
+    def remove(self):
+        """Delete the log; call with the exclusive lock held."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._bump_generation()
+        self._generation, self.offset = None, 0
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Token counting helpers shared by metrics, budgeting and prompt assembly.
+"""
+
+from functools import lru_cache
+from typing import Iterable
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+@lru_cache(maxsize=16)
+def _encoding_for(model: str):
+    """Encoding for a model, or None if it cannot be loaded (cached so it is tried once)."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base" if model.startswith(("gpt-4o", "gpt-4.1")) else "cl100k_base")
+    except Exception as e:
+        # e.g. the BPE file cannot be downloaded on an offline host
+        print(f"[WARNING] tiktoken encoding for {model} unavailable, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Count tokens for a model, falling back to ~4 characters per token."""
+    if not text:
+        return 0
+    encoding = _encoding_for(model) if TIKTOKEN_AVAILABLE else None
+    if encoding is not None:
+        try:
+            return len(encoding.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(messages: Iterable, model: str = "gpt-4o-mini") -> int:
+    """Count prompt tokens for LangChain messages (content plus per-message overhead)."""
+    total = 0
+    for message in messages:
+        content = getattr(message, "content", message)
+        total += count_tokens(content if isinstance(content, str) else str(content), model) + 4
+    return total + 2
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Keep the first ``max_tokens`` tokens of ``text`` (adds an ellipsis when cut)."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _encoding_for(model) if TIKTOKEN_AVAILABLE else None
+    if encoding is not None:
+        try:
+            return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]).rstrip() + " …"
+        except Exception:
+            pass
+    return text[:max_tokens * 4].rstrip() + " …"
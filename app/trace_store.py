@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Local trace store: the question/answer behind every trace id.
+
+Each finished chat turn is appended as one JSON line to ``traces.jsonl`` and
+kept in an in-memory LRU keyed by trace id, so feedback and auto-correction
+resolve a trace in O(1) without asking Langfuse. Retention is bounded by count
+and age; once the log has grown well past the cap it is rewritten to the
+retained traces on a background thread, off the chat turn that crossed the
+threshold (and at startup when it is already too long). All server workers
+append to the same log under a file lock and pick up each other's traces on
+lookup (``app.shared_files.SharedLog``).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.shared_files import SharedLog
+
+TRACE_LOG_FILE = "./data/traces.jsonl"
+
+# Retention
+TRACE_MAX_ENTRIES = 20000               # Traces kept in memory and on disk
+TRACE_MAX_AGE_SECONDS = 30 * 24 * 3600  # Feedback on older answers is ignored
+COMPACT_RATIO = 2                       # Rewrite the log at this many lines per kept trace
+
+
+class TraceStore:
+    """Bounded, append-only trace log with an O(1) in-memory index."""
+
+    def __init__(self, path: str = TRACE_LOG_FILE, max_entries: int = TRACE_MAX_ENTRIES,
+                 max_age_seconds: float = TRACE_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._traces: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._log = SharedLog(path)
+        self._log_lines = 0
+        self._compacting = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            with self._log.locked():
+                self._sync_locked()
+                if self._log_lines > COMPACT_RATIO * max(len(self._traces), 1):
+                    self._compact()
+            self._loaded = True
+
+    def _sync_locked(self):
+        """Fold in traces other workers appended; reload if the log was rewritten."""
+        reset, records = self._log.read_new()
+        if reset:
+            self._traces.clear()
+            self._log_lines = 0
+        for _, trace in records:
+            if "trace_id" not in trace:
+                print("[WARNING] Skipping corrupt trace log line")
+                continue
+            self._traces[trace["trace_id"]] = trace
+            self._traces.move_to_end(trace["trace_id"])
+            self._log_lines += 1
+        if records:
+            self._evict()
+
+    def _evict(self):
+        cutoff = time.time() - self.max_age_seconds
+        while self._traces:
+            oldest = next(iter(self._traces.values()))
+            if len(self._traces) <= self.max_entries and oldest.get("created_at", 0) >= cutoff:
+                break
+            self._traces.popitem(last=False)
+
+    def _compact(self):
+        """Rewrite the log with only the retained traces (thread and file lock held)."""
+        self._log.rewrite(self._traces.values())
+        self._log_lines = len(self._traces)
+
+    # ---------------- Public API ----------------
+
+    def record(self, trace_id: str, question: str, answer: str, model: Optional[str] = None,
+               chunk_ids: Optional[List[str]] = None, **extra) -> Dict[str, Any]:
+        """Store one finished chat turn."""
+        self._ensure_loaded()
+        trace = {
+            "trace_id": trace_id,
+            "question": question,
+            "answer": answer,
+            "model": model,
+            "chunk_ids": chunk_ids or [],
+            "created_at": time.time(),
+            **extra
+        }
+        with self._lock, self._log.locked():
+            self._sync_locked()
+            self._traces[trace_id] = trace
+            self._traces.move_to_end(trace_id)
+            self._log.append(trace)
+            self._log_lines += 1
+            self._evict()
+        self._maybe_compact()
+        return trace
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """Trace by id, or None if unknown or past retention."""
+        self._ensure_loaded()
+        with self._lock:
+            if trace_id not in self._traces and self._log.changed():
+                with self._log.locked(shared=True):
+                    self._sync_locked()
+            trace = self._traces.get(trace_id)
+            if trace and trace.get("created_at", 0) < time.time() - self.max_age_seconds:
+                del self._traces[trace_id]
+                return None
+            return dict(trace) if trace else None
+
+    def values(self) -> List[Dict[str, Any]]:
+        """Copies of every retained trace, oldest first (including other workers' traces)."""
+        self._ensure_loaded()
+        with self._lock:
+            if self._log.changed():
+                with self._log.locked(shared=True):
+                    self._sync_locked()
+            return [dict(trace) for trace in self._traces.values()]
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._traces)
+
+    # ---------------- Compaction ----------------
+
+    def _maybe_compact(self):
+        with self._lock:
+            if self._compacting or self._log_lines <= COMPACT_RATIO * self.max_entries:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="trace-compaction", daemon=True).start()
+
+    def compact(self):
+        """Rewrite the log with the retained traces, keeping appends made meanwhile."""
+        self._ensure_loaded()
+        with self._lock:
+            self._compacting = True
+            if self._log.changed():
+                with self._log.locked(shared=True):
+                    self._sync_locked()
+            snapshot = list(self._traces.values())
+            snapshot_position, snapshot_lines = self._log.position(), self._log_lines
+
+        try:
+            with self._lock, self._log.locked():
+                # Lines appended after the snapshot (by any worker) are carried over
+                self._sync_locked()
+                if self._log.rewrite(snapshot, since=snapshot_position):
+                    self._log_lines = len(snapshot) + self._log_lines - snapshot_lines
+        except Exception as e:
+            print(f"[WARNING] Trace log compaction failed: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+
+# Global store
+trace_store = TraceStore()
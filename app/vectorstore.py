@@ -1,15 +1,20 @@
 from app.helpers import build_vectorstore, build_combined_vectorstore
 from app.pdf_processor import process_pdf_directory, chunk_pdf_documents
-from config import url, CHROMA_DB_PATH
+from config import url, CHROMA_DB_PATH, COMPACT_INDEX_ENABLED, VECTOR_BACKEND, MMAP_INDEX_PATH
 import os
 import shutil
 import json
 import hashlib
 from datetime import datetime
-from langchain_openai import OpenAIEmbeddings
+from app.llm import model_registry
 from langchain_chroma import Chroma
+from app.chroma_index import check_index_params, SQLITE_FILE
+from app.compact_index import enable_compact_index
+from app.mmap_index import MmapVectorStore, export_collection, read_manifest
+from app.shared_files import FileLock
 
 METADATA_FILE = "./data/vectorstore_metadata.json"
+VECTORSTORE_LOCK = "./data/vectorstore.lock"
 
 def get_file_hash(file_path):
     """Get MD5 hash of a file for change detection."""
@@ -72,7 +77,8 @@ def should_rebuild_vectorstore():
     print("[*] Checking if vectorstore rebuild is needed...")
     
     # If vectorstore doesn't exist, we need to rebuild
-    if not os.path.exists(CHROMA_DB_PATH):
+    # (segment directories without chroma.sqlite3 are leftovers, not a usable store)
+    if not os.path.exists(os.path.join(CHROMA_DB_PATH, SQLITE_FILE)):
         print("[!] Vectorstore not found - rebuild needed")
         return True
     
@@ -101,7 +107,7 @@ def load_existing_vectorstore():
     """Load existing vectorstore without rebuilding."""
     print("[*] Loading existing vectorstore...")
     try:
-        embeddings = OpenAIEmbeddings()
+        embeddings = model_registry.embeddings()
         vectorstore = Chroma(
             persist_directory=CHROMA_DB_PATH,
             embedding_function=embeddings
@@ -110,6 +116,7 @@ def load_existing_vectorstore():
         # Test if vectorstore is working
         total_docs = vectorstore._collection.count()
         print(f"[OK] Loaded existing vectorstore with {total_docs} documents")
+        check_index_params(vectorstore)
         return vectorstore
     except Exception as e:
         print(f"[!] Failed to load existing vectorstore: {e}")
@@ -227,14 +234,52 @@ def manage_vectorstore_backup_and_rebuild():
     print("-" * 60)
     return rebuild_vectorstore_if_needed()
 
+def load_mmap_vectorstore(chroma_store=None):
+    """Open the memory-mapped export, (re)exporting from Chroma when it is missing or stale."""
+    stored = load_stored_metadata() or {}
+    manifest = read_manifest(MMAP_INDEX_PATH)
+    if manifest is None or manifest.get("source_timestamp") != stored.get("timestamp"):
+        if chroma_store is None:
+            return None
+        print("[*] Exporting vectorstore to the memory-mapped index...")
+        manifest = export_collection(chroma_store._collection, MMAP_INDEX_PATH, stored.get("timestamp"))
+        print(f"[OK] Exported {manifest['count']} vectors to {MMAP_INDEX_PATH}"
+              f" ({'IVF, %d lists' % manifest['nlist'] if manifest['nlist'] else 'exact search'})")
+    return MmapVectorStore(MMAP_INDEX_PATH, model_registry.embeddings())
+
 def initialize_vectorstore():
+    """Build or load the vectorstore; with several server workers only one builds.
+
+    The others wait on the lock, then find the store (and any mmap export or
+    compact index) up to date and just open it.
+    """
+    lock = FileLock(VECTORSTORE_LOCK)
+    if not lock.acquire(blocking=False):
+        print("[*] Another worker is preparing the vectorstore, waiting...")
+        lock.acquire()
+    try:
+        return _initialize_vectorstore()
+    finally:
+        lock.release()
+
+def _initialize_vectorstore():
     """Smart vectorstore initialization that only rebuilds when needed."""
     print("=" * 60)
     print(">> INITIALIZING CF-CHATBOT KNOWLEDGE BASE")
     print("=" * 60)
     
     # Check if rebuild is needed
-    if should_rebuild_vectorstore():
+    rebuilt = should_rebuild_vectorstore()
+    
+    # mmap backend: an up-to-date export is all a worker needs, Chroma is never opened
+    if VECTOR_BACKEND == "mmap" and not rebuilt:
+        vectorstore = load_mmap_vectorstore()
+        if vectorstore is not None:
+            print(f"[OK] Loaded memory-mapped vectorstore with {vectorstore.count()} documents")
+            print("=" * 60)
+            return vectorstore
+    
+    if rebuilt:
         print("[*] Rebuilding vectorstore...")
         vectorstore = rebuild_vectorstore_if_needed()
     else:
@@ -243,6 +288,23 @@ def initialize_vectorstore():
         if vectorstore is None:
             print("[!] Failed to load existing vectorstore, rebuilding...")
             vectorstore = rebuild_vectorstore_if_needed()
+            rebuilt = True
+    
+    if VECTOR_BACKEND == "mmap":
+        try:
+            vectorstore = load_mmap_vectorstore(vectorstore)
+            print("[OK] Vectorstore initialization complete (memory-mapped backend)!")
+            print("=" * 60)
+            return vectorstore
+        except Exception as e:
+            print(f"[WARNING] Memory-mapped backend unavailable, using Chroma: {e}")
+    
+    # Compact mode: searches go to the quantized index (rebuilt along with the store)
+    if COMPACT_INDEX_ENABLED:
+        try:
+            enable_compact_index(vectorstore, rebuild=rebuilt)
+        except Exception as e:
+            print(f"[WARNING] Compact index unavailable, using Chroma search: {e}")
     
     print("[OK] Vectorstore initialization complete!")
     print("=" * 60)
@@ -251,6 +313,9 @@ def initialize_vectorstore():
 # Initialize vectorstore smartly
 vectorstore = initialize_vectorstore()
 
+# Version of the knowledge base this process serves (changes only when the store is rebuilt)
+KB_VERSION = (load_stored_metadata() or {}).get("timestamp")
+
 retriever = vectorstore.as_retriever(
     search_type="similarity",
     search_kwargs={
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Admission control under overload: tail latency with and without app/admission.py.
+
+Drives the real AdmissionController with Poisson arrivals against a simulated
+backend that slows down as more turns run at once - each turn needs
+`--work` seconds of service and the backend splits `--capacity` turns' worth
+of throughput between everyone in flight, the way concurrent LLM streams and
+Chroma searches degrade together. Arrivals come from `--users` users, a few of
+them sending much more often than the rest.
+
+Reported per mode (unlimited vs admission):
+    admitted turns, 429s by reason, latency p50 / p95 / p99 of admitted turns,
+    time to a 429, peak in flight
+
+Usage:
+    python bench/bench_admission.py
+    python bench/bench_admission.py --load 2.0 --duration 30 --max-in-flight 8 --queue-size 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from replay import latency_summary
+from run_rag_bench import prepare_environment
+
+TICK = 0.01
+
+
+class SharedBackend:
+    """Processor-sharing backend: `capacity` turns run at full speed, more share it."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.active = 0
+        self.peak = 0
+
+    async def run(self, work: float):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            remaining = work
+            while remaining > 0:
+                await asyncio.sleep(TICK)
+                remaining -= TICK * min(1.0, self.capacity / self.active)
+        finally:
+            self.active -= 1
+
+
+async def run_mode(controller, args, seed: int) -> dict:
+    from app.admission import AdmissionRejected
+
+    rng = random.Random(seed)
+    backend = SharedBackend(args.capacity)
+    admitted, rejected, reject_ms = [], {}, []
+    heavy = max(1, args.users // 20)  # 5% of users send half the traffic
+    tasks = []
+
+    async def turn(user: str):
+        start = time.perf_counter()
+        ticket = None
+        if controller is not None:
+            try:
+                ticket = await controller.acquire(user)
+            except AdmissionRejected as e:
+                rejected[e.reason] = rejected.get(e.reason, 0) + 1
+                reject_ms.append((time.perf_counter() - start) * 1000)
+                return
+        try:
+            await backend.run(args.work)
+        finally:
+            if ticket:
+                ticket.release()
+        admitted.append((time.perf_counter() - start) * 1000)
+
+    rate = args.load * args.capacity / args.work  # arrivals per second
+    deadline = time.perf_counter() + args.duration
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(rng.expovariate(rate))
+        user = f"u{rng.randrange(heavy)}" if rng.random() < 0.5 else f"u{rng.randrange(heavy, args.users)}"
+        tasks.append(asyncio.create_task(turn(user)))
+    await asyncio.gather(*tasks)
+
+    return {
+        "arrivals": len(tasks),
+        "admitted": len(admitted),
+        "rejected": rejected,
+        "latency": latency_summary(admitted),
+        "rejection_ms": latency_summary(reject_ms) if reject_ms else None,
+        "peak_in_flight": backend.peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Admission control under overload")
+    parser.add_argument("--capacity", type=int, default=8, help="Turns the backend serves at full speed")
+    parser.add_argument("--work", type=float, default=0.5, help="Seconds of service per turn")
+    parser.add_argument("--load", type=float, default=1.5, help="Offered load as a multiple of capacity")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--queue-timeout", type=float, default=2.0)
+    parser.add_argument("--user-rate", type=float, default=12.0, help="Turns per user per minute")
+    parser.add_argument("--user-burst", type=int, default=6)
+    parser.add_argument("--user-concurrency", type=int, default=2)
+    parser.add_argument("--output", default="bench_admission.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    prepare_environment(os.getcwd(), blog_json="")
+    from app.admission import AdmissionController
+
+    modes = {}
+    for name in ("unlimited", "admission"):
+        controller = None
+        if name == "admission":
+            controller = AdmissionController(args.max_in_flight, args.queue_size, args.queue_timeout,
+                                             args.user_rate, args.user_burst, args.user_concurrency)
+        result = modes[name] = asyncio.run(run_mode(controller, args, seed=7))
+        print(f"[*] {name:<10} admitted={result['admitted']}/{result['arrivals']} "
+              f"p50={result['latency']['p50_ms']}ms p95={result['latency']['p95_ms']}ms p99={result['latency']['p99_ms']}ms "
+              f"peak_in_flight={result['peak_in_flight']} rejected={result['rejected']}")
+
+    results = {
+        "benchmark": "admission",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "modes": modes,
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[OK] Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Request coalescing during a question spike: upstream calls and latency.
+
+Simulates a spike where `--requests` users ask questions drawn from a small,
+skewed pool (a trending question plus a long tail) within `--spread` seconds.
+Every turn goes through app/coalescing.py's StreamCoalescer with a producer
+that does a simulated retrieval and streams the fake chat model, once with
+coalescing off and once on.
+
+Reported per mode:
+    upstream LLM streams, turns answered, time to first token p50 / p95,
+    full answer p50 / p95
+
+Usage:
+    python bench/bench_coalescing.py
+    python bench/bench_coalescing.py --requests 500 --questions 20 --spread 2.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeChatModel
+from replay import latency_summary
+from run_rag_bench import prepare_environment
+
+
+async def run_mode(enabled: bool, args) -> dict:
+    from langchain_core.messages import HumanMessage
+    from app.coalescing import StreamCoalescer, normalize_question
+    from app.metrics import ChatTurn
+
+    coalescer = StreamCoalescer(enabled)
+    llm = FakeChatModel(first_token_delay=args.first_token_delay, token_delay=args.token_delay,
+                        answer_tokens=args.answer_tokens)
+    upstream = 0
+
+    async def produce(question: str, turn: ChatTurn):
+        nonlocal upstream
+        upstream += 1
+        with turn.stage("vector_search"):
+            await asyncio.sleep(args.search_delay)
+        yield {"type": "documents", "documents": [], "model": llm.model_name}
+        async for chunk in llm.astream([HumanMessage(content=question)]):
+            yield {"type": "token", "token": chunk.content}
+
+    rng = random.Random(7)
+    weights = [1.0 / (rank + 1) ** args.skew for rank in range(args.questions)]
+    first_token_ms, full_ms = [], []
+
+    async def turn(question: str, delay: float):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        chat_turn, answer = ChatTurn("/chat/stream"), ""
+        key = (normalize_question(question), "kb", "null", "chat")
+        async for event in coalescer.stream(key, chat_turn, lambda flight_turn: produce(question, flight_turn)):
+            if event["type"] == "token":
+                if not answer:
+                    first_token_ms.append((time.perf_counter() - start) * 1000)
+                answer += event["token"]
+        full_ms.append((time.perf_counter() - start) * 1000)
+
+    # Users type the same question slightly differently
+    spellings = [str, lambda q: q + "?", lambda q: f"  {q} ", str.capitalize]
+    questions = [f"how do I migrate topic {i} channels to teams" for i in range(args.questions)]
+    tasks = []
+    for _ in range(args.requests):
+        question = rng.choices(questions, weights)[0]
+        tasks.append(turn(rng.choice(spellings)(question), rng.uniform(0, args.spread)))
+    await asyncio.gather(*tasks)
+
+    return {
+        "upstream_streams": upstream,
+        "turns": len(full_ms),
+        "time_to_first_token": latency_summary(first_token_ms),
+        "full_answer": latency_summary(full_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request coalescing during a question spike")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--questions", type=int, default=30, help="Distinct questions in the pool")
+    parser.add_argument("--skew", type=float, default=1.2, help="Zipf exponent of question popularity")
+    parser.add_argument("--spread", type=float, default=3.0, help="Seconds over which the requests arrive")
+    parser.add_argument("--search-delay", type=float, default=0.15)
+    parser.add_argument("--first-token-delay", type=float, default=0.4)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--output", default="bench_coalescing.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    prepare_environment(os.getcwd(), blog_json="")
+
+    modes = {}
+    for name, enabled in (("off", False), ("on", True)):
+        result = modes[name] = asyncio.run(run_mode(enabled, args))
+        print(f"[*] coalescing {name:<3} upstream={result['upstream_streams']}/{result['turns']} "
+              f"ttft p50={result['time_to_first_token']['p50_ms']}ms p95={result['time_to_first_token']['p95_ms']}ms "
+              f"full p50={result['full_answer']['p50_ms']}ms")
+
+    results = {
+        "benchmark": "coalescing",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "modes": modes,
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[OK] Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
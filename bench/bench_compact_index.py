@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Compact index benchmark: int8 / Matryoshka-truncated vectors vs the Chroma store.
+
+Builds a Chroma collection (configured HNSW params) over synthetic unit
+vectors whose variance decays across dimensions, the way Matryoshka-trained
+text-embedding-3 vectors concentrate information in their leading components.
+Then builds app/compact_index.py indexes from that collection at several widths
+and compares them with exact brute-force neighbours.
+
+Reported per configuration:
+    resident MB (what a worker keeps in RAM), on-disk MB, recall@k, query latency
+
+rescore=1 ranks by the quantized scores alone; larger values re-score
+k * rescore candidates at full precision.
+
+Usage:
+    python bench/bench_compact_index.py
+    python bench/bench_compact_index.py --vectors 50000 --dims 3072 --compact-dims 0 1024 256 --rescore 1 4 8
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_hnsw import build_collection, exact_neighbours, measure
+from replay import latency_summary
+from run_rag_bench import directory_size, prepare_environment
+
+
+def matryoshka_like_vectors(count: int, dims: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Clustered unit vectors with a decaying per-dimension spectrum."""
+    spectrum = (1.0 + np.arange(dims) / 64.0) ** -1.0
+    centres = rng.standard_normal((clusters, dims)).astype(np.float32) * spectrum
+    assignment = rng.integers(0, clusters, count)
+    vectors = centres[assignment] + 0.9 * rng.standard_normal((count, dims)).astype(np.float32) * spectrum
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def measure_compact(index, queries: np.ndarray, truth: np.ndarray, k: int, rescore: int) -> dict:
+    latencies, found = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = index.search(query, k, rescore=rescore)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += len({int(doc_id) for doc_id, _ in hits} & {int(i) for i in expected})
+    return {"recall_at_k": round(found / (len(queries) * k), 4), "latency": latency_summary(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact (quantized) index vs Chroma benchmark")
+    parser.add_argument("--workspace", help="Directory for the indexes (default: temp dir)")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=25)
+    parser.add_argument("--compact-dims", type=int, nargs="+", default=[0, 512, 256], help="0 = full width")
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--output", default="bench_compact_index.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix="cf-compact-bench-"))
+    os.makedirs(workspace, exist_ok=True)
+    prepare_environment(workspace, blog_json="")
+    from app.chroma_index import hnsw_metadata
+    from app.compact_index import CompactIndex
+
+    rng = np.random.default_rng(7)
+    data = matryoshka_like_vectors(args.vectors, args.dims, args.clusters, rng)
+    picks = rng.integers(0, args.vectors, args.queries)
+    queries = data[picks] + 0.05 * rng.standard_normal((args.queries, args.dims)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_neighbours(data, queries, args.k)
+
+    # Current store: Chroma with the configured HNSW params
+    chroma_path = os.path.join(workspace, "chroma_db")
+    shutil.rmtree(chroma_path, ignore_errors=True)
+    client, vectorstore, build_seconds = build_collection(chroma_path, data, hnsw_metadata())
+    segment_bytes = sum(directory_size(os.path.join(chroma_path, name)) for name in os.listdir(chroma_path)
+                        if os.path.isdir(os.path.join(chroma_path, name)))
+    chroma = {
+        "build_seconds": round(build_seconds, 2),
+        "resident_mb": round(segment_bytes / 1024 / 1024, 1),  # HNSW segment is loaded whole
+        "disk_mb": round(directory_size(chroma_path) / 1024 / 1024, 1),
+        **measure(vectorstore, queries, truth, args.k),
+    }
+    print(f"[*] chroma              resident={chroma['resident_mb']}MB disk={chroma['disk_mb']}MB "
+          f"recall@{args.k}={chroma['recall_at_k']:.4f} p50={chroma['latency']['p50_ms']}ms")
+
+    compact = []
+    for dims in args.compact_dims:
+        path = os.path.join(workspace, f"compact_{dims or 'full'}")
+        start = time.perf_counter()
+        index = CompactIndex.build(vectorstore._collection, path, dims)
+        index_seconds = time.perf_counter() - start
+        stats = index.stats()
+        for rescore in args.rescore:
+            result = {"dims": stats["dims"], "rescore": rescore,
+                      "build_seconds": round(index_seconds, 2),
+                      "resident_mb": round(stats["resident_bytes"] / 1024 / 1024, 1),
+                      "disk_mb": round(directory_size(path) / 1024 / 1024, 1),
+                      **measure_compact(index, queries, truth, args.k, rescore)}
+            compact.append(result)
+            print(f"[*] int8 dims={result['dims']:<5} rescore={rescore:<2} resident={result['resident_mb']}MB "
+                  f"recall@{args.k}={result['recall_at_k']:.4f} p50={result['latency']['p50_ms']}ms")
+
+    results = {
+        "benchmark": "compact_index",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dataset": {"vectors": args.vectors, "dims": args.dims, "clusters": args.clusters,
+                    "queries": args.queries, "k": args.k},
+        "chroma": chroma,
+        "compact": compact,
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[OK] Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
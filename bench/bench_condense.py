@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Follow-up turns: tokens spent on the search query and the prompt, before and after condensation.
+
+Builds synthetic multi-turn conversations (long assistant answers, short
+follow-ups like "does that include private ones?") and, for every follow-up
+turn, counts tokens the way each version of /chat/stream spends them:
+
+- before: the last 5 messages are prepended to the question; that blob is
+  embedded for the search and sent again as the prompt question
+- after: app/conversation.py - follow-ups get a standalone search query from
+  the condensing model (counted at its max_tokens cap, an upper bound, plus
+  the condensing prompt itself); the prompt gets the question and the
+  budgeted history block
+
+The retrieved document context is the same either way and is not counted.
+
+Reported:
+    per follow-up turn: embedding tokens, prompt tokens (history + question),
+    condensing tokens, total; share of follow-ups that needed condensing
+
+Usage:
+    python bench/bench_condense.py
+    python bench/bench_condense.py --conversations 200 --turns 6 --answer-sentences 30
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import TOPICS, topic_paragraph
+from run_rag_bench import prepare_environment
+
+FOLLOW_UPS = [
+    "Does that include private ones?",
+    "How long does it take?",
+    "What about {other}?",
+    "Is there an extra cost for it?",
+    "Can admins check them afterwards?",
+    "And for guests?",
+    "How does CloudFuze handle {other} during a Slack to Teams migration?",
+    "Do {other} keep their original timestamps in Teams?",
+]
+
+
+def legacy_context(messages: list) -> str:
+    """The old get_conversation_context: the last 5 messages, verbatim."""
+    if not messages:
+        return ""
+    context = "\n\nPrevious conversation:\n"
+    for msg in messages[-5:]:
+        role = "User" if msg["role"] == "user" else "Assistant"
+        context += f"{role}: {msg['content']}\n"
+    return context
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query condensation token accounting")
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=5, help="User turns per conversation")
+    parser.add_argument("--answer-sentences", type=int, default=20, help="Length of each assistant answer")
+    parser.add_argument("--output", default="bench_condense.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    prepare_environment(os.getcwd(), blog_json="")
+    from app.conversation import CONDENSE_HISTORY_TOKENS, history_block, is_follow_up
+    from app.llm import CONDENSE_MODEL_PROFILE
+    from app.prompts import CONDENSE_PROMPT
+    from app.tokens import count_message_tokens, count_tokens
+    from config import HISTORY_MESSAGES
+
+    condense_model, _, condense_cap = CONDENSE_MODEL_PROFILE
+    rng = random.Random(7)
+    before = {"embedding": 0, "prompt": 0}
+    after = {"embedding": 0, "prompt": 0, "condense": 0}
+    follow_ups = condensed = 0
+
+    for _ in range(args.conversations):
+        topic = rng.choice(TOPICS)
+        messages = []
+        question = f"How does CloudFuze migrate {topic} from Slack to Teams?"
+        for turn in range(args.turns):
+            if turn:
+                other = rng.choice([t for t in TOPICS if t != topic])
+                question = rng.choice(FOLLOW_UPS).format(other=other)
+                follow_ups += 1
+
+                context = legacy_context(messages)
+                enhanced_query = f"{context}\n\nUser: {question}"
+                before["embedding"] += count_tokens(enhanced_query)
+                before["prompt"] += count_tokens(enhanced_query)
+
+                history = messages[-HISTORY_MESSAGES:]
+                after["prompt"] += count_tokens(history_block(history)) + count_tokens(question)
+                if is_follow_up(question):
+                    condensed += 1
+                    prompt = CONDENSE_PROMPT.format_messages(
+                        history=history_block(history, CONDENSE_HISTORY_TOKENS, message_tokens=120,
+                                              model=condense_model).strip(),
+                        question=question
+                    )
+                    after["condense"] += count_message_tokens(prompt, condense_model) + condense_cap
+                    after["embedding"] += condense_cap
+                else:
+                    after["embedding"] += count_tokens(question)
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant",
+                             "content": topic_paragraph(topic, rng, args.answer_sentences)})
+
+    per_turn = lambda totals: {name: round(value / follow_ups, 1) for name, value in totals.items()}
+    before_turn, after_turn = per_turn(before), per_turn(after)
+    before_turn["total"] = round(sum(before_turn.values()), 1)
+    after_turn["total"] = round(sum(after_turn.values()), 1)
+    print(f"[*] before: embedding={before_turn['embedding']} prompt={before_turn['prompt']} "
+          f"total={before_turn['total']} tokens per follow-up turn")
+    print(f"[*] after:  embedding<={after_turn['embedding']} prompt={after_turn['prompt']} "
+          f"condense<={after_turn['condense']} total<={after_turn['total']} "
+          f"({condensed}/{follow_ups} follow-ups condensed)")
+
+    results = {
+        "benchmark": "condense",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "follow_up_turns": follow_ups,
+        "condensed_turns": condensed,
+        "before_per_turn": before_turn,
+        "after_per_turn_upper_bound": after_turn,
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[OK] Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
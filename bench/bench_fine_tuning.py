@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Fine-tuning data pipeline benchmark against a local fake OpenAI server.
+
+Generates a large synthetic correction dataset (with exact and near-duplicate
+questions and a few over-long answers), then runs scripts/manage_fine_tuning.py
+end to end against bench/fake_openai_server.py: streaming export, chunked
+upload with an injected part failure, resume, job creation and status polling.
+
+Reported:
+    export time and peak traced memory, dedup / validation counts,
+    parts re-sent on resume, upload integrity (sha256), final job status
+
+Usage:
+    python bench/bench_fine_tuning.py --corrections 100000
+    python bench/bench_fine_tuning.py --corrections 20000 --part-size-kb 256 --fail-part 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "scripts"))
+
+from corpus import TOPICS, topic_paragraph
+from fake_openai_server import FakeOpenAIState, create_app
+from run_rag_bench import free_port, run_server
+
+QUESTION_TEMPLATES = [
+    "How does CloudFuze migrate {topic}?",
+    "How do {topic} get migrated by CloudFuze?",
+    "What happens to {topic} during migration #{n}?",
+    "Can you migrate {topic} for tenant {n}?",
+]
+
+
+def generate_corrections(path: str, count: int, long_every: int, seed: int = 7) -> int:
+    """Stream `count` synthetic corrections to a JSONL file; returns bytes written."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            topic = rng.choice(TOPICS)
+            question = rng.choice(QUESTION_TEMPLATES).format(topic=topic, n=rng.randint(0, count // 4))
+            answer = topic_paragraph(topic, rng, sentences=rng.randint(3, 12))
+            if long_every and i % long_every == long_every - 1:
+                answer = answer * 3000  # well past the per-example token limit
+            f.write(json.dumps({
+                "input": question,
+                "bad_output": "I am not sure.",
+                "corrected_output": answer,
+                "trace_id": f"bench-{i}",
+                "user_comment": None,
+                "timestamp": "2026-01-01T00:00:00",
+                "status": "auto_corrected"
+            }) + "\n")
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tuning pipeline benchmark (fake OpenAI)")
+    parser.add_argument("--workspace", help="Directory for the dataset (default: temp dir)")
+    parser.add_argument("--corrections", type=int, default=50000)
+    parser.add_argument("--long-every", type=int, default=5000, help="Make every Nth answer over-long (0 = never)")
+    parser.add_argument("--part-size-kb", type=int, default=1024)
+    parser.add_argument("--fail-part", type=int, default=2, help="Fail the Nth part request once (0 = never)")
+    parser.add_argument("--output", default="bench_fine_tuning.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix="cf-ft-bench-"))
+    os.makedirs(workspace, exist_ok=True)
+    os.chdir(workspace)
+
+    dataset_bytes = generate_corrections("./data/fine_tuning_dataset/corrections.jsonl",
+                                         args.corrections, args.long_every)
+
+    state = FakeOpenAIState(fail_parts=[args.fail_part] if args.fail_part else [])
+    port = free_port()
+    server, thread = run_server(create_app(state), port)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ["OPENAI_API_KEY"] = "bench-dummy"
+
+    import manage_fine_tuning as mft
+    mft.UPLOAD_PART_SIZE = args.part_size_kb * 1024
+
+    try:
+        # Export alone, traced for peak memory
+        tracemalloc.start()
+        export_start = time.perf_counter()
+        summary = mft.export_training_file("./data/fine_tuning_dataset/training_data_bench.jsonl")
+        export_seconds = time.perf_counter() - export_start
+        _, export_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        os.remove("./data/fine_tuning_dataset/training_data_bench.jsonl")
+
+        # Full pipeline; the injected part failure interrupts the first run
+        pipeline_start = time.perf_counter()
+        first_job = mft.start_command(assume_yes=True)
+        parts_before_resume = state.part_requests
+        resume_state = mft.load_pipeline_state()
+        job_id = first_job or mft.start_command(assume_yes=True)
+        pipeline_seconds = time.perf_counter() - pipeline_start
+
+        final_status = asyncio.run(mft.watch_jobs([job_id], interval=0.01, watch=True)) if job_id else {}
+        uploaded = next(iter(state.files.values()), None)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    part_count = max(1, -(-summary["bytes"] // mft.UPLOAD_PART_SIZE))
+    results = {
+        "benchmark": "fine_tuning_pipeline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dataset": {"corrections": args.corrections, "bytes": dataset_bytes},
+        "export": {
+            "seconds": round(export_seconds, 3),
+            "peak_traced_mb": round(export_peak / 1024 / 1024, 2),
+            "dataset_mb": round(dataset_bytes / 1024 / 1024, 2),
+            **{k: summary[k] for k in ("read", "untrainable", "exact_duplicates",
+                                       "near_duplicates", "rejected", "examples", "bytes")},
+        },
+        "upload": {
+            "parts": part_count,
+            "interrupted": first_job is None,
+            "parts_done_before_resume": len((resume_state or {}).get("parts", {})),
+            "part_requests_total": state.part_requests,
+            "part_requests_after_resume": state.part_requests - parts_before_resume,
+            "sha256_matches": bool(uploaded) and uploaded["sha256"] == summary["sha256"],
+        },
+        "pipeline_seconds": round(pipeline_seconds, 3),
+        "job": {"id": job_id, "status": final_status.get(job_id)},
+    }
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"[OK] Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+HNSW recall-vs-latency sweep for the Chroma collection.
+
+Builds persistent Chroma collections over synthetic clustered unit vectors
+(ada-sized by default) for each (M, construction_ef) pair, then queries each
+index at several search_ef values and compares the top-k against exact
+brute-force neighbours. Also deletes a share of the records, compacts with
+app/chroma_index.py and reports the on-disk size and recall before and after.
+
+Reported per configuration:
+    build seconds, index size, recall@k, query latency p50 / p95
+
+Usage:
+    python bench/bench_hnsw.py
+    python bench/bench_hnsw.py --vectors 50000 --m 8 16 32 --construction-ef 100 200 --search-ef 25 50 100 200
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from replay import latency_summary
+from run_rag_bench import directory_size, prepare_environment
+
+
+def clustered_vectors(count: int, dims: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors around random topic centres, roughly the shape of text embeddings."""
+    centres = rng.standard_normal((clusters, dims)).astype(np.float32)
+    assignment = rng.integers(0, clusters, count)
+    vectors = centres[assignment] + 0.9 * rng.standard_normal((count, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbours(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ data.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return top
+
+
+def build_collection(path: str, data: np.ndarray, metadata: dict):
+    import chromadb
+    from langchain_chroma import Chroma
+
+    client = chromadb.PersistentClient(path=path)
+    vectorstore = Chroma(client=client, collection_name="langchain", collection_metadata=metadata)
+    start = time.perf_counter()
+    for offset in range(0, len(data), 2000):
+        batch = data[offset:offset + 2000]
+        vectorstore._collection.add(ids=[str(i) for i in range(offset, offset + len(batch))],
+                                    embeddings=batch.tolist(),
+                                    documents=[f"chunk {i}" for i in range(offset, offset + len(batch))],
+                                    metadatas=[{"source_type": "pdf"}] * len(batch))
+    return client, vectorstore, time.perf_counter() - start
+
+
+def measure(vectorstore, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies, found = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = vectorstore._collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += len({int(i) for i in result["ids"][0]} & {int(i) for i in expected})
+    return {"recall_at_k": round(found / (len(queries) * k), 4), "latency": latency_summary(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HNSW parameter sweep (recall vs latency)")
+    parser.add_argument("--workspace", help="Directory for the indexes (default: temp dir)")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=25)
+    parser.add_argument("--space", default="cosine", choices=["cosine", "l2", "ip"])
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--delete-share", type=float, default=0.3, help="Share deleted before the compaction step")
+    parser.add_argument("--output", default="bench_hnsw.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix="cf-hnsw-bench-"))
+    os.makedirs(workspace, exist_ok=True)
+    prepare_environment(workspace, blog_json="")
+    from app.chroma_index import apply_search_ef, compact_collection, hnsw_metadata
+
+    rng = np.random.default_rng(7)
+    data = clustered_vectors(args.vectors, args.dims, args.clusters, rng)
+    # Queries are perturbed corpus points, like paraphrases of indexed text
+    picks = rng.integers(0, args.vectors, args.queries)
+    queries = data[picks] + 0.05 * rng.standard_normal((args.queries, args.dims)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_neighbours(data, queries, args.k)
+
+    sweep = []
+    for m in args.m:
+        for construction_ef in args.construction_ef:
+            path = os.path.join(workspace, f"m{m}_ef{construction_ef}")
+            shutil.rmtree(path, ignore_errors=True)
+            metadata = hnsw_metadata(space=args.space, M=m, construction_ef=construction_ef)
+            client, vectorstore, build_seconds = build_collection(path, data, metadata)
+            for search_ef in args.search_ef:
+                apply_search_ef(vectorstore, search_ef)
+                result = {"M": m, "construction_ef": construction_ef, "search_ef": search_ef,
+                          "build_seconds": round(build_seconds, 2),
+                          "index_mb": round(directory_size(path) / 1024 / 1024, 1),
+                          **measure(vectorstore, queries, truth, args.k)}
+                sweep.append(result)
+                print(f"[*] M={m:<3} construction_ef={construction_ef:<4} search_ef={search_ef:<4} "
+                      f"recall@{args.k}={result['recall_at_k']:.4f} p50={result['latency']['p50_ms']}ms "
+                      f"p95={result['latency']['p95_ms']}ms build={result['build_seconds']}s")
+            del client, vectorstore
+
+    # Compaction: delete a share of the records, then rebuild the index without the tombstones
+    path = os.path.join(workspace, "compaction")
+    shutil.rmtree(path, ignore_errors=True)
+    client, vectorstore, _ = build_collection(path, data, hnsw_metadata(space=args.space))
+    deleted = rng.choice(args.vectors, int(args.vectors * args.delete_share), replace=False)
+    vectorstore._collection.delete(ids=[str(i) for i in deleted])
+    kept = np.setdiff1d(np.arange(args.vectors), deleted)
+    kept_truth = kept[exact_neighbours(data[kept], queries, args.k)]
+    before = {"index_mb": round(directory_size(path) / 1024 / 1024, 1),
+              **measure(vectorstore, queries, kept_truth, args.k)}
+    del client, vectorstore
+
+    summary = compact_collection(path)
+    import chromadb
+    from langchain_chroma import Chroma
+    vectorstore = Chroma(client=chromadb.PersistentClient(path=path), collection_name="langchain")
+    after = {"index_mb": round(directory_size(path) / 1024 / 1024, 1),
+             **measure(vectorstore, queries, kept_truth, args.k)}
+
+    results = {
+        "benchmark": "hnsw_sweep",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dataset": {"vectors": args.vectors, "dims": args.dims, "clusters": args.clusters,
+                    "queries": args.queries, "k": args.k, "space": args.space},
+        "sweep": sweep,
+        "compaction": {"deleted": len(deleted), "before": before, "after": after,
+                       "records": summary["records"], "orphans_removed": len(summary["orphans_removed"])},
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[OK] Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
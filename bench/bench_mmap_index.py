@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped vector backend vs Chroma: cold start, recall, latency, per-worker memory.
+
+Builds a Chroma collection over synthetic clustered unit vectors, exports it
+with app/mmap_index.py (exact and IVF variants) and compares the backends the
+way uvicorn workers use them. Each backend is opened by `--workers` separate
+processes that run the query set; every process reports its cold start (open
++ first query) and its proportional set size (PSS, shared pages split across
+the processes that map them) from /proc/self/smaps_rollup.
+
+Reported per backend:
+    cold start ms, recall@k against exact neighbours, latency p50 / p95,
+    per-worker RSS and PSS
+
+Usage:
+    python bench/bench_mmap_index.py
+    python bench/bench_mmap_index.py --vectors 100000 --workers 4 --nprobe 8 16 32
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_hnsw import build_collection, clustered_vectors, exact_neighbours
+from replay import latency_summary
+from run_rag_bench import prepare_environment
+
+
+def memory_kb() -> dict:
+    """RSS and PSS of this process (Linux)."""
+    values = {}
+    with open("/proc/self/smaps_rollup", "r") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name.lower() + "_mb"] = round(int(rest.split()[0]) / 1024, 1)
+    return values
+
+
+def open_backend(backend: str, path: str, nprobe: int):
+    if backend == "chroma":
+        import chromadb
+        from langchain_chroma import Chroma
+        return Chroma(client=chromadb.PersistentClient(path=path), collection_name="langchain")
+    from app.mmap_index import MmapVectorStore
+    return MmapVectorStore(path, embedding_function=None, nprobe=nprobe)
+
+
+def worker(workspace: str, backend: str, path: str, nprobe: int, queries_path: str, k: int,
+           start_barrier, results):
+    prepare_environment(workspace, blog_json="")
+    queries = np.load(queries_path)
+    start_barrier.wait()
+
+    start = time.perf_counter()
+    store = open_backend(backend, path, nprobe)
+    first = store.similarity_search_by_vector(queries[0].tolist(), k=k)
+    cold_start_ms = (time.perf_counter() - start) * 1000
+
+    latencies, hits = [], []
+    for query in queries:
+        start = time.perf_counter()
+        docs = store.similarity_search_by_vector(query.tolist(), k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits.append([int(doc.page_content.split()[-1]) for doc in docs])
+    results.put({"cold_start_ms": round(cold_start_ms, 1), "latencies": latencies, "hits": hits,
+                 "first_hits": len(first), **memory_kb()})
+    start_barrier.wait()  # stay resident until every worker has measured memory
+
+
+def run_backend(workspace: str, backend: str, path: str, nprobe: int, queries_path: str,
+                truth: np.ndarray, k: int, workers: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier, results = context.Barrier(workers), context.Queue()
+    processes = [context.Process(target=worker, args=(workspace, backend, path, nprobe, queries_path, k,
+                                                      barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    found = sum(len(set(hits) & {int(i) for i in expected})
+                for hits, expected in zip(reports[0]["hits"], truth))
+    return {
+        "recall_at_k": round(found / (len(truth) * k), 4),
+        "cold_start_ms": latency_summary([r["cold_start_ms"] for r in reports]),
+        "latency": latency_summary([ms for r in reports for ms in r["latencies"]]),
+        "per_worker_rss_mb": round(sum(r["rss_mb"] for r in reports) / workers, 1),
+        "per_worker_pss_mb": round(sum(r["pss_mb"] for r in reports) / workers, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped vector backend vs Chroma")
+    parser.add_argument("--workspace", help="Directory for the indexes (default: temp dir)")
+    parser.add_argument("--vectors", type=int, default=60000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=25)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--output", default="bench_mmap_index.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix="cf-mmap-bench-"))
+    os.makedirs(workspace, exist_ok=True)
+    prepare_environment(workspace, blog_json="")
+    from app.chroma_index import hnsw_metadata
+    from app.mmap_index import export_collection
+
+    rng = np.random.default_rng(7)
+    data = clustered_vectors(args.vectors, args.dims, args.clusters, rng)
+    picks = rng.integers(0, args.vectors, args.queries)
+    queries = data[picks] + 0.05 * rng.standard_normal((args.queries, args.dims)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_neighbours(data, queries, args.k)
+    queries_path = os.path.join(workspace, "queries.npy")
+    np.save(queries_path, queries)
+
+    chroma_path = os.path.join(workspace, "chroma_db")
+    shutil.rmtree(chroma_path, ignore_errors=True)
+    _, vectorstore, _ = build_collection(chroma_path, data, hnsw_metadata())
+
+    exports = {}
+    for name, ivf_min in (("mmap_exact", args.vectors + 1), ("mmap_ivf", 0)):
+        start = time.perf_counter()
+        manifest = export_collection(vectorstore._collection, os.path.join(workspace, name),
+                                     ivf_min_vectors=ivf_min)
+        exports[name] = {"seconds": round(time.perf_counter() - start, 2), "nlist": manifest["nlist"]}
+    del vectorstore
+
+    runs = [("chroma", chroma_path, 0), ("mmap_exact", os.path.join(workspace, "mmap_exact"), 0)]
+    runs += [("mmap_ivf", os.path.join(workspace, "mmap_ivf"), nprobe) for nprobe in args.nprobe]
+    backends = []
+    for backend, path, nprobe in runs:
+        result = {"backend": backend, "nprobe": nprobe or None,
+                  **run_backend(workspace, "chroma" if backend == "chroma" else "mmap", path, nprobe,
+                                queries_path, truth, args.k, args.workers)}
+        backends.append(result)
+        print(f"[*] {backend:<10} nprobe={nprobe or '-':<3} recall@{args.k}={result['recall_at_k']:.4f} "
+              f"p50={result['latency']['p50_ms']}ms cold={result['cold_start_ms']['p50_ms']}ms "
+              f"rss={result['per_worker_rss_mb']}MB pss={result['per_worker_pss_mb']}MB")
+
+    results = {
+        "benchmark": "mmap_index",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dataset": {"vectors": args.vectors, "dims": args.dims, "clusters": args.clusters,
+                    "queries": args.queries, "k": args.k, "workers": args.workers},
+        "exports": exports,
+        "backends": backends,
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[OK] Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Prompt layout vs provider-side prompt caching: cacheable prompt tokens per turn.
+
+OpenAI caches prompts by their longest identical prefix: nothing below 1024
+tokens, then in 128-token steps. This replays a synthetic mix of chat turns
+(history-free questions with Zipf-like popularity, follow-ups with a history
+block, small talk) through two prompt layouts and counts, for every turn, the
+prefix it shares with any earlier prompt for the same model:
+
+- before: history ahead of the retrieved context in the RAG prompt
+- after: app/prompts.py - SYSTEM_PROMPT first, then the context, then history
+  and question
+
+Both layouts use the short conversational prompt for small talk.
+
+Every turn is assumed to arrive while earlier prefixes are still cached.
+Retrieved context is deterministic per question (same question, same
+documents), as with the real store.
+
+Reported per layout:
+    prompt tokens, cached tokens, cached share, turns with a cache hit, input
+    tokens billed at the cached-token discount, per turn kind
+
+Usage:
+    python bench/bench_prompt_cache.py
+    python bench/bench_prompt_cache.py --turns 1000 --questions 50 --doc-sentences 10
+"""
+
+import argparse
+import bisect
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import TOPICS, topic_paragraph
+from run_rag_bench import prepare_environment
+
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP_TOKENS = 128
+CACHED_PRICE_RATIO = 0.5  # gpt-4o-mini bills cached input tokens at half price
+
+SMALL_TALK = ["hi there", "thanks, that helps!", "how are you today?", "good morning", "ok great, bye"]
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    """Length of the common prefix (binary search over slice comparisons)."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class PrefixCache:
+    """Prompts seen so far for one model; the longest shared prefix is with a sorted neighbour."""
+
+    def __init__(self):
+        self._prompts = []
+
+    def cached_tokens(self, prompt: str, count_tokens) -> int:
+        index = bisect.bisect_left(self._prompts, prompt)
+        shared = max((common_prefix_length(prompt, self._prompts[i])
+                      for i in (index - 1, index) if 0 <= i < len(self._prompts)), default=0)
+        bisect.insort(self._prompts, prompt)
+        tokens = count_tokens(prompt[:shared]) if shared else 0
+        if tokens < CACHE_MIN_TOKENS:
+            return 0
+        return CACHE_MIN_TOKENS + (tokens - CACHE_MIN_TOKENS) // CACHE_STEP_TOKENS * CACHE_STEP_TOKENS
+
+
+def serialize(messages) -> str:
+    """Roughly how the chat template lays the messages out ahead of tokenization."""
+    return "".join(f"<|{message.type}|>{message.content}<|end|>" for message in messages)
+
+
+def build_turns(args, rng: random.Random) -> list:
+    weights = [1.0 / (rank + 1) ** args.skew for rank in range(args.questions)]
+    turns = []
+    for _ in range(args.turns):
+        roll = rng.random()
+        if roll < args.small_talk:
+            turns.append({"kind": "small_talk", "question": rng.choice(SMALL_TALK), "history": []})
+            continue
+        index = rng.choices(range(args.questions), weights)[0]
+        history = []
+        if roll < args.small_talk + args.follow_ups:
+            topic = rng.choice(TOPICS)
+            for _ in range(rng.randint(1, 3)):
+                history.append({"role": "user", "content": f"How are {topic} migrated to Teams?"})
+                history.append({"role": "assistant", "content": topic_paragraph(topic, rng, 12)})
+        turns.append({"kind": "follow_up" if history else "first_turn", "question_index": index,
+                      "question": f"How does CloudFuze migrate {TOPICS[index % len(TOPICS)]} (case {index})?",
+                      "history": history})
+    return turns
+
+
+def question_context(index: int, args) -> str:
+    """Retrieved documents for a question: the same every time it is asked."""
+    rng = random.Random(1000 + index)
+    return "\n\n".join(
+        f"Document {i+1}:\n{topic_paragraph(rng.choice(TOPICS), rng, args.doc_sentences)}"
+        for i in range(args.documents)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt layout vs prompt caching")
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=40, help="Distinct retrieval questions")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of question popularity")
+    parser.add_argument("--follow-ups", type=float, default=0.35, help="Share of turns with history")
+    parser.add_argument("--small-talk", type=float, default=0.15, help="Share of conversational turns")
+    parser.add_argument("--documents", type=int, default=25)
+    parser.add_argument("--doc-sentences", type=int, default=6)
+    parser.add_argument("--output", default="bench_prompt_cache.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    prepare_environment(os.getcwd(), blog_json="")
+    from langchain_core.prompts import ChatPromptTemplate
+    from app.conversation import history_block
+    from app.prompts import CONVERSATIONAL_PROMPT, RAG_PROMPT
+    from app.tokens import count_tokens
+    from config import SYSTEM_PROMPT
+
+    layouts = {
+        "before": {
+            "rag": ChatPromptTemplate.from_messages([
+                ("system", SYSTEM_PROMPT),
+                ("human", "{history}Context: {context}\n\nQuestion: {question}")
+            ]).partial(history=""),
+            "conversational": CONVERSATIONAL_PROMPT,
+        },
+        "after": {"rag": RAG_PROMPT, "conversational": CONVERSATIONAL_PROMPT},
+    }
+
+    turns = build_turns(args, random.Random(7))
+    contexts = {}
+    results = {}
+    for name, prompts in layouts.items():
+        cache = PrefixCache()  # RAG and conversational profiles are both gpt-4o-mini
+        totals = {}
+        for turn in turns:
+            history = history_block(turn["history"])
+            if turn["kind"] == "small_talk":
+                messages = prompts["conversational"].format_messages(history=history, question=turn["question"])
+            else:
+                index = turn["question_index"]
+                if index not in contexts:
+                    contexts[index] = question_context(index, args)
+                messages = prompts["rag"].format_messages(context=contexts[index], history=history,
+                                                          question=turn["question"])
+            prompt = serialize(messages)
+            prompt_tokens = count_tokens(prompt)
+            cached = cache.cached_tokens(prompt, count_tokens)
+            for kind in ("all", turn["kind"]):
+                bucket = totals.setdefault(kind, {"turns": 0, "prompt_tokens": 0, "cached_tokens": 0, "hits": 0})
+                bucket["turns"] += 1
+                bucket["prompt_tokens"] += prompt_tokens
+                bucket["cached_tokens"] += cached
+                bucket["hits"] += bool(cached)
+        for bucket in totals.values():
+            bucket["cached_share"] = round(bucket["cached_tokens"] / max(bucket["prompt_tokens"], 1), 3)
+            bucket["billed_input_tokens"] = round(bucket["prompt_tokens"]
+                                                  - bucket["cached_tokens"] * (1 - CACHED_PRICE_RATIO))
+        results[name] = totals
+        summary = ", ".join(f"{kind} {bucket['cached_share']:.0%} ({bucket['hits']}/{bucket['turns']} hit)"
+                            for kind, bucket in totals.items() if kind != "all")
+        print(f"[*] {name:<6} cached {totals['all']['cached_tokens']}/{totals['all']['prompt_tokens']} prompt tokens "
+              f"({totals['all']['cached_share']:.0%}), billed {totals['all']['billed_input_tokens']} - {summary}")
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "benchmark": "prompt_cache",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": vars(args),
+            "layouts": results,
+        }, f, indent=2)
+    print(f"[OK] Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic knowledge-base generator for the offline benchmarks.
+
+Writes the same layout the app ingests (pdfs/, docs/, excel/ and a blog JSON
+export in WordPress API shape) plus a manifest of benchmark queries, each
+tagged with the topic it should retrieve.
+
+Usage:
+    python bench/corpus.py ./bench_workspace --scale 2
+"""
+
+import argparse
+import json
+import os
+import random
+from typing import Dict, List
+
+TOPICS = [
+    "emoji reactions", "public channels", "private channels", "direct messages",
+    "file attachments", "threaded replies", "user mapping", "pricing tiers",
+    "migration timeline", "delta migration", "guest accounts", "app integrations",
+    "message timestamps", "admin permissions", "data retention", "pinned messages",
+    "workspace consolidation", "compliance exports", "bot messages", "shared channels",
+]
+
+FILLER = [
+    "CloudFuze moves {topic} from Slack to Microsoft Teams with full fidelity.",
+    "During a Slack to Teams migration the {topic} are mapped before cutover.",
+    "Administrators can review {topic} in the migration report after each pass.",
+    "Enterprise plans include priority handling of {topic} for large tenants.",
+    "The {topic} step runs incrementally so users keep working in Slack.",
+    "Our engineers validate {topic} against the Teams Graph API limits.",
+    "Customers often ask how {topic} behave once they land in Teams.",
+    "A pilot batch is recommended to confirm {topic} are migrated correctly.",
+]
+
+
+def topic_paragraph(topic: str, rng: random.Random, sentences: int = 8) -> str:
+    return " ".join(rng.choice(FILLER).format(topic=topic) for _ in range(sentences))
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, lines: List[str]):
+    """Write a minimal single-page PDF with one text line per entry."""
+    text_ops = " ".join(f"({_pdf_escape(line)}) '" for line in lines)
+    stream = f"BT /F1 9 Tf 40 800 Td 11 TL {text_ops} ET".encode("latin-1", "replace")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents 5 0 R /Resources << /Font << /F1 4 0 R >> >> >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def _wrap(text: str, width: int = 110) -> List[str]:
+    lines, current = [], ""
+    for word in text.split():
+        if len(current) + len(word) + 1 > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}".strip()
+    if current:
+        lines.append(current)
+    return lines
+
+
+def generate_corpus(workspace: str, scale: int = 1, seed: int = 7) -> Dict:
+    """Create pdfs/, docs/, excel/ and blog.json under workspace; return the manifest."""
+    from docx import Document as DocxDocument
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    for sub in ("pdfs", "docs", "excel"):
+        os.makedirs(os.path.join(workspace, sub), exist_ok=True)
+
+    files = {"pdf": [], "docx": [], "xlsx": []}
+    posts = []
+    for copy in range(scale):
+        for index, topic in enumerate(TOPICS):
+            slug = topic.replace(" ", "_")
+            kind = ("pdf", "docx", "xlsx", "blog")[index % 4]
+            if kind == "pdf":
+                path = os.path.join(workspace, "pdfs", f"{slug}_{copy}.pdf")
+                write_pdf(path, _wrap(topic_paragraph(topic, rng, 12)))
+                files["pdf"].append(path)
+            elif kind == "docx":
+                path = os.path.join(workspace, "docs", f"{slug}_{copy}.docx")
+                document = DocxDocument()
+                document.add_heading(f"{topic.title()} migration guide", level=1)
+                for _ in range(4):
+                    document.add_paragraph(topic_paragraph(topic, rng, 4))
+                document.save(path)
+                files["docx"].append(path)
+            elif kind == "xlsx":
+                path = os.path.join(workspace, "excel", f"{slug}_{copy}.xlsx")
+                workbook = Workbook()
+                sheet = workbook.active
+                sheet.title = "Features"
+                sheet.append(["Feature", "Supported", "Notes"])
+                for row in range(15):
+                    sheet.append([f"{topic} {row}", "Yes", rng.choice(FILLER).format(topic=topic)])
+                workbook.save(path)
+                files["xlsx"].append(path)
+            else:
+                paragraphs = "".join(f"<p>{topic_paragraph(topic, rng, 6)}</p>" for _ in range(5))
+                posts.append({"id": len(posts) + 1, "content": {"rendered": f"<h2>{topic.title()}</h2>{paragraphs}"}})
+
+    blog_path = os.path.join(workspace, "blog.json")
+    with open(blog_path, "w", encoding="utf-8") as f:
+        json.dump(posts, f)
+
+    queries = [{"question": f"How does CloudFuze migrate {topic} from Slack to Teams?", "topic": topic}
+               for topic in TOPICS]
+    queries += [{"question": greeting, "topic": None} for greeting in ("hi", "thanks!", "hello there")]
+
+    manifest = {
+        "workspace": os.path.abspath(workspace),
+        "blog_json": os.path.abspath(blog_path),
+        "files": {kind: len(paths) for kind, paths in files.items()},
+        "blog_posts": len(posts),
+        "queries": queries,
+    }
+    with open(os.path.join(workspace, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic benchmark corpus")
+    parser.add_argument("workspace", help="Directory to create the corpus in")
+    parser.add_argument("--scale", type=int, default=1, help="Copies of each topic document")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    manifest = generate_corpus(args.workspace, args.scale, args.seed)
+    print(json.dumps({k: v for k, v in manifest.items() if k != "queries"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the OpenAI Uploads and fine-tuning jobs API.
+
+Implements just enough of /v1/uploads, /v1/uploads/{id}/parts,
+/v1/uploads/{id}/complete and /v1/fine_tuning/jobs for
+scripts/manage_fine_tuning.py. Parts are spooled to a temp directory, so a
+completed upload's size and sha256 can be checked against what was sent.
+Jobs advance one status per poll: validating_files -> running -> succeeded.
+
+`fail_parts` makes the Nth part request (1-based, counted across the server's
+lifetime) return 500 once, to exercise upload resume.
+
+Usage:
+    python bench/fake_openai_server.py --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python scripts/manage_fine_tuning.py start -y
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.responses import JSONResponse
+
+JOB_PROGRESSION = ["validating_files", "running", "succeeded"]
+
+
+class FakeOpenAIState:
+    def __init__(self, spool_dir: Optional[str] = None, fail_parts: Iterable[int] = ()):
+        self.spool_dir = spool_dir or tempfile.mkdtemp(prefix="fake-openai-")
+        self.fail_parts = set(fail_parts)
+        self.part_requests = 0
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        self.parts: Dict[str, str] = {}  # part id -> spooled file path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "part_requests": self.part_requests,
+            "parts_stored": len(self.parts),
+            "uploads": len(self.uploads),
+            "files": len(self.files),
+            "jobs": len(self.jobs)
+        }
+
+
+def create_app(state: FakeOpenAIState) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/uploads")
+    async def create_upload(request: Request):
+        body = await request.json()
+        upload = {
+            "id": f"upload_{uuid.uuid4().hex[:12]}",
+            "object": "upload",
+            "status": "pending",
+            "filename": body["filename"],
+            "bytes": body["bytes"],
+            "purpose": body["purpose"],
+            "created_at": int(time.time())
+        }
+        state.uploads[upload["id"]] = upload
+        return upload
+
+    @app.post("/v1/uploads/{upload_id}/parts")
+    async def add_part(upload_id: str, data: UploadFile = File(...)):
+        state.part_requests += 1
+        upload = state.uploads.get(upload_id)
+        if not upload or upload["status"] != "pending":
+            return JSONResponse(status_code=404, content={"error": {"message": "Upload not found"}})
+        if state.part_requests in state.fail_parts:
+            state.fail_parts.discard(state.part_requests)
+            return JSONResponse(status_code=500, content={"error": {"message": "Injected part failure"}})
+
+        part_id = f"part_{uuid.uuid4().hex[:12]}"
+        path = os.path.join(state.spool_dir, part_id)
+        with open(path, "wb") as f:
+            while chunk := await data.read(1024 * 1024):
+                f.write(chunk)
+        state.parts[part_id] = path
+        return {"id": part_id, "object": "upload.part", "upload_id": upload_id}
+
+    @app.post("/v1/uploads/{upload_id}/complete")
+    async def complete_upload(upload_id: str, request: Request):
+        body = await request.json()
+        upload = state.uploads.get(upload_id)
+        if not upload or upload["status"] != "pending":
+            return JSONResponse(status_code=404, content={"error": {"message": "Upload not found"}})
+        missing = [p for p in body["part_ids"] if p not in state.parts]
+        if missing:
+            return JSONResponse(status_code=400, content={"error": {"message": f"Unknown parts {missing}"}})
+
+        digest, size = hashlib.sha256(), 0
+        for part_id in body["part_ids"]:
+            with open(state.parts[part_id], "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    digest.update(chunk)
+                    size += len(chunk)
+        if size != upload["bytes"]:
+            return JSONResponse(status_code=400, content={"error": {"message": f"Expected {upload['bytes']} bytes, got {size}"}})
+
+        file = {"id": f"file-{uuid.uuid4().hex[:12]}", "object": "file", "bytes": size,
+                "filename": upload["filename"], "purpose": upload["purpose"], "sha256": digest.hexdigest()}
+        state.files[file["id"]] = file
+        upload.update({"status": "completed", "file": file})
+        return upload
+
+    @app.post("/v1/fine_tuning/jobs")
+    async def create_job(request: Request):
+        body = await request.json()
+        if body["training_file"] not in state.files:
+            return JSONResponse(status_code=400, content={"error": {"message": "Unknown training file"}})
+        job = {
+            "id": f"ftjob-{uuid.uuid4().hex[:12]}",
+            "object": "fine_tuning.job",
+            "model": body["model"],
+            "training_file": body["training_file"],
+            "status": JOB_PROGRESSION[0],
+            "created_at": int(time.time()),
+            "fine_tuned_model": None
+        }
+        state.jobs[job["id"]] = job
+        return job
+
+    @app.get("/v1/fine_tuning/jobs/{job_id}")
+    async def retrieve_job(job_id: str):
+        job = state.jobs.get(job_id)
+        if not job:
+            return JSONResponse(status_code=404, content={"error": {"message": "Job not found"}})
+        step = JOB_PROGRESSION.index(job["status"])
+        if step + 1 < len(JOB_PROGRESSION):
+            job["status"] = JOB_PROGRESSION[step + 1]
+            if job["status"] == "succeeded":
+                job["fine_tuned_model"] = f"ft:{job['model']}:cloudfuze::{job['id'][-8:]}"
+        return job
+
+    @app.get("/v1/fine_tuning/jobs")
+    async def list_jobs(limit: int = 10):
+        jobs = sorted(state.jobs.values(), key=lambda j: j["created_at"], reverse=True)
+        return {"object": "list", "data": jobs[:limit]}
+
+    return app
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Fake OpenAI uploads / fine-tuning server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-part", type=int, action="append", default=[],
+                        help="Fail the Nth part request once (repeatable)")
+    args = parser.parse_args()
+    uvicorn.run(create_app(FakeOpenAIState(fail_parts=args.fail_part)), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
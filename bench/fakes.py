@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic stand-ins for OpenAI and MongoDB used by the offline benchmarks.
+
+FakeEmbeddings hashes word tokens into a fixed-size unit vector, so similar
+texts land close together and results are reproducible run to run.
+FakeChatModel streams a canned answer derived from the prompt with a
+configurable first-token delay and inter-token delay.
+"""
+
+import asyncio
+import hashlib
+import math
+import re
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class FakeEmbeddings(Embeddings):
+    """Feature-hashed bag-of-words embeddings (no network, deterministic)."""
+
+    def __init__(self, dimensions: int = 256, delay: float = 0.0):
+        self.dimensions = dimensions
+        self.delay = delay
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in _WORD_RE.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.delay:
+            time.sleep(self.delay)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.delay:
+            time.sleep(self.delay)
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that streams a deterministic answer with simulated latency."""
+
+    model_name: str = "fake-chat"
+    first_token_delay: float = 0.05
+    token_delay: float = 0.002
+    answer_tokens: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = " ".join(str(m.content) for m in messages)
+        words = _WORD_RE.findall(prompt.lower())[-40:] or ["migration"]
+        seed = int(hashlib.md5(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        return [words[(seed + i) % len(words)] + " " for i in range(self.answer_tokens)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._answer_tokens(messages)
+        time.sleep(self.first_token_delay + self.token_delay * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_delay)
+        for token in self._answer_tokens(messages):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_delay)
+        for token in self._answer_tokens(messages):
+            await asyncio.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class InMemoryChatMemory:
+    """Drop-in for MongoDBMemoryManager that keeps conversations in a dict."""
+
+    def __init__(self):
+        self.conversations: Dict[str, List[Dict[str, Any]]] = {}
+        self.totals: Dict[str, int] = {}
+        self.summaries: Dict[str, tuple] = {}  # user -> (summary, summarized_total)
+
+    async def connect(self):
+        return None
+
+    async def disconnect(self):
+        return None
+
+    async def get_or_create_user_conversation(self, user_id: str) -> List[Dict[str, Any]]:
+        return list(self.conversations.setdefault(user_id, []))
+
+    async def add_to_conversation(self, user_id: str, role: str, content: str):
+        conversation = self.conversations.setdefault(user_id, [])
+        conversation.append({"role": role, "content": content, "timestamp": datetime.utcnow()})
+        del conversation[:-20]
+        self.totals[user_id] = self.totals.get(user_id, 0) + 1
+
+    async def get_conversation_window(self, user_id: str, limit: int = 6, with_summary: bool = True) -> Dict[str, Any]:
+        messages = list(self.conversations.get(user_id, []))
+        summary, summarized_total = self.summaries.get(user_id, ("", 0)) if with_summary else ("", 0)
+        pending = messages[max(0, summarized_total - (self.totals.get(user_id, 0) - len(messages))):]
+        return {"summary": summary, "messages": pending[-limit:] if limit > 0 else [], "pending": pending,
+                "summarized_total": summarized_total}
+
+    async def update_summary(self, user_id: str, summary: str, summarized_total: int,
+                             expected_summarized_total: int) -> bool:
+        if self.summaries.get(user_id, ("", 0))[1] != expected_summarized_total:
+            return False
+        self.summaries[user_id] = (summary, summarized_total)
+        return True
+
+    async def get_conversation_context(self, user_id: str) -> str:
+        conversation = self.conversations.get(user_id, [])
+        if not conversation:
+            return ""
+        context = "\n\nPrevious conversation:\n"
+        for msg in conversation[-5:]:
+            role = "User" if msg["role"] == "user" else "Assistant"
+            context += f"{role}: {msg['content']}\n"
+        return context
+
+    async def get_user_chat_history(self, user_id: str) -> List[Dict[str, Any]]:
+        return await self.get_or_create_user_conversation(user_id)
+
+    async def clear_user_chat_history(self, user_id: str):
+        self.conversations[user_id] = []
+        self.totals[user_id] = 0
+        self.summaries.pop(user_id, None)
+
+
+def install_fakes(first_token_delay: float = 0.05, token_delay: float = 0.002,
+                  embedding_dimensions: int = 256, embedding_delay: float = 0.0):
+    """Route the app's model registry and chat memory to the fakes above.
+
+    Must run before app.vectorstore / app.endpoints are imported, since the
+    vectorstore is built at import time.
+    """
+    from app.llm import model_registry
+    import app.mongodb_memory as mongodb_memory_module
+
+    model_registry.set_factories(
+        chat_factory=lambda model_name, temperature, max_tokens: FakeChatModel(
+            model_name=model_name,
+            first_token_delay=first_token_delay,
+            token_delay=token_delay,
+            answer_tokens=min(max_tokens or 300, 300) // 3
+        ),
+        embeddings_factory=lambda model: FakeEmbeddings(embedding_dimensions, embedding_delay)
+    )
+    mongodb_memory_module.mongodb_memory = InMemoryChatMemory()
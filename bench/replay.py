@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Replay driver: fires benchmark questions at /chat and /chat/stream.
+
+Measures end-to-end latency for both endpoints and, for /chat/stream,
+time-to-first-token (first SSE 'token' event) at a configurable concurrency.
+
+Usage:
+    python bench/replay.py http://127.0.0.1:8002 --manifest ws/manifest.json --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return round(ordered[index], 2)
+
+
+def latency_summary(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 2) if values else None,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+    }
+
+
+async def _chat_once(client: httpx.AsyncClient, question: str, user_id: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    response = await client.post("/chat", json={"question": question, "user_id": user_id})
+    return {"ok": response.status_code == 200 and "answer" in response.json(),
+            "latency_ms": (time.perf_counter() - start) * 1000}
+
+
+async def _stream_once(client: httpx.AsyncClient, question: str, user_id: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    first_token_ms = None
+    ok = False
+    async with client.stream("POST", "/chat/stream", json={"question": question, "user_id": user_id}) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event.get("type") == "token" and first_token_ms is None:
+                first_token_ms = (time.perf_counter() - start) * 1000
+            elif event.get("type") == "done":
+                ok = True
+            elif event.get("type") == "error":
+                break
+    return {"ok": ok and response.status_code == 200,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "ttft_ms": first_token_ms}
+
+
+async def replay(base_url: str, questions: List[str], endpoint: str,
+                 concurrency: int = 4, rounds: int = 1, timeout: float = 120.0) -> Dict[str, Any]:
+    """Send every question `rounds` times with at most `concurrency` requests in flight."""
+    call = _stream_once if endpoint == "/chat/stream" else _chat_once
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def run(index: int, question: str):
+            async with semaphore:
+                try:
+                    return await call(client, question, f"bench-user-{index % concurrency}")
+                except Exception as e:
+                    return {"ok": False, "error": str(e)}
+
+        jobs = [(i, q) for i, q in enumerate(questions * rounds)]
+        wall_start = time.perf_counter()
+        results = await asyncio.gather(*(run(i, q) for i, q in jobs))
+        wall_seconds = time.perf_counter() - wall_start
+
+    succeeded = [r for r in results if r.get("ok")]
+    report = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(succeeded),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(succeeded) / wall_seconds, 2) if wall_seconds else None,
+        "latency": latency_summary([r["latency_ms"] for r in succeeded]),
+    }
+    if endpoint == "/chat/stream":
+        report["time_to_first_token"] = latency_summary(
+            [r["ttft_ms"] for r in succeeded if r.get("ttft_ms") is not None])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay benchmark questions against a running server")
+    parser.add_argument("base_url", help="e.g. http://127.0.0.1:8002")
+    parser.add_argument("--manifest", required=True, help="manifest.json written by bench/corpus.py")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--endpoint", choices=["/chat", "/chat/stream", "both"], default="both")
+    args = parser.parse_args()
+
+    with open(args.manifest, "r", encoding="utf-8") as f:
+        questions = [q["question"] for q in json.load(f)["queries"]]
+
+    endpoints = ["/chat", "/chat/stream"] if args.endpoint == "both" else [args.endpoint]
+    reports = [asyncio.run(replay(args.base_url, questions, ep, args.concurrency, args.rounds))
+               for ep in endpoints]
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Offline RAG pipeline benchmark.
+
+Builds a synthetic corpus, ingests it through the real app code with fake
+embedding and chat models, then replays questions against /chat and
+/chat/stream on a local uvicorn server. Nothing talks to OpenAI, MongoDB or
+Langfuse. Results are written as JSON so runs can be diffed before deploy.
+
+Reported:
+    ingestion time, index size, retrieval latency and hit rate,
+    time-to-first-token, end-to-end latency and throughput per endpoint
+
+Usage:
+    python bench/run_rag_bench.py
+    python bench/run_rag_bench.py --scale 4 --concurrency 16 --rounds 3 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import generate_corpus
+from replay import replay, latency_summary
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def prepare_environment(workspace: str, blog_json: str):
+    """Point config.py at the workspace and disable every external service."""
+    os.chdir(workspace)
+    for key in ("OPENAI_API_KEY", "MICROSOFT_CLIENT_ID", "MICROSOFT_CLIENT_SECRET",
+                "LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY"):
+        os.environ[key] = "bench-dummy"
+    os.environ["LANGFUSE_HOST"] = ""  # disables the tracer
+    os.environ["MONGODB_URL"] = "mongodb://127.0.0.1:1"  # never contacted, memory is faked
+    os.environ["BLOG_URL"] = blog_json
+    os.environ["CHROMA_DB_PATH"] = os.path.join(workspace, "data", "chroma_db")
+    # Replays reuse a handful of user ids; per-user limits would turn the run into 429s
+    os.environ["USER_RATE_PER_MINUTE"] = "0"
+    os.environ["USER_MAX_CONCURRENT"] = "0"
+
+
+def measure_retrieval(vectorstore, queries, k: int = 25):
+    latencies, hits, scored = [], 0, 0
+    for query in queries:
+        start = time.perf_counter()
+        docs = vectorstore.similarity_search(query["question"], k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if query["topic"]:
+            scored += 1
+            hits += any(query["topic"] in doc.page_content.lower() for doc in docs[:5])
+    return {"k": k, "latency": latency_summary(latencies),
+            "hit_rate_at_5": round(hits / scored, 3) if scored else None}
+
+
+def run_server(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 30
+    while not server.started and time.time() < deadline:
+        time.sleep(0.05)
+    return server, thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG benchmark with fake models")
+    parser.add_argument("--workspace", help="Directory for corpus and index (default: temp dir)")
+    parser.add_argument("--scale", type=int, default=1, help="Copies of each topic document")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="Fake LLM delay (s)")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="Fake LLM per-token delay (s)")
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix="cf-bench-"))
+    os.makedirs(workspace, exist_ok=True)
+
+    manifest = generate_corpus(workspace, scale=args.scale)
+    prepare_environment(workspace, manifest["blog_json"])
+
+    from fakes import install_fakes
+    import app.helpers  # noqa: F401  (pay import cost before timing ingestion)
+    install_fakes(first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+
+    ingest_start = time.perf_counter()
+    from app.vectorstore import vectorstore
+    ingestion_seconds = time.perf_counter() - ingest_start
+
+    from config import CHROMA_DB_PATH
+    from app.main import app
+
+    results = {
+        "benchmark": "rag_pipeline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus": {k: manifest[k] for k in ("files", "blog_posts")},
+        "ingestion": {
+            "seconds": round(ingestion_seconds, 3),
+            "chunks": vectorstore._collection.count(),
+            "index_bytes": directory_size(CHROMA_DB_PATH),
+        },
+        "retrieval": measure_retrieval(vectorstore, manifest["queries"]),
+    }
+
+    port = free_port()
+    server, thread = run_server(app, port)
+    try:
+        questions = [q["question"] for q in manifest["queries"]]
+        base_url = f"http://127.0.0.1:{port}"
+        results["endpoints"] = [
+            asyncio.run(replay(base_url, questions, endpoint, args.concurrency, args.rounds))
+            for endpoint in ("/chat", "/chat/stream")
+        ]
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"[OK] Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,13 @@ MICROSOFT_TENANT = os.getenv("MICROSOFT_TENANT", "common")
 if not MICROSOFT_CLIENT_ID or not MICROSOFT_CLIENT_SECRET:
     raise ValueError("MICROSOFT_CLIENT_ID and MICROSOFT_CLIENT_SECRET environment variables are required")
 
+# Identity platform and Graph base URLs (override to point at a local stand-in)
+MICROSOFT_LOGIN_URL = os.getenv("MICROSOFT_LOGIN_URL", "https://login.microsoftonline.com").rstrip("/")
+MICROSOFT_GRAPH_URL = os.getenv("MICROSOFT_GRAPH_URL", "https://graph.microsoft.com/v1.0").rstrip("/")
+
+# Seconds a Graph /me profile stays cached per user object id
+MICROSOFT_PROFILE_CACHE_TTL = int(os.getenv("MICROSOFT_PROFILE_CACHE_TTL", "300"))
+
 
 SYSTEM_PROMPT = """You are a specialized AI assistant focused EXCLUSIVELY on Slack to Microsoft Teams migration. You have access to CloudFuze's knowledge base containing information specifically about Slack to Teams migration services.
 
@@ -64,7 +71,8 @@ to reach out to our support team, you can use the link: https://www.cloudfuze.co
     --- for separators  
 """
 
-url = "https://www.cloudfuze.com/wp-json/wp/v2/posts?tags=412&per_page=100"
+# Blog source: WordPress API URL, or a local JSON file of posts (used by bench/)
+url = os.getenv("BLOG_URL", "https://www.cloudfuze.com/wp-json/wp/v2/posts?tags=412&per_page=100")
 
 # Pagination settings for blog post fetching
 BLOG_POSTS_PER_PAGE = 200 # Number of posts per page
@@ -78,7 +86,70 @@ LANGFUSE_HOST = os.getenv("LANGFUSE_HOST", "http://localhost:3100")
 if not LANGFUSE_PUBLIC_KEY or not LANGFUSE_SECRET_KEY:
     raise ValueError("LANGFUSE_PUBLIC_KEY and LANGFUSE_SECRET_KEY environment variables are required")
 
-CHROMA_DB_PATH = "./data/chroma_db"
+CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./data/chroma_db")
+
+# HNSW index parameters for new builds (see bench/bench_hnsw.py for the sweep behind the defaults).
+# space / M / construction_ef are fixed when a collection is built; search_ef applies at load.
+CHROMA_HNSW_SPACE = os.getenv("CHROMA_HNSW_SPACE", "cosine")
+CHROMA_HNSW_M = int(os.getenv("CHROMA_HNSW_M", "32"))
+CHROMA_HNSW_CONSTRUCTION_EF = int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "100"))
+CHROMA_HNSW_SEARCH_EF = int(os.getenv("CHROMA_HNSW_SEARCH_EF", "50"))
+
+# Compact index mode: int8 (optionally Matryoshka-truncated) vectors in RAM, full precision re-scoring.
+# COMPACT_INDEX_DIMS=0 keeps full width; truncate only text-embedding-3-* vectors (see bench/bench_compact_index.py).
+COMPACT_INDEX_ENABLED = os.getenv("COMPACT_INDEX_ENABLED", "false").lower() == "true"
+COMPACT_INDEX_PATH = os.getenv("COMPACT_INDEX_PATH", "./data/compact_index")
+COMPACT_INDEX_DIMS = int(os.getenv("COMPACT_INDEX_DIMS", "0"))
+COMPACT_INDEX_RESCORE = int(os.getenv("COMPACT_INDEX_RESCORE", "4"))  # Candidates re-scored = k x this
+
+# Vector backend at query time: "chroma", or "mmap" (read-only export shared by all workers via the page cache)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+MMAP_INDEX_PATH = os.getenv("MMAP_INDEX_PATH", "./data/mmap_index")
+MMAP_IVF_MIN_VECTORS = int(os.getenv("MMAP_IVF_MIN_VECTORS", "20000"))  # Exact search below this size
+MMAP_IVF_NPROBE = int(os.getenv("MMAP_IVF_NPROBE", "16"))  # IVF lists scanned per query
+
+# Admission control for /chat and /chat/stream (per server process, see app/admission.py)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16"))  # Turns running at once
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))  # Turns waiting for a slot, beyond that 429
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))  # Seconds a turn may wait, then 429
+USER_RATE_PER_MINUTE = float(os.getenv("USER_RATE_PER_MINUTE", "12"))  # Sustained chat turns per user (0 = off)
+USER_BURST = int(os.getenv("USER_BURST", "6"))  # Turns a user can send back to back
+USER_MAX_CONCURRENT = int(os.getenv("USER_MAX_CONCURRENT", "2"))  # Turns per user in flight or queued (0 = off)
+
+# Identical first-turn questions in flight at once share one retrieval + LLM stream (see app/coalescing.py)
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "true").lower() == "true"
+
+# Follow-up turns: standalone search query + budgeted history block (see app/conversation.py)
+QUERY_CONDENSING = os.getenv("QUERY_CONDENSING", "true").lower() == "true"
+CONDENSE_CACHE_TTL = int(os.getenv("CONDENSE_CACHE_TTL", "600"))  # Seconds a condensed query is reused
+HISTORY_MESSAGES = int(os.getenv("HISTORY_MESSAGES", "6"))  # Recent messages considered per turn
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "900"))  # Prompt tokens for summary + recent messages
+HISTORY_MESSAGE_TOKENS = int(os.getenv("HISTORY_MESSAGE_TOKENS", "200"))  # Each message is clipped to this
+
+# Rolling summaries: older turns are folded into a stored summary after each turn
+CONVERSATION_SUMMARIES = os.getenv("CONVERSATION_SUMMARIES", "true").lower() == "true"
+SUMMARY_KEEP_MESSAGES = int(os.getenv("SUMMARY_KEEP_MESSAGES", "4"))  # Most recent messages always kept verbatim
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "250"))  # Size of the stored summary
+
+# Retrieved chunks (text, token count, prompt snippet) cached per server process, see app/chunk_store.py
+CHUNK_STORE_MAX_ENTRIES = int(os.getenv("CHUNK_STORE_MAX_ENTRIES", "10000"))
+
+# Adaptive model routing per retrieval turn (app/model_routing.py): simple / standard / complex tiers
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "true").lower() == "true"
+ROUTING_SIMPLE_MAX_WORDS = int(os.getenv("ROUTING_SIMPLE_MAX_WORDS", "14"))  # Longer questions are never "simple"
+ROUTING_COMPLEX_MIN_WORDS = int(os.getenv("ROUTING_COMPLEX_MIN_WORDS", "40"))  # Questions this long are "complex"
+# Retrieval scores are cosine similarity on every backend (Chroma l2/cosine/ip, compact and mmap indexes)
+ROUTING_SIMPLE_MIN_SCORE = float(os.getenv("ROUTING_SIMPLE_MIN_SCORE", "0.8"))  # Top similarity needed for "simple"
+ROUTING_SIMPLE_MIN_SPREAD = float(os.getenv("ROUTING_SIMPLE_MIN_SPREAD", "0.02"))  # Top minus mean similarity for "simple"
+ROUTING_NEAR_CORRECTION = float(os.getenv("ROUTING_NEAR_CORRECTION", "0.5"))  # Similarity to a corrected question -> "complex"
+
+# Speculative retrieval while the user types (/chat/prefetch, see app/prefetch.py)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_TTL = int(os.getenv("PREFETCH_TTL", "60"))  # Seconds a prefetched retrieval stays usable
+PREFETCH_MIN_CHARS = int(os.getenv("PREFETCH_MIN_CHARS", "12"))  # Shorter input is not prefetched
+PREFETCH_MIN_OVERLAP = float(os.getenv("PREFETCH_MIN_OVERLAP", "0.75"))  # Word overlap to reuse documents
+PREFETCH_RATE_PER_MINUTE = float(os.getenv("PREFETCH_RATE_PER_MINUTE", "30"))  # Per session
+PREFETCH_MAX_IN_FLIGHT = int(os.getenv("PREFETCH_MAX_IN_FLIGHT", "4"))  # Per server process
 
 # MongoDB Configuration
 MONGODB_URL = os.getenv("MONGODB_URL")
@@ -86,4 +157,10 @@ MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "slack2teams")
 MONGODB_CHAT_COLLECTION = os.getenv("MONGODB_CHAT_COLLECTION", "chat_histories")
 
 if not MONGODB_URL:
-    raise ValueError("MONGODB_URL environment variable is required")
\ No newline at end of file
+    raise ValueError("MONGODB_URL environment variable is required")
+# Server processes. SERVER_WORKERS > 1 runs uvicorn with that many worker processes
+# (one index build guarded by a file lock, file-backed stores shared safely);
+# gunicorn.conf.py reads the same values.
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8002"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Gunicorn config: one UvicornWorker per CPU core.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+SERVER_WORKERS / SERVER_HOST / SERVER_PORT override the defaults. The app is
+not preloaded: each worker imports it after the fork, so connection pools and
+background tasks are created per process, and the vectorstore file lock lets
+exactly one of them build the index while the others wait.
+"""
+
+import multiprocessing
+import os
+
+bind = f"{os.getenv('SERVER_HOST', '0.0.0.0')}:{os.getenv('SERVER_PORT', '8002')}"
+workers = int(os.getenv("SERVER_WORKERS") or os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = False
+
+# Workers waiting on a first-time index build must not be killed as unresponsive
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "600"))
+graceful_timeout = 30
+keepalive = 5
@@ -3,202 +3,418 @@
 Fine-Tuning Management Script for CloudFuze Chatbot
 Unified tool to start, monitor, and manage OpenAI fine-tuning jobs.
 
+The training data pipeline streams: corrections are read one line at a time,
+deduplicated by content hash, collapsed to the latest answer per near-duplicate
+question, token-validated in parallel and written straight to the training file.
+Uploads go through the OpenAI Uploads API in parallel parts, and progress is
+kept in data/fine_tuning_dataset/pipeline_state.json so an interrupted `start`
+resumes where it stopped.
+
 Usage:
-    python scripts/manage_fine_tuning.py start     # Start new fine-tuning job
-    python scripts/manage_fine_tuning.py status    # Check status of jobs
-    python scripts/manage_fine_tuning.py cleanup   # Clean up old training files
+    python scripts/manage_fine_tuning.py start             # Start (or resume) a fine-tuning job
+    python scripts/manage_fine_tuning.py status            # Check status of jobs
+    python scripts/manage_fine_tuning.py status A B --watch  # Poll several jobs until they finish
+    python scripts/manage_fine_tuning.py cleanup           # Clean up old training files
 """
 
 import json
 import os
 import glob
+import sys
+import math
+import asyncio
+import hashlib
 import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from openai import OpenAI
+import httpx
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.correction_dataset import correction_dataset, FINE_TUNING_SYSTEM_PROMPT
+from app.feedback_store import normalize_question
+from app.tokens import count_tokens
+
 # Load environment variables from .env file
 load_dotenv()
 
+# ======================== CONFIG ========================
+
+DATASET_DIR = "./data/fine_tuning_dataset"
+PIPELINE_STATE_FILE = f"{DATASET_DIR}/pipeline_state.json"
+STATUS_FILE = "./data/fine_tuning_status.json"
+
+BASE_MODEL = "gpt-4o-mini-2024-07-18"
+MIN_EXAMPLES = 10                   # Recommended minimum training examples
+MAX_EXAMPLE_TOKENS = 65536          # gpt-4o-mini training context per example
+VALIDATION_WORKERS = min(8, os.cpu_count() or 1)
+VALIDATION_BATCH_SIZE = 256         # Examples per token-counting task
+UPLOAD_PART_SIZE = 8 * 1024 * 1024  # Bytes per upload part (API max is 64 MB)
+UPLOAD_WORKERS = 4                  # Parts uploaded concurrently
+POLL_INTERVAL = 30                  # Seconds between status polls
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+# Words ignored when deciding two questions are near-duplicates
+STOP_WORDS = {
+    "a", "an", "the", "is", "are", "do", "does", "can", "i", "we", "you", "my", "our",
+    "to", "of", "in", "on", "for", "how", "what", "please", "me", "it", "with", "and"
+}
+
+
+def api_base():
+    return os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+
+
+def api_headers():
+    return {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+
 # ======================== DATA LOADING ========================
 
-def load_correction_dataset():
-    """Load all correction data from JSONL files (supports both single file and legacy daily files)."""
-    dataset_dir = "./data/fine_tuning_dataset"
-    all_corrections = []
-    
-    if not os.path.exists(dataset_dir):
-        print("[ERROR] No fine-tuning dataset found!")
-        return []
-    
-    # Check for new single file format first
-    single_file = f"{dataset_dir}/corrections.jsonl"
-    if os.path.exists(single_file):
-        print(f"[*] Loading from unified corrections file")
-        with open(single_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    try:
-                        correction = json.loads(line.strip())
-                        all_corrections.append(correction)
-                    except json.JSONDecodeError as e:
-                        print(f"[WARNING] Error parsing line: {e}")
-        print(f"[OK] Loaded {len(all_corrections)} corrections from unified file")
-    
-    # Also load legacy daily files if they exist
-    legacy_files = glob.glob(f"{dataset_dir}/corrections_*.jsonl")
-    if legacy_files:
-        print(f"[*] Found {len(legacy_files)} legacy daily correction files")
-        print(f"[TIP] Run 'python scripts/manage_fine_tuning.py merge' to consolidate them")
-        
-        for file_path in legacy_files:
-            print(f"[*] Loading: {os.path.basename(file_path)}")
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            correction = json.loads(line.strip())
-                            all_corrections.append(correction)
-                        except json.JSONDecodeError as e:
-                            print(f"[WARNING] Error parsing line: {e}")
-    
-    if not all_corrections:
-        print("[ERROR] No correction files found!")
-        return []
-    
-    print(f"[OK] Total loaded: {len(all_corrections)} corrections")
-    return all_corrections
-
-def prepare_training_data(corrections):
-    """Prepare data in OpenAI fine-tuning format."""
-    training_data = []
-    
-    for correction in corrections:
-        # Create training example in chat format
-        training_example = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are an expert assistant specializing in Slack to Microsoft Teams migrations via CloudFuze. Provide accurate, helpful, and specific information about migration processes, tools, and best practices."
-                },
-                {
-                    "role": "user", 
-                    "content": correction["input"]
-                },
-                {
-                    "role": "assistant",
-                    "content": correction["corrected_output"]
-                }
-            ]
-        }
-        training_data.append(training_example)
-    
-    return training_data
+def dataset_stats():
+    """Correction counts from the dataset's sidecar index (no full read)."""
+    stats = correction_dataset.stats()
+    print(f"[OK] {stats['count']} corrections indexed ({stats['trainable_count']} trainable, "
+          f"~{stats['unique_questions']} unique questions, {stats['recent_count']} in the last 7 days)")
+    return stats
+
+def iter_jsonl(file_path):
+    """Stream JSON records from a JSONL file, skipping corrupt lines."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line.strip())
+                except json.JSONDecodeError as e:
+                    print(f"[WARNING] Error parsing line in {os.path.basename(file_path)}: {e}")
+
+def iter_legacy_corrections():
+    """Stream corrections from legacy daily files, one record at a time."""
+    for file_path in sorted(glob.glob(f"{DATASET_DIR}/corrections_*.jsonl")):
+        yield from iter_jsonl(file_path)
+
+def iter_corrections():
+    """
+    Every correction as ((source, ordinal), record): unified dataset first,
+    then legacy daily files. Keys stay stable if the app appends meanwhile.
+    """
+    for ordinal, correction in enumerate(correction_dataset.iter_records()):
+        yield (0, ordinal), correction
+    for source, file_path in enumerate(sorted(glob.glob(f"{DATASET_DIR}/corrections_*.jsonl")), 1):
+        for ordinal, correction in enumerate(iter_jsonl(file_path)):
+            yield (source, ordinal), correction
+
+def content_hash(correction):
+    """Digest of the normalized question and corrected answer (exact-duplicate key)."""
+    text = normalize_question(correction.get("input")) + "\x00" + (correction.get("corrected_output") or "").strip()
+    return hashlib.sha256(text.encode("utf-8")).digest()[:16]
+
+def question_key(question):
+    """Near-duplicate key: the question's content words, order and stop words ignored."""
+    words = normalize_question(question).split()
+    content_words = sorted(set(w for w in words if w not in STOP_WORDS)) or words
+    return hashlib.sha256(" ".join(content_words).encode("utf-8")).digest()[:8]
+
+def is_trainable(correction):
+    return bool((correction.get("input") or "").strip() and (correction.get("corrected_output") or "").strip())
+
+# ======================== TRAINING DATA PIPELINE ========================
+
+def plan_examples():
+    """
+    First streaming pass: decide which corrections become training examples.
+
+    Exact duplicates are dropped and near-duplicate questions collapse to their
+    latest correction. Only hashes and record keys are kept in memory.
+    """
+    seen_hashes = set()
+    latest_by_question = {}
+    stats = {"read": 0, "untrainable": 0, "exact_duplicates": 0, "near_duplicates": 0}
+
+    for position, correction in iter_corrections():
+        stats["read"] += 1
+        if not is_trainable(correction):
+            stats["untrainable"] += 1
+            continue
+        digest = content_hash(correction)
+        if digest in seen_hashes:
+            stats["exact_duplicates"] += 1
+            continue
+        seen_hashes.add(digest)
+        key = question_key(correction["input"])
+        if key in latest_by_question:
+            stats["near_duplicates"] += 1
+        latest_by_question[key] = position
+
+    return set(latest_by_question.values()), stats
+
+def build_example(correction):
+    return {
+        "messages": [
+            {"role": "system", "content": FINE_TUNING_SYSTEM_PROMPT},
+            {"role": "user", "content": correction["input"].strip()},
+            {"role": "assistant", "content": correction["corrected_output"].strip()}
+        ]
+    }
+
+def validate_batch(examples):
+    """Token-check a batch; returns (serialized line or None, reason) per example."""
+    results = []
+    for example in examples:
+        tokens = sum(count_tokens(m["content"], "gpt-4o-mini") + 4 for m in example["messages"]) + 2
+        if tokens > MAX_EXAMPLE_TOKENS:
+            results.append((None, f"too_long ({tokens} tokens)"))
+        else:
+            results.append((json.dumps(example, ensure_ascii=False) + '\n', None))
+    return results
+
+def ordered_parallel_map(fn, batches, workers):
+    """Map fn over batches on a thread pool, in order, with a bounded number in flight."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append(executor.submit(fn, batch))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+def export_training_file(training_file):
+    """Stream planned corrections into an OpenAI fine-tuning JSONL file; returns a summary."""
+    keep_positions, stats = plan_examples()
+
+    def batches():
+        batch = []
+        for position, correction in iter_corrections():
+            if position in keep_positions:
+                batch.append(build_example(correction))
+                if len(batch) >= VALIDATION_BATCH_SIZE:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    sha256 = hashlib.sha256()
+    written = rejected = size = 0
+    with open(training_file, 'w', encoding='utf-8', newline='') as out:
+        for results in ordered_parallel_map(validate_batch, batches(), VALIDATION_WORKERS):
+            for line, reason in results:
+                if line is None:
+                    rejected += 1
+                    print(f"[WARNING] Skipping example: {reason}")
+                    continue
+                data = line.encode("utf-8")
+                sha256.update(data)
+                size += len(data)
+                out.write(line)
+                written += 1
+
+    stats.update({"examples": written, "rejected": rejected, "bytes": size, "sha256": sha256.hexdigest()})
+    return stats
+
+# ======================== PIPELINE STATE ========================
+
+def load_pipeline_state():
+    if os.path.exists(PIPELINE_STATE_FILE):
+        try:
+            with open(PIPELINE_STATE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING] Ignoring unreadable pipeline state: {e}")
+    return None
+
+def save_pipeline_state(state):
+    tmp_path = PIPELINE_STATE_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, PIPELINE_STATE_FILE)
+
+def clear_pipeline_state():
+    if os.path.exists(PIPELINE_STATE_FILE):
+        os.remove(PIPELINE_STATE_FILE)
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def training_file_intact(state):
+    """True if the state's training file still exists with the recorded size and sha256."""
+    path = state.get("training_file")
+    if not path or not os.path.exists(path) or os.path.getsize(path) != state.get("bytes"):
+        return False
+    return bool(state.get("sha256")) and file_sha256(path) == state["sha256"]
 
 # ======================== FINE-TUNING ========================
 
-def start_fine_tuning(training_data):
-    """Start OpenAI fine-tuning job."""
+def upload_training_file(client, state):
+    """Chunked, parallel, resumable upload through the Uploads API; returns the file id."""
+    if state.get("file_id"):
+        return state["file_id"]
+
+    size = state["bytes"]
+    part_count = max(1, math.ceil(size / UPLOAD_PART_SIZE))
+
+    if not state.get("upload_id"):
+        response = client.post("/uploads", json={
+            "purpose": "fine-tune",
+            "filename": os.path.basename(state["training_file"]),
+            "bytes": size,
+            "mime_type": "text/jsonl"
+        })
+        response.raise_for_status()
+        state["upload_id"] = response.json()["id"]
+        state["parts"] = {}
+        save_pipeline_state(state)
+        print(f"[OK] Upload created: {state['upload_id']} ({part_count} part(s))")
+    else:
+        print(f"[*] Resuming upload {state['upload_id']} ({len(state['parts'])}/{part_count} parts done)")
+
+    upload_id = state["upload_id"]
+    lock = threading.Lock()
+
+    def send_part(index):
+        with open(state["training_file"], 'rb') as f:
+            f.seek(index * UPLOAD_PART_SIZE)
+            chunk = f.read(UPLOAD_PART_SIZE)
+        response = client.post(f"/uploads/{upload_id}/parts", files={"data": ("part", chunk)})
+        response.raise_for_status()
+        with lock:
+            state["parts"][str(index)] = response.json()["id"]
+            save_pipeline_state(state)
+        print(f"[OK] Uploaded part {index + 1}/{part_count}")
+
+    pending = [i for i in range(part_count) if str(i) not in state["parts"]]
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        for future in [executor.submit(send_part, i) for i in pending]:
+            future.result()
+
+    response = client.post(f"/uploads/{upload_id}/complete", json={
+        "part_ids": [state["parts"][str(i)] for i in range(part_count)]
+    })
+    response.raise_for_status()
+    state["file_id"] = response.json()["file"]["id"]
+    save_pipeline_state(state)
+    print(f"[OK] File uploaded: {state['file_id']}")
+    return state["file_id"]
+
+def create_fine_tuning_job(client, state):
+    """Start the fine-tuning job for the uploaded file; returns the job."""
+    response = client.post("/fine_tuning/jobs", json={
+        "training_file": state["file_id"],
+        "model": BASE_MODEL
+    })
+    response.raise_for_status()
+    job = response.json()
+    state["job_id"] = job["id"]
+    save_pipeline_state(state)
+    return job
+
+def start_fine_tuning(state):
+    """Upload the training file and start the job, resuming from saved state. Returns the job id."""
     try:
-        client = OpenAI()
-        
-        # Save training data to file with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        training_file = f"./data/fine_tuning_dataset/training_data_{timestamp}.jsonl"
-        
-        with open(training_file, 'w', encoding='utf-8') as f:
-            for example in training_data:
-                f.write(json.dumps(example, ensure_ascii=False) + '\n')
-        
-        print(f"[*] Training data saved to: {training_file}")
-        
-        # Upload training file to OpenAI
-        print("[*] Uploading training file to OpenAI...")
-        with open(training_file, 'rb') as f:
-            upload_response = client.files.create(
-                file=f,
-                purpose="fine-tune"
-            )
-        
-        print(f"[OK] File uploaded: {upload_response.id}")
-        
-        # Start fine-tuning job
-        print("[*] Starting fine-tuning job...")
-        fine_tune_response = client.fine_tuning.jobs.create(
-            training_file=upload_response.id,
-            model="gpt-4o-mini-2024-07-18"  # Using gpt-4o-mini as base model
-        )
-        
-        print(f"[OK] Fine-tuning job started!")
-        print(f"   Job ID: {fine_tune_response.id}")
-        print(f"   Status: {fine_tune_response.status}")
-        
+        with httpx.Client(base_url=api_base(), headers=api_headers(), timeout=300) as client:
+            print("[*] Uploading training file to OpenAI...")
+            try:
+                upload_training_file(client, state)
+            except httpx.HTTPStatusError as e:
+                if not state.get("upload_id") or e.response.status_code not in (400, 404):
+                    raise
+                # Expired or cancelled upload: start a fresh one for the same file
+                print(f"[WARNING] Upload {state['upload_id']} can no longer be resumed, starting over")
+                state.pop("upload_id", None)
+                state["parts"] = {}
+                save_pipeline_state(state)
+                upload_training_file(client, state)
+
+            print("[*] Starting fine-tuning job...")
+            job = create_fine_tuning_job(client, state)
+
+        print("[OK] Fine-tuning job started!")
+        print(f"   Job ID: {job['id']}")
+        print(f"   Status: {job['status']}")
+
         # Save job info
         job_info = {
-            "job_id": fine_tune_response.id,
-            "status": fine_tune_response.status,
-            "model": "gpt-4o-mini-2024-07-18",
-            "training_file": upload_response.id,
+            "job_id": job["id"],
+            "status": job["status"],
+            "model": BASE_MODEL,
+            "training_file": state["file_id"],
             "created_at": datetime.now().isoformat(),
-            "corrections_count": len(training_data)
+            "corrections_count": state["examples"]
         }
-        
-        with open("./data/fine_tuning_status.json", 'w', encoding='utf-8') as f:
+
+        with open(STATUS_FILE, 'w', encoding='utf-8') as f:
             json.dump(job_info, f, indent=2, ensure_ascii=False)
-        
-        # Clean up old training files after successful upload
-        cleanup_old_training_files(training_file)
-        
-        return fine_tune_response.id
-        
+
+        # Pipeline finished: clear resume state and old training files
+        clear_pipeline_state()
+        cleanup_old_training_files(state["training_file"])
+
+        return job["id"]
+
     except Exception as e:
         print(f"[ERROR] Error starting fine-tuning: {e}")
-        import traceback
-        traceback.print_exc()
+        print("[TIP] Progress is saved; run 'start' again to resume")
         return None
 
 # ======================== STATUS CHECKING ========================
 
-def check_fine_tuning_status(job_id=None):
+async def fetch_job(client, job_id):
+    response = await client.get(f"/fine_tuning/jobs/{job_id}")
+    response.raise_for_status()
+    return response.json()
+
+async def watch_jobs(job_ids, interval=POLL_INTERVAL, watch=False):
+    """Poll several jobs concurrently, printing each status change; stops when all finish."""
+    async with httpx.AsyncClient(base_url=api_base(), headers=api_headers(), timeout=30) as client:
+        if not job_ids:
+            response = await client.get("/fine_tuning/jobs", params={"limit": 10})
+            response.raise_for_status()
+            # Filter to show only gpt-4o-mini jobs
+            jobs = [job for job in response.json().get("data", []) if "gpt-4o-mini" in job.get("model", "")]
+            if not jobs:
+                print("\n[*] No gpt-4o-mini fine-tuning jobs found")
+                return {}
+            print(f"\n[*] Found {len(jobs)} gpt-4o-mini fine-tuning job(s)")
+            job_ids = [job["id"] for job in jobs]
+
+        last_status = {}
+        pending = list(job_ids)
+        while pending:
+            results = await asyncio.gather(*(fetch_job(client, job_id) for job_id in pending),
+                                           return_exceptions=True)
+            for job_id, job in zip(list(pending), results):
+                if isinstance(job, Exception):
+                    print(f"[ERROR] Could not retrieve job {job_id}: {job}")
+                    pending.remove(job_id)
+                    continue
+                if last_status.get(job_id) != job["status"]:
+                    last_status[job_id] = job["status"]
+                    display_job_status(job)
+                if job["status"] in TERMINAL_STATUSES:
+                    pending.remove(job_id)
+            if not watch or not pending:
+                break
+            await asyncio.sleep(interval)
+
+        return last_status
+
+def check_fine_tuning_status(job_ids=None, watch=False, interval=POLL_INTERVAL):
     """Check the status of fine-tuning jobs."""
     try:
-        client = OpenAI()
-        
         print("\n" + "=" * 70)
         print("FINE-TUNING JOBS STATUS")
         print("=" * 70)
-        
-        if job_id:
-            # Check specific job
-            try:
-                job = client.fine_tuning.jobs.retrieve(job_id)
-                display_job_status(job)
-            except Exception as e:
-                print(f"[ERROR] Could not retrieve job {job_id}: {e}")
-        else:
-            # Get all fine-tuning jobs
-            jobs = client.fine_tuning.jobs.list(limit=10)
-            
-            if not jobs.data:
-                print("\n[*] No fine-tuning jobs found")
-                return
-            
-            # Filter to show only gpt-4o-mini jobs
-            gpt4o_jobs = [job for job in jobs.data if "gpt-4o-mini" in job.model]
-            
-            if not gpt4o_jobs:
-                print("\n[*] No gpt-4o-mini fine-tuning jobs found")
-                return
-            
-            print(f"\n[*] Found {len(gpt4o_jobs)} gpt-4o-mini fine-tuning job(s)\n")
-            
-            for idx, job in enumerate(gpt4o_jobs, 1):
-                print(f"\n--- Job {idx} ---")
-                display_job_status(job)
-        
+
+        asyncio.run(watch_jobs(job_ids or [], interval=interval, watch=watch))
+
         # Check local status file
         display_local_status()
-        
+
     except Exception as e:
         print(f"[ERROR] Error checking fine-tuning status: {e}")
         import traceback
@@ -206,40 +422,41 @@ def check_fine_tuning_status(job_id=None):
 
 def display_job_status(job):
     """Display formatted job status."""
-    print(f"\nJob ID: {job.id}")
-    print(f"Model: {job.model}")
-    print(f"Status: {job.status}")
-    print(f"Created: {datetime.fromtimestamp(job.created_at).strftime('%Y-%m-%d %H:%M:%S')}")
-    
-    if job.fine_tuned_model:
-        print(f"Fine-tuned Model: {job.fine_tuned_model}")
-    
+    print(f"\nJob ID: {job['id']}")
+    print(f"Model: {job.get('model')}")
+    print(f"Status: {job['status']}")
+    if job.get("created_at"):
+        print(f"Created: {datetime.fromtimestamp(job['created_at']).strftime('%Y-%m-%d %H:%M:%S')}")
+
+    if job.get("fine_tuned_model"):
+        print(f"Fine-tuned Model: {job['fine_tuned_model']}")
+
     # Status-specific messages
-    if job.status == "succeeded":
-        print(f"\n[SUCCESS] Job completed successfully!")
-        print(f"   Your fine-tuned model: {job.fine_tuned_model}")
-        print(f"\n   To use this model, update app/endpoints.py:")
-        print(f"   model_name=\"{job.fine_tuned_model}\"")
-    elif job.status == "failed":
-        print(f"\n[FAILED] Job failed")
-        if hasattr(job, 'error') and job.error:
-            print(f"   Error: {job.error}")
-    elif job.status == "running":
-        print(f"\n[IN PROGRESS] Job is running...")
-        print(f"   This typically takes 20 minutes to 2 hours")
-    elif job.status == "validating_files":
-        print(f"\n[VALIDATING] Validating training files...")
-    elif job.status == "queued":
-        print(f"\n[QUEUED] Job is queued and will start soon...")
+    if job["status"] == "succeeded":
+        print("\n[SUCCESS] Job completed successfully!")
+        print(f"   Your fine-tuned model: {job.get('fine_tuned_model')}")
+        print("\n   To use this model, update app/endpoints.py:")
+        print(f"   model_name=\"{job.get('fine_tuned_model')}\"")
+    elif job["status"] == "failed":
+        print("\n[FAILED] Job failed")
+        if job.get("error"):
+            print(f"   Error: {job['error']}")
+    elif job["status"] == "running":
+        print("\n[IN PROGRESS] Job is running...")
+        print("   This typically takes 20 minutes to 2 hours")
+    elif job["status"] == "validating_files":
+        print("\n[VALIDATING] Validating training files...")
+    elif job["status"] == "queued":
+        print("\n[QUEUED] Job is queued and will start soon...")
 
 def display_local_status():
     """Display local status file information."""
-    if os.path.exists("./data/fine_tuning_status.json"):
+    if os.path.exists(STATUS_FILE):
         try:
-            with open("./data/fine_tuning_status.json", 'r', encoding='utf-8') as f:
+            with open(STATUS_FILE, 'r', encoding='utf-8') as f:
                 local_status = json.load(f)
-            
-            print(f"\n" + "-" * 70)
+
+            print("\n" + "-" * 70)
             print("LOCAL STATUS FILE:")
             print("-" * 70)
             print(f"Job ID: {local_status.get('job_id', 'N/A')}")
@@ -248,198 +465,208 @@ def display_local_status():
         except Exception as e:
             print(f"[WARNING] Could not read local status file: {e}")
 
+    state = load_pipeline_state()
+    if state:
+        print(f"\n[*] An interrupted pipeline is waiting to resume ({os.path.basename(state['training_file'])}); "
+              f"run 'start' to continue")
+
 # ======================== CLEANUP ========================
 
 def cleanup_old_training_files(keep_file=None):
     """Clean up old training_data_*.jsonl files."""
     try:
-        old_files = glob.glob("./data/fine_tuning_dataset/training_data_*.jsonl")
+        old_files = glob.glob(f"{DATASET_DIR}/training_data_*.jsonl")
         deleted_count = 0
-        
+
         for old_file in old_files:
-            if keep_file and old_file == keep_file:
+            if keep_file and os.path.abspath(old_file) == os.path.abspath(keep_file):
                 continue  # Don't delete the current file
-            
+
             try:
                 os.remove(old_file)
                 print(f"[OK] Deleted old training file: {os.path.basename(old_file)}")
                 deleted_count += 1
             except Exception as e:
                 print(f"[WARNING] Could not delete {os.path.basename(old_file)}: {e}")
-        
+
         if deleted_count > 0:
             print(f"[OK] Cleaned up {deleted_count} old training file(s)")
-        
+
     except Exception as e:
         print(f"[WARNING] Cleanup failed: {e}")
 
-def cleanup_command():
+def cleanup_command(assume_yes=False):
     """Manual cleanup of old training files."""
     print("\n" + "=" * 70)
     print("CLEANUP OLD TRAINING FILES")
     print("=" * 70)
-    
-    old_files = glob.glob("./data/fine_tuning_dataset/training_data_*.jsonl")
-    
+
+    old_files = glob.glob(f"{DATASET_DIR}/training_data_*.jsonl")
+
     if not old_files:
         print("\n[*] No training files to clean up")
         return
-    
+
     print(f"\n[*] Found {len(old_files)} training file(s):")
     for f in old_files:
         size = os.path.getsize(f) / 1024  # KB
         print(f"   - {os.path.basename(f)} ({size:.1f} KB)")
-    
-    response = input("\nDelete all these files? (y/n): ")
-    if response.lower() == 'y':
-        cleanup_old_training_files()
+
+    if assume_yes or input("\nDelete all these files? (y/n): ").lower() == 'y':
+        state = load_pipeline_state()
+        cleanup_old_training_files(state["training_file"] if state else None)
         print("\n[SUCCESS] Cleanup complete!")
     else:
         print("\n[*] Cleanup cancelled")
 
-def merge_command():
-    """Merge legacy daily correction files into single unified file."""
+def merge_command(assume_yes=False):
+    """Merge legacy daily correction files into the unified dataset, streaming."""
     print("\n" + "=" * 70)
     print("MERGE CORRECTION FILES")
     print("=" * 70)
-    
-    dataset_dir = "./data/fine_tuning_dataset"
-    single_file = f"{dataset_dir}/corrections.jsonl"
-    legacy_files = glob.glob(f"{dataset_dir}/corrections_*.jsonl")
-    
+
+    legacy_files = sorted(glob.glob(f"{DATASET_DIR}/corrections_*.jsonl"))
+
     if not legacy_files:
         print("\n[*] No legacy daily files to merge")
         return
-    
+
     print(f"\n[*] Found {len(legacy_files)} legacy daily file(s):")
     total_size = 0
     for f in legacy_files:
         size = os.path.getsize(f) / 1024  # KB
         total_size += size
         print(f"   - {os.path.basename(f)} ({size:.1f} KB)")
-    
+
     print(f"\n[*] Total size: {total_size:.1f} KB")
-    
-    # Count existing corrections in unified file
-    existing_count = 0
-    existing_trace_ids = set()
-    if os.path.exists(single_file):
-        with open(single_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    try:
-                        correction = json.loads(line.strip())
-                        existing_count += 1
-                        existing_trace_ids.add(correction.get('trace_id'))
-                    except json.JSONDecodeError:
-                        pass
-        print(f"\n[*] Unified file already has {existing_count} corrections")
-    
-    # Load all legacy corrections
-    all_corrections = []
-    duplicates = 0
-    for file_path in legacy_files:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    try:
-                        correction = json.loads(line.strip())
-                        # Skip if already in unified file
-                        if correction.get('trace_id') in existing_trace_ids:
-                            duplicates += 1
-                        else:
-                            all_corrections.append(correction)
-                    except json.JSONDecodeError as e:
-                        print(f"[WARNING] Error parsing line: {e}")
-    
-    if not all_corrections:
-        print(f"\n[*] All {duplicates} corrections already in unified file")
-        print(f"[*] Safe to delete legacy files")
-    else:
-        print(f"\n[*] Will merge {len(all_corrections)} new corrections")
-        if duplicates > 0:
-            print(f"[*] Skipping {duplicates} duplicates")
-    
-    response = input("\nProceed with merge? (y/n): ")
-    if response.lower() != 'y':
+
+    if not assume_yes and input("\nProceed with merge? (y/n): ").lower() != 'y':
         print("\n[*] Merge cancelled")
         return
-    
-    # Append to unified file
-    if all_corrections:
-        with open(single_file, 'a', encoding='utf-8') as f:
-            for correction in all_corrections:
-                f.write(json.dumps(correction, ensure_ascii=False) + '\n')
-        print(f"\n[OK] Merged {len(all_corrections)} corrections to {os.path.basename(single_file)}")
-    
+
+    # Content hashes of what is already unified; records are never held in memory
+    existing_hashes = set(content_hash(c) for c in correction_dataset.iter_records())
+    print(f"\n[*] Unified dataset already has {len(existing_hashes)} distinct corrections")
+
+    merged = duplicates = 0
+    for correction in iter_legacy_corrections():
+        digest = content_hash(correction)
+        if digest in existing_hashes:
+            duplicates += 1
+            continue
+        existing_hashes.add(digest)
+        correction_dataset.append_record(correction)
+        merged += 1
+
+    print(f"\n[OK] Merged {merged} corrections into {os.path.basename(correction_dataset.path)}")
+    if duplicates > 0:
+        print(f"[*] Skipped {duplicates} duplicates")
+
     # Ask to delete legacy files
-    response = input("\nDelete legacy daily files? (y/n): ")
-    if response.lower() == 'y':
+    if assume_yes or input("\nDelete legacy daily files? (y/n): ").lower() == 'y':
         for file_path in legacy_files:
             os.remove(file_path)
             print(f"[OK] Deleted {os.path.basename(file_path)}")
         print(f"\n[SUCCESS] Merge complete! Deleted {len(legacy_files)} legacy file(s)")
     else:
         print("\n[*] Legacy files kept (you can delete them manually later)")
-    
+
     # Show final stats
-    final_count = existing_count + len(all_corrections)
-    print(f"\n[SUMMARY]")
-    print(f"   Unified file: {os.path.basename(single_file)}")
-    print(f"   Total corrections: {final_count}")
-    print(f"   File size: {os.path.getsize(single_file) / 1024:.1f} KB")
+    print("\n[SUMMARY]")
+    print(f"   Unified file: {os.path.basename(correction_dataset.path)}")
+    print(f"   Total corrections: {correction_dataset.stats()['count']}")
+    print(f"   File size: {os.path.getsize(correction_dataset.path) / 1024:.1f} KB")
 
 # ======================== MAIN WORKFLOW ========================
 
-def start_command():
-    """Start new fine-tuning job."""
+def start_command(fresh=False, assume_yes=False, watch=False, interval=POLL_INTERVAL):
+    """Start new fine-tuning job, or resume an interrupted one."""
     print("\n" + "=" * 70)
     print("START FINE-TUNING JOB")
     print("=" * 70)
-    
-    # Step 1: Load correction dataset
-    print("\n[STEP 1] Loading correction dataset...")
-    corrections = load_correction_dataset()
-    
-    if not corrections:
-        print("\n[ERROR] No corrections found. Collect more feedback first.")
-        print("   Users need to click thumbs down (👎) on responses to generate corrections.")
-        return
-    
-    # Step 2: Check data quality
-    print(f"\n[STEP 2] Data quality check...")
-    print(f"   Total corrections: {len(corrections)}")
-    
-    # Check for minimum samples
-    if len(corrections) < 10:
-        print(f"\n[WARNING] Only {len(corrections)} corrections found")
-        print(f"   Recommended minimum: 10 corrections")
-        response = input("\nContinue anyway? (y/n): ")
-        if response.lower() != 'y':
-            print("\n[*] Fine-tuning cancelled")
+    os.makedirs(DATASET_DIR, exist_ok=True)
+
+    state = load_pipeline_state()
+    if state and fresh:
+        print("\n[*] Discarding interrupted pipeline (--fresh)")
+        clear_pipeline_state()
+        state = None
+    if state and not training_file_intact(state):
+        print("\n[WARNING] Saved training file is missing or changed; rebuilding")
+        clear_pipeline_state()
+        state = None
+
+    if state:
+        print(f"\n[*] Resuming pipeline for {os.path.basename(state['training_file'])} "
+              f"({state['examples']} examples)")
+    else:
+        # Step 1: Read dataset counts from the index
+        print("\n[STEP 1] Reading correction dataset index...")
+        stats = dataset_stats()
+        legacy_files = glob.glob(f"{DATASET_DIR}/corrections_*.jsonl")
+        if legacy_files:
+            print(f"[TIP] {len(legacy_files)} legacy daily file(s) found; "
+                  f"run 'python scripts/manage_fine_tuning.py merge' to consolidate them")
+
+        if not stats["count"] and not legacy_files:
+            print("\n[ERROR] No corrections found. Collect more feedback first.")
+            print("   Users need to click thumbs down (👎) on responses to generate corrections.")
             return
-    
-    # Step 3: Prepare training data
-    print(f"\n[STEP 3] Preparing training data...")
-    training_data = prepare_training_data(corrections)
-    print(f"[OK] Prepared {len(training_data)} training examples")
-    
-    # Step 4: Start fine-tuning
-    print(f"\n[STEP 4] Starting fine-tuning job...")
-    job_id = start_fine_tuning(training_data)
-    
+
+        # Step 2: Stream, dedupe and validate into the training file
+        print("\n[STEP 2] Preparing training data...")
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        training_file = f"{DATASET_DIR}/training_data_{timestamp}.jsonl"
+        summary = export_training_file(training_file)
+        print(f"[OK] Wrote {summary['examples']} training examples to: {training_file}")
+        print(f"   Read: {summary['read']}, untrainable: {summary['untrainable']}, "
+              f"exact duplicates: {summary['exact_duplicates']}, "
+              f"near-duplicate questions collapsed: {summary['near_duplicates']}, "
+              f"too long: {summary['rejected']}")
+
+        if not summary["examples"]:
+            print("\n[ERROR] No trainable corrections (question and corrected answer) found.")
+            os.remove(training_file)
+            return
+
+        # Step 3: Check data quality
+        print("\n[STEP 3] Data quality check...")
+        if summary["examples"] < MIN_EXAMPLES:
+            print(f"\n[WARNING] Only {summary['examples']} training examples")
+            print(f"   Recommended minimum: {MIN_EXAMPLES} examples")
+            if not assume_yes and input("\nContinue anyway? (y/n): ").lower() != 'y':
+                print("\n[*] Fine-tuning cancelled")
+                os.remove(training_file)
+                return
+
+        state = {
+            "training_file": training_file,
+            "examples": summary["examples"],
+            "bytes": summary["bytes"],
+            "sha256": summary["sha256"],
+            "created_at": datetime.now().isoformat()
+        }
+        save_pipeline_state(state)
+
+    # Step 4: Upload and start fine-tuning
+    print("\n[STEP 4] Starting fine-tuning job...")
+    job_id = start_fine_tuning(state)
+
     if job_id:
-        print(f"\n" + "=" * 70)
+        print("\n" + "=" * 70)
         print("[SUCCESS] Fine-tuning job started!")
         print("=" * 70)
         print(f"\nJob ID: {job_id}")
-        print(f"\nNext steps:")
-        print(f"  1. Monitor: https://platform.openai.com/finetune")
-        print(f"  2. Check status: python scripts/manage_fine_tuning.py status")
-        print(f"  3. Wait 20 mins - 2 hours for completion")
+        print("\nNext steps:")
+        print("  1. Monitor: https://platform.openai.com/finetune")
+        print(f"  2. Check status: python scripts/manage_fine_tuning.py status {job_id} --watch")
+        print("  3. Wait 20 mins - 2 hours for completion")
         print("=" * 70)
+        if watch:
+            asyncio.run(watch_jobs([job_id], interval=interval, watch=True))
     else:
-        print(f"\n[ERROR] Failed to start fine-tuning job")
+        print("\n[ERROR] Failed to start fine-tuning job")
+    return job_id
 
 # ======================== CLI ========================
 
@@ -450,38 +677,42 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
-  python scripts/manage_fine_tuning.py start          # Start new fine-tuning job
-  python scripts/manage_fine_tuning.py status         # Check all jobs
-  python scripts/manage_fine_tuning.py status JOB_ID  # Check specific job
-  python scripts/manage_fine_tuning.py merge          # Merge daily files into one
-  python scripts/manage_fine_tuning.py cleanup        # Clean up old training files
+  python scripts/manage_fine_tuning.py start                  # Start (or resume) a fine-tuning job
+  python scripts/manage_fine_tuning.py start --fresh          # Discard an interrupted run and rebuild
+  python scripts/manage_fine_tuning.py status                 # Check all jobs
+  python scripts/manage_fine_tuning.py status JOB_A JOB_B --watch  # Poll jobs until they finish
+  python scripts/manage_fine_tuning.py merge                  # Merge daily files into one
+  python scripts/manage_fine_tuning.py cleanup                # Clean up old training files
         """
     )
-    
+
     parser.add_argument(
         'command',
         choices=['start', 'status', 'merge', 'cleanup'],
         help='Command to execute'
     )
-    
+
     parser.add_argument(
-        'job_id',
-        nargs='?',
-        help='Job ID to check (optional, for status command)'
+        'job_ids',
+        nargs='*',
+        help='Job IDs to check (optional, for status command)'
     )
-    
+    parser.add_argument('--watch', action='store_true', help='Keep polling until jobs finish')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help='Seconds between polls')
+    parser.add_argument('--fresh', action='store_true', help='Ignore saved progress and rebuild the training file')
+    parser.add_argument('--yes', '-y', action='store_true', help='Answer yes to all prompts')
+
     args = parser.parse_args()
-    
+
     # Execute command
     if args.command == 'start':
-        start_command()
+        start_command(fresh=args.fresh, assume_yes=args.yes, watch=args.watch, interval=args.interval)
     elif args.command == 'status':
-        check_fine_tuning_status(args.job_id)
+        check_fine_tuning_status(args.job_ids, watch=args.watch, interval=args.interval)
     elif args.command == 'merge':
-        merge_command()
+        merge_command(assume_yes=args.yes)
     elif args.command == 'cleanup':
-        cleanup_command()
+        cleanup_command(assume_yes=args.yes)
 
 if __name__ == "__main__":
     main()
-
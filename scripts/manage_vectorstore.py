@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Vectorstore Maintenance Script for CloudFuze Chatbot
+Inspect, garbage-collect and compact the Chroma collection on disk.
+
+`gc` removes UUID segment directories no segment row points at (left behind by
+rebuilds that could not delete the old store, deleted collections and copied
+backups) and the sqlite rows of deleted segments. `compact` rebuilds the HNSW
+index with the configured CHROMA_HNSW_* values, dropping deleted elements.
+Stop the server first: both commands rewrite files the server has open.
+`compact-index` (re)builds the quantized index used when COMPACT_INDEX_ENABLED=true.
+`export-mmap` (re)writes the memory-mapped index used when VECTOR_BACKEND=mmap.
+
+Usage:
+    python scripts/manage_vectorstore.py info                  # Params, record count and disk usage
+    python scripts/manage_vectorstore.py gc                    # List orphaned segments, ask before removing
+    python scripts/manage_vectorstore.py compact --m 32 -y     # Rebuild the index with new params
+    python scripts/manage_vectorstore.py compact-index --dims 256  # Build the int8 compact index
+    python scripts/manage_vectorstore.py export-mmap           # Export for the memory-mapped backend
+"""
+
+import os
+import sys
+import argparse
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CHROMA_DB_PATH, COMPACT_INDEX_PATH, COMPACT_INDEX_DIMS, MMAP_INDEX_PATH, MMAP_IVF_MIN_VECTORS
+from app.chroma_index import (
+    SQLITE_FILE, compact_collection, directory_size, find_orphan_segments, hnsw_metadata,
+    live_segment_ids, purge_orphan_rows, remove_orphan_segments
+)
+
+BACKUP_PATH = "./data/chroma_db_backup"
+METADATA_FILE = "./data/vectorstore_metadata.json"
+
+
+def _mb(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def _confirm(question: str, assume_yes: bool) -> bool:
+    return assume_yes or input(f"{question} (y/N): ").strip().lower() == "y"
+
+
+def info_command(path: str):
+    """Show the collection's HNSW params next to the configured ones."""
+    print(f"[*] Vectorstore: {path} ({_mb(directory_size(path))})")
+    if not os.path.exists(os.path.join(path, SQLITE_FILE)):
+        print(f"[WARNING] No {SQLITE_FILE}: not a usable store (run gc to remove leftovers)")
+    else:
+        import chromadb
+        from langchain_chroma import Chroma
+        from app.chroma_index import index_params
+
+        vectorstore = Chroma(client=chromadb.PersistentClient(path=path), collection_name="langchain")
+        actual = index_params(vectorstore)
+        configured = hnsw_metadata()
+        print(f"[OK] Records: {vectorstore._collection.count()}")
+        for key in configured:
+            marker = "" if actual[key] == configured[key] else "   <- differs from config"
+            print(f"   {key:<22} {actual[key]!s:<8} (configured {configured[key]}){marker}")
+        print(f"   Live segments: {len(live_segment_ids(path))}")
+
+    orphans = find_orphan_segments(path)
+    print(f"   Orphaned segment directories: {len(orphans)} ({_mb(sum(o['bytes'] for o in orphans))})")
+
+
+def gc_command(paths, assume_yes: bool):
+    """Remove orphaned segment directories and rows of deleted segments."""
+    for path in paths:
+        orphans = find_orphan_segments(path)
+        if not orphans:
+            print(f"[OK] {path}: no orphaned segments")
+        else:
+            print(f"[*] {path}: {len(orphans)} orphaned segment directories")
+            for orphan in orphans:
+                print(f"   {orphan['segment']}  {_mb(orphan['bytes'])}")
+            if _confirm("Remove them?", assume_yes):
+                removed = remove_orphan_segments(path)
+                print(f"[OK] Removed {len(removed)} directories ({_mb(sum(o['bytes'] for o in removed))})")
+
+        purged = purge_orphan_rows(path)
+        if any(purged.values()):
+            print(f"[OK] {path}: removed rows of deleted segments {purged}")
+
+
+def compact_command(path: str, overrides: dict, assume_yes: bool):
+    """Copy the collection into a fresh index built with the configured params."""
+    if not os.path.exists(os.path.join(path, SQLITE_FILE)):
+        print(f"[ERROR] No {SQLITE_FILE} in {path}; nothing to compact")
+        return
+    print(f"[*] Compacting {path} with {hnsw_metadata(**overrides)}")
+    if not _confirm("Stop the server before compacting. Continue?", assume_yes):
+        return
+    summary = compact_collection(path, **overrides)
+    print(f"[OK] Compacted {summary['records']} records: "
+          f"{_mb(summary['bytes_before'])} -> {_mb(summary['bytes_after'])}")
+    if summary["orphans_removed"]:
+        print(f"[OK] Removed {len(summary['orphans_removed'])} orphaned segment directories")
+
+
+def compact_index_command(path: str, dims: int):
+    """Build the int8 (optionally truncated) compact index from the collection."""
+    import chromadb
+    from app.compact_index import CompactIndex
+
+    if not os.path.exists(os.path.join(path, SQLITE_FILE)):
+        print(f"[ERROR] No {SQLITE_FILE} in {path}; nothing to index")
+        return
+    collection = chromadb.PersistentClient(path=path).get_collection("langchain")
+    index = CompactIndex.build(collection, COMPACT_INDEX_PATH, dims)
+    stats = index.stats()
+    print(f"[OK] Compact index at {COMPACT_INDEX_PATH}: {stats['count']} vectors, "
+          f"{stats['dims']} of {stats['full_dims']} dims, {_mb(stats['resident_bytes'])} resident "
+          f"(full precision {_mb(stats['full_precision_bytes'])} memory-mapped)")
+
+
+def export_mmap_command(path: str, ivf_min_vectors: int):
+    """Export the collection to the memory-mapped index (exact or IVF by size)."""
+    import chromadb
+    from app.mmap_index import export_collection
+
+    if not os.path.exists(os.path.join(path, SQLITE_FILE)):
+        print(f"[ERROR] No {SQLITE_FILE} in {path}; nothing to export")
+        return
+    collection = chromadb.PersistentClient(path=path).get_collection("langchain")
+    timestamp = None
+    if os.path.exists(METADATA_FILE):
+        with open(METADATA_FILE, 'r') as f:
+            timestamp = json.load(f).get("timestamp")  # lets the server reuse this export
+    manifest = export_collection(collection, MMAP_INDEX_PATH, timestamp, ivf_min_vectors)
+    search = f"IVF with {manifest['nlist']} lists" if manifest["nlist"] else "exact search"
+    print(f"[OK] Exported {manifest['count']} x {manifest['dims']} vectors to {MMAP_INDEX_PATH} "
+          f"({search}, {_mb(directory_size(MMAP_INDEX_PATH))})")
+
+
+def main():
+    """Main CLI interface."""
+    parser = argparse.ArgumentParser(
+        description="CloudFuze Chatbot Vectorstore Maintenance",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python scripts/manage_vectorstore.py info                        # Params and disk usage
+  python scripts/manage_vectorstore.py gc -y                       # Remove orphans in the store and its backup
+  python scripts/manage_vectorstore.py compact                     # Rebuild with the configured CHROMA_HNSW_* values
+  python scripts/manage_vectorstore.py compact --m 32 --construction-ef 400
+  python scripts/manage_vectorstore.py compact-index --dims 256    # Matryoshka-truncate text-embedding-3 vectors
+  python scripts/manage_vectorstore.py export-mmap --ivf-min-vectors 0  # Force an IVF layout
+        """
+    )
+    parser.add_argument('command', choices=['info', 'gc', 'compact', 'compact-index', 'export-mmap'], help='Command to execute')
+    parser.add_argument('--path', default=CHROMA_DB_PATH, help='Chroma persist directory')
+    parser.add_argument('--space', choices=['cosine', 'l2', 'ip'], help='Override hnsw:space (compact)')
+    parser.add_argument('--m', type=int, help='Override hnsw:M (compact)')
+    parser.add_argument('--construction-ef', type=int, help='Override hnsw:construction_ef (compact)')
+    parser.add_argument('--search-ef', type=int, help='Override hnsw:search_ef (compact)')
+    parser.add_argument('--dims', type=int, default=COMPACT_INDEX_DIMS, help='Compact index width, 0 = full (compact-index)')
+    parser.add_argument('--ivf-min-vectors', type=int, default=MMAP_IVF_MIN_VECTORS, help='Use IVF from this many vectors (export-mmap)')
+    parser.add_argument('--yes', '-y', action='store_true', help='Answer yes to all prompts')
+
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        info_command(args.path)
+    elif args.command == 'gc':
+        gc_command([args.path, BACKUP_PATH] if args.path == CHROMA_DB_PATH else [args.path], args.yes)
+    elif args.command == 'compact':
+        overrides = {key: value for key, value in (
+            ("space", args.space), ("M", args.m),
+            ("construction_ef", args.construction_ef), ("search_ef", args.search_ef)
+        ) if value is not None}
+        compact_command(args.path, overrides, args.yes)
+    elif args.command == 'compact-index':
+        compact_index_command(args.path, args.dims)
+    elif args.command == 'export-mmap':
+        export_mmap_command(args.path, args.ivf_min_vectors)
+
+
+if __name__ == "__main__":
+    main()
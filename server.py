@@ -1,54 +1,27 @@
 # -*- coding: utf-8 -*-
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.endpoints import router as chat_router
-from app.mongodb_memory import close_mongodb_connection
-import uvicorn
-import asyncio
-from contextlib import asynccontextmanager
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Manage application lifespan events."""
-    # Startup
-    from app.mongodb_memory import mongodb_memory
-    try:
-        await mongodb_memory.connect()
-        print("✅ MongoDB connected successfully")
-    except Exception as e:
-        print(f"❌ Failed to connect to MongoDB: {e}")
-    
-    yield
-    
-    # Shutdown
-    try:
-        await close_mongodb_connection()
-        print("✅ MongoDB connection closed")
-    except Exception as e:
-        print(f"⚠️ Error closing MongoDB connection: {e}")
+"""
+CF Chatbot API server.
 
-app = FastAPI(lifespan=lifespan)
+    python server.py                       # SERVER_WORKERS processes (default 1)
+    SERVER_WORKERS=4 python server.py      # uvicorn multi-process
+    gunicorn app.main:app -c gunicorn.conf.py
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins
-    allow_credentials=True,  # Enable credentials for OAuth
-    allow_methods=["*"],  # Allow all methods
-    allow_headers=["*"],  # Allow all headers
-)
+The app lives in app/main.py and is only imported by the workers: this
+launcher (the uvicorn supervisor when SERVER_WORKERS > 1) reads config and
+nothing else, so it never loads the vectorstore or opens the ./data stores.
+"""
+import uvicorn
+from config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS
 
-# Add a simple health check endpoint
-@app.get("/")
-async def root():
-    return {"message": "CF Chatbot API is running"}
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "message": "Server is running"}
+def __getattr__(name):
+    # Keeps "gunicorn server:app" / "uvicorn server:app" working; resolved in the worker
+    if name == "app":
+        from app.main import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-app.include_router(chat_router)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8002)
-
+    # Workers import the app by name; each runs its own lifespan
+    uvicorn.run("app.main:app", host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS)
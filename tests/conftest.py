@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Shared test setup: the settings config.py requires, and local stand-in servers.
+
+Stand-ins are small FastAPI apps served by uvicorn on a free loopback port in
+a background thread, so the code under test talks real HTTP to them.
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# config.py refuses to import without these; nothing here reaches the real services
+for _name, _value in {
+    "OPENAI_API_KEY": "test",
+    "MICROSOFT_CLIENT_ID": "test-client",
+    "MICROSOFT_CLIENT_SECRET": "test-secret",
+    "LANGFUSE_PUBLIC_KEY": "pk-test",
+    "LANGFUSE_SECRET_KEY": "sk-test",
+    "MONGODB_URL": "mongodb://127.0.0.1:1",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def serve():
+    """serve(app) -> base URL of ``app`` running on a local port; stopped after the test."""
+    import uvicorn
+
+    servers = []
+
+    def start(app) -> str:
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 10
+        while not server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Stand-in server did not start")
+            time.sleep(0.01)
+        servers.append((server, thread))
+        return f"http://127.0.0.1:{port}"
+
+    yield start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(5)
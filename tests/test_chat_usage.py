@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Token usage, including cached prompt tokens, from a streamed chat completion."""
+
+import asyncio
+import json
+
+import httpx
+import openai
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+from app.metrics import ChatTurn
+
+
+def completion_chunk(**fields) -> dict:
+    chunk = {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 1, "model": "gpt-4o-mini"}
+    chunk.update(fields)
+    return chunk
+
+
+def fake_completions(requests: list):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        chunks = [
+            completion_chunk(choices=[{"index": 0, "delta": {"role": "assistant", "content": "Hi"},
+                                       "finish_reason": None}]),
+            completion_chunk(choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]),
+            completion_chunk(choices=[], usage={"prompt_tokens": 1500, "completion_tokens": 1, "total_tokens": 1501,
+                                                "prompt_tokens_details": {"cached_tokens": 1280}}),
+        ]
+        body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body.encode())
+    return handler
+
+
+def test_cached_tokens_reach_the_turn():
+    requests = []
+    client = openai.AsyncOpenAI(api_key="test",
+                                http_client=httpx.AsyncClient(transport=httpx.MockTransport(fake_completions(requests))))
+    # Same settings as ModelRegistry.get
+    llm = ChatOpenAI(model_name="gpt-4o-mini", streaming=True, temperature=0.3, max_tokens=100,
+                     api_key="test", stream_usage=True)
+    llm.async_client = client.chat.completions
+
+    turn = ChatTurn("/chat/stream")
+    turn.start_generation("gpt-4o-mini", 1400)
+
+    async def stream():
+        async for chunk in llm.astream([HumanMessage(content="hello")]):
+            if getattr(chunk, "usage_metadata", None):
+                turn.record_usage(chunk.usage_metadata)
+
+    asyncio.run(stream())
+    turn.end_generation(1)
+
+    assert requests[0]["stream_options"] == {"include_usage": True}
+    info = turn.generation_info()
+    assert (info["prompt_tokens"], info["completion_tokens"], info["cached_tokens"]) == (1500, 1, 1280)
+    assert info["usage_reported"]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""CorrectionDataset lookups used by the chat path."""
+
+from app.correction_dataset import CorrectionDataset
+
+
+def make_dataset(tmp_path) -> CorrectionDataset:
+    return CorrectionDataset(path=str(tmp_path / "corrections.jsonl"),
+                             legacy_path=str(tmp_path / "missing.json"))
+
+
+def test_corrected_questions_follow_the_log(tmp_path):
+    dataset = make_dataset(tmp_path)
+    other_worker = make_dataset(tmp_path)
+    dataset.append("trace-1", "Use the channel mapping.", question="How are channels migrated?")
+    other_worker.append("trace-2", "Yes, with their replies.", question="Are threads kept?")
+    dataset.append("trace-1", "Map channels first.", question="How are channels migrated now?")
+
+    assert sorted(dataset.corrected_questions()) == [
+        ("trace-1", "How are channels migrated now?"),
+        ("trace-2", "Are threads kept?"),
+    ]
+    assert dataset.get("trace-1")["corrected_output"] == "Map channels first."
+
+
+def test_one_sync_per_lookup(tmp_path, monkeypatch):
+    dataset = make_dataset(tmp_path)
+    for n in range(20):
+        dataset.append(f"trace-{n}", "better", question=f"question {n}")
+    checks = []
+    changed = dataset._log.changed
+    monkeypatch.setattr(dataset._log, "changed", lambda: checks.append(1) or changed())
+
+    assert len(dataset.corrected_questions()) == 20
+    assert len(checks) == 1
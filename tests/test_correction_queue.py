@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""CorrectionJobQueue dedup, retries and lazy loading, with a log in a temp directory."""
+
+import asyncio
+import gc
+import threading
+
+import pytest
+
+import app.correction_queue as correction_queue_module
+from app.correction_queue import CorrectionJobQueue
+
+
+@pytest.fixture
+def make_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(correction_queue_module, "CORRECTION_LEADER_LOCK", str(tmp_path / "workers.lock"))
+    return lambda **kwargs: CorrectionJobQueue(path=str(tmp_path / "jobs.jsonl"), **kwargs)
+
+
+async def wait_for(queue: CorrectionJobQueue, job_id: str, status: str, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while (await queue.get(job_id))["status"] != status:
+        assert asyncio.get_running_loop().time() < deadline, await queue.get(job_id)
+        await asyncio.sleep(0.01)
+
+
+def test_nothing_is_read_or_written_until_first_use(tmp_path, make_queue):
+    queue = make_queue()
+    assert list(tmp_path.iterdir()) == []
+
+    asyncio.run(queue.submit("trace-1", "How are channels migrated?", "bad"))
+    assert (tmp_path / "jobs.jsonl").exists()
+
+
+def test_submit_waits_for_the_log_lock_off_the_event_loop(make_queue):
+    queue = make_queue()
+    other_worker = make_queue()
+    locked, release = threading.Event(), threading.Event()
+
+    def hold_log_lock():
+        with other_worker._log.locked():
+            locked.set()
+            release.wait(5)
+
+    async def scenario():
+        holder = threading.Thread(target=hold_log_lock)
+        holder.start()
+        locked.wait(5)
+        submit = asyncio.create_task(queue.submit("trace-1", "How are channels migrated?", "bad"))
+        ticks = 0
+        for _ in range(5):  # the loop keeps running while submit waits for the lock
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not submit.done()
+        release.set()
+        _, created = await submit
+        holder.join()
+        return ticks, created
+
+    assert asyncio.run(scenario()) == (5, True)
+
+
+def test_active_jobs_are_deduplicated(make_queue):
+    queue = make_queue()
+
+    async def submit_three():
+        return [await queue.submit("trace-1", "How are channels migrated?", "bad"),
+                await queue.submit("trace-1", "How are channels migrated?", "bad"),
+                await queue.submit("trace-2", "how are channels  migrated", "bad")]
+
+    (job, created), (same_trace, created_again), (same_question, created_for_question) = asyncio.run(submit_three())
+
+    assert created and not created_again and not created_for_question
+    assert same_trace["job_id"] == same_question["job_id"] == job["job_id"]
+
+
+def test_corrected_question_is_corrected_again(make_queue):
+    queue = make_queue()
+    handled = []
+
+    async def handler(job):
+        handled.append(job["trace_id"])
+        return f"better answer {len(handled)}"
+
+    async def scenario():
+        await queue.start(handler)
+        try:
+            first, _ = await queue.submit("trace-1", "How are channels migrated?", "bad")
+            await wait_for(queue, first["job_id"], "succeeded")
+            # Thumbs-down on the corrected answer, served for the same question
+            second, created = await queue.submit("trace-2", "How are channels migrated?", "better answer 1")
+            assert created and second["job_id"] != first["job_id"]
+            await wait_for(queue, second["job_id"], "succeeded")
+            # The same trace is still not corrected twice
+            assert await queue.submit("trace-1", "How are channels migrated?", "bad") == \
+                (await queue.get(first["job_id"]), False)
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+    assert handled == ["trace-1", "trace-2"]
+    # Reloaded from the log, the succeeded jobs still do not block the question
+    assert asyncio.run(make_queue().submit("trace-3", "How are channels migrated?", "bad"))[1]
+
+
+def test_failed_attempt_is_retried(make_queue):
+    queue = make_queue(retry_delay=0.05)
+    attempts = []
+
+    async def handler(job):
+        attempts.append(job["attempts"])
+        if len(attempts) == 1:
+            raise RuntimeError("model unavailable")
+        return "better answer"
+
+    async def scenario():
+        await queue.start(handler)
+        try:
+            job, _ = await queue.submit("trace-1", "How are channels migrated?", "bad")
+            await asyncio.sleep(0.01)
+            gc.collect()  # a pending retry must survive a collection
+            await wait_for(queue, job["job_id"], "succeeded")
+            return await queue.get(job["job_id"])
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert attempts == [1, 2]
+    assert job["corrected_response"] == "better answer" and job["error"] is None
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""IntentRouter regex decisions (no embeddings attached)."""
+
+import pytest
+
+from app.intent_router import IntentRouter
+
+
+@pytest.mark.parametrize("message, kind", [
+    ("hi there", "greeting"),
+    ("Good morning!", "greeting"),
+    ("how are you doing today?", "how_are_you"),
+    ("thanks so much", "thanks"),
+    ("bye", "goodbye"),
+])
+def test_small_talk_gets_a_canned_reply(message, kind):
+    decision = IntentRouter().classify(message)
+    assert decision["intent"] == "canned" and decision["canned_kind"] == kind
+
+
+@pytest.mark.parametrize("message", ["yes", "no", "ok", "sure", "alright", "got it", "ok great, thanks a lot"])
+def test_acknowledgements_go_to_the_model(message):
+    # Usually an answer to the assistant's own question: the model needs the history
+    assert IntentRouter().classify(message)["intent"] == "conversational"
+
+
+@pytest.mark.parametrize("message", [
+    "no, I meant private channels",
+    "How are direct messages migrated?",
+    "yesterday our migration failed",
+])
+def test_questions_go_to_retrieval(message):
+    assert IntentRouter().classify(message)["intent"] == "rag"
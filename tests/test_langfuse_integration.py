@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""LangfuseTracker against a local fake of the Langfuse ingestion API."""
+
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.langfuse_integration import LangfuseTracker
+
+
+class FakeIngestion:
+    """/api/public/ingestion that records batches; ``statuses`` are answered first, then 207."""
+
+    def __init__(self, statuses: List[int] = ()):
+        self.statuses = list(statuses)
+        self.requests: List[Dict[str, Any]] = []
+        self.app = FastAPI()
+
+        @self.app.post("/api/public/ingestion")
+        async def ingest(request: Request):
+            body = await request.json()
+            self.requests.append({"auth": request.headers.get("authorization"), "batch": body["batch"]})
+            status = self.statuses.pop(0) if self.statuses else 207
+            return JSONResponse({"successes": [], "errors": []}, status_code=status)
+
+
+def tracker_for(base_url: str, **kwargs) -> LangfuseTracker:
+    options = {"flush_interval": 0.05, "retry_backoff": 0.01}
+    options.update(kwargs)
+    return LangfuseTracker(host=base_url, public_key="pk-test", secret_key="sk-test", **options)
+
+
+def test_events_are_sent_in_batches(serve):
+    fake = FakeIngestion()
+    tracker = tracker_for(serve(fake.app), batch_size=4)
+    for n in range(10):
+        assert tracker.add_score(f"trace-{n}", "user_rating", 1)
+    assert tracker.flush(5)
+    tracker.shutdown()
+
+    sizes = [len(request["batch"]) for request in fake.requests]
+    assert sum(sizes) == 10 and max(sizes) <= 4
+    assert [event["body"]["traceId"] for request in fake.requests for event in request["batch"]] == \
+        [f"trace-{n}" for n in range(10)]
+    assert all(request["auth"].startswith("Basic ") for request in fake.requests)
+    assert tracker.sent_events == 10 and tracker.failed_events == 0
+
+
+def test_server_errors_and_rate_limits_are_retried(serve):
+    fake = FakeIngestion(statuses=[503, 429])
+    tracker = tracker_for(serve(fake.app))
+    tracker.add_score("trace-1", "user_rating", 0)
+    assert tracker.flush(5)
+    tracker.shutdown()
+
+    assert len(fake.requests) == 3
+    assert fake.requests[0]["batch"] == fake.requests[2]["batch"]
+    assert tracker.sent_events == 1 and tracker.failed_events == 0
+
+
+def test_batch_is_dropped_after_max_retries(serve):
+    fake = FakeIngestion(statuses=[500, 500, 500])
+    tracker = tracker_for(serve(fake.app))
+    tracker.add_score("trace-1", "user_rating", 0)
+    assert tracker.flush(5)
+    tracker.shutdown()
+
+    assert len(fake.requests) == 3
+    assert tracker.sent_events == 0 and tracker.failed_events == 1
+
+
+def test_client_errors_are_not_retried(serve):
+    fake = FakeIngestion(statuses=[400])
+    tracker = tracker_for(serve(fake.app))
+    tracker.add_score("trace-1", "user_rating", 0)
+    assert tracker.flush(5)
+    tracker.shutdown()
+
+    assert len(fake.requests) == 1
+    assert tracker.failed_events == 1
+
+
+def test_full_queue_drops_new_events(serve):
+    fake = FakeIngestion()
+    tracker = tracker_for(serve(fake.app), max_queue_size=3)
+    tracker._thread = object()  # Worker not running yet: the queue only fills
+    accepted = [tracker.add_score(f"trace-{n}", "user_rating", 1) for n in range(5)]
+
+    assert accepted == [True, True, True, False, False]
+    assert tracker.dropped_events == 2
+
+    tracker._thread = None
+    tracker.start()
+    assert tracker.flush(5)
+    tracker.shutdown()
+    assert [event["body"]["traceId"] for request in fake.requests for event in request["batch"]] == \
+        ["trace-0", "trace-1", "trace-2"]
+
+
+def test_shutdown_flushes_pending_events(serve):
+    fake = FakeIngestion()
+    # A long flush interval: only shutdown can send the partial batch in time
+    tracker = tracker_for(serve(fake.app), flush_interval=30, batch_size=50)
+    trace_id = tracker.create_trace(user_id="u1", question="How are channels migrated?", answer="Like this.")
+    tracker.add_feedback(trace_id, "thumbs_up")
+    tracker.shutdown(timeout=5)
+
+    events = [event for request in fake.requests for event in request["batch"]]
+    assert [event["type"] for event in events] == ["trace-create", "score-create"]
+    assert events[0]["body"]["id"] == trace_id == events[1]["body"]["traceId"]
+    assert tracker._thread is None
+
+
+def test_disabled_without_keys():
+    tracker = LangfuseTracker(host="http://127.0.0.1:1", public_key=None, secret_key=None)
+    assert not tracker.enabled
+    assert tracker.create_trace(user_id="u1", question="q", answer="a") is None
+    assert tracker.add_score("trace-1", "user_rating", 1) is False
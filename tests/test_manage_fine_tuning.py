@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""scripts/manage_fine_tuning.py against bench/fake_openai_server.py."""
+
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+import pytest
+
+from app.correction_dataset import CorrectionDataset
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "bench"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "scripts"))
+
+import manage_fine_tuning as mft  # noqa: E402
+from fake_openai_server import FakeOpenAIState, create_app  # noqa: E402
+
+CORRECTIONS = "./data/fine_tuning_dataset/corrections.jsonl"
+
+
+def correction(question: str, answer: str, n: int) -> dict:
+    return {"input": question, "bad_output": "I am not sure.", "corrected_output": answer,
+            "trace_id": f"trace-{n}", "timestamp": "2026-01-01T00:00:00", "status": "auto_corrected"}
+
+
+def write_corrections(records):
+    with open(CORRECTIONS, "w", encoding="utf-8") as f:
+        for n, record in enumerate(records):
+            f.write(json.dumps(correction(*record, n)) + "\n")
+
+
+@pytest.fixture
+def fake_openai(tmp_path, monkeypatch, serve):
+    """Work in tmp_path with a fresh correction dataset; returns the fake server's state."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(mft.DATASET_DIR)
+    monkeypatch.setattr(mft, "correction_dataset", CorrectionDataset(path=CORRECTIONS,
+                                                                     legacy_path="./data/missing.json"))
+    state = FakeOpenAIState(spool_dir=str(tmp_path / "spool"))
+    os.makedirs(state.spool_dir)
+    monkeypatch.setenv("OPENAI_BASE_URL", serve(create_app(state)) + "/v1")
+    return state
+
+
+def many_corrections(count: int = 40):
+    return [(f"How do I migrate workspace {n} channels?", f"Map workspace {n} first. " * 20) for n in range(count)]
+
+
+def test_interrupted_upload_resumes_with_the_same_file(fake_openai, monkeypatch):
+    write_corrections(many_corrections())
+    monkeypatch.setattr(mft, "UPLOAD_PART_SIZE", 4096)
+    fake_openai.fail_parts = {2}
+
+    assert mft.start_command(assume_yes=True) is None  # part 2 failed
+    saved = mft.load_pipeline_state()
+    part_count = -(-saved["bytes"] // mft.UPLOAD_PART_SIZE)
+    assert 0 < len(saved["parts"]) < part_count
+    requests_before = fake_openai.part_requests
+
+    job_id = mft.start_command(assume_yes=True)
+
+    assert job_id in fake_openai.jobs
+    assert fake_openai.part_requests - requests_before == part_count - len(saved["parts"])
+    assert len(fake_openai.uploads) == 1
+    uploaded = next(iter(fake_openai.files.values()))
+    assert (uploaded["bytes"], uploaded["sha256"]) == (saved["bytes"], saved["sha256"])
+    assert mft.load_pipeline_state() is None
+
+
+def test_changed_training_file_is_rebuilt_before_resuming(fake_openai, monkeypatch):
+    write_corrections(many_corrections())
+    monkeypatch.setattr(mft, "UPLOAD_PART_SIZE", 4096)
+    fake_openai.fail_parts = {2}
+    assert mft.start_command(assume_yes=True) is None
+    saved = mft.load_pipeline_state()
+
+    # Same size, different content: only the sha256 can tell
+    with open(saved["training_file"], "r+b") as f:
+        first = f.read(1)
+        f.seek(0)
+        f.write(b"[" if first != b"[" else b"{")
+    assert not mft.training_file_intact(saved)
+
+    assert mft.start_command(assume_yes=True) in fake_openai.jobs
+    assert len(fake_openai.uploads) == 2  # the half-finished upload was abandoned, not completed
+    # Rebuilt from the dataset, so the tampered bytes never reached the server
+    uploaded = next(iter(fake_openai.files.values()))
+    assert uploaded["sha256"] == saved["sha256"]
+
+
+def test_export_drops_exact_and_collapses_near_duplicates(fake_openai):
+    write_corrections([
+        ("How do I migrate Slack channels?", "Use the channel mapping."),
+        ("how do i migrate slack channels", "Use the channel mapping."),  # exact duplicate once normalized
+        ("Slack channels: how do we migrate?", "Map channels, then run the migration."),  # near duplicate
+        ("Are threads kept?", "Yes, with their replies."),
+        ("", "An answer without a question."),
+    ])
+
+    summary = mft.export_training_file("./training.jsonl")
+
+    assert {key: summary[key] for key in ("read", "untrainable", "exact_duplicates", "near_duplicates",
+                                          "examples")} == \
+        {"read": 5, "untrainable": 1, "exact_duplicates": 1, "near_duplicates": 1, "examples": 2}
+    with open("./training.jsonl", encoding="utf-8") as f:
+        answers = [json.loads(line)["messages"][2]["content"] for line in f]
+    assert answers == ["Map channels, then run the migration.", "Yes, with their replies."]
+    assert summary["sha256"] == mft.file_sha256("./training.jsonl")
+
+
+def test_over_long_examples_are_rejected(fake_openai, monkeypatch):
+    monkeypatch.setattr(mft, "MAX_EXAMPLE_TOKENS", 400)
+    write_corrections([
+        ("How do I migrate Slack channels?", "Use the channel mapping."),
+        ("Are threads kept?", "Yes, with their replies. " * 200),
+    ])
+
+    summary = mft.export_training_file("./training.jsonl")
+
+    assert (summary["examples"], summary["rejected"]) == (1, 1)
+
+
+def test_watcher_follows_several_jobs_to_the_end(fake_openai):
+    fake_openai.files["file-1"] = {"id": "file-1"}
+    with httpx.Client(base_url=mft.api_base(), headers=mft.api_headers()) as client:
+        job_ids = [mft.create_fine_tuning_job(client, {"file_id": "file-1"})["id"] for _ in range(2)]
+
+    final = asyncio.run(mft.watch_jobs(job_ids + ["ftjob-missing"], interval=0.01, watch=True))
+
+    assert final == {job_ids[0]: "succeeded", job_ids[1]: "succeeded"}
+    assert all(fake_openai.jobs[job_id]["fine_tuned_model"] for job_id in job_ids)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Every /metrics series names the worker process that rendered it."""
+
+import os
+
+from app.metrics import MetricsRegistry
+
+
+def test_series_carry_the_worker_label():
+    registry = MetricsRegistry()
+    registry.counter("turns_total", "Turns", ("endpoint",)).inc(endpoint="/chat")
+    registry.gauge("in_flight", "In flight").set(2)
+    registry.histogram("latency_seconds", "Latency", buckets=(0.1,)).observe(0.05)
+
+    series = [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+    worker = f'worker="{os.getpid()}"'
+    assert f'turns_total{{endpoint="/chat",{worker}}} 1.0' in series
+    assert f"in_flight{{{worker}}} 2" in series
+    assert f'latency_seconds_bucket{{{worker},le="0.1"}} 1.0' in series
+    assert f"latency_seconds_count{{{worker}}} 1.0" in series
+    assert all(worker in line for line in series)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""MicrosoftAuthClient against a local stand-in for the token endpoint and Graph."""
+
+import asyncio
+import base64
+import json
+import time
+from typing import Any, Dict
+
+import pytest
+from fastapi import FastAPI, Form, Request
+from fastapi.responses import JSONResponse
+
+import app.microsoft_auth as microsoft_auth_module
+from app.microsoft_auth import MicrosoftAuthClient, MicrosoftAuthError
+
+
+def make_jwt(claims: Dict[str, Any]) -> str:
+    def encode(part: Dict[str, Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(part).encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{encode({'alg': 'none'})}.{encode(claims)}.signature"
+
+
+class FakeMicrosoft:
+    """Token endpoint issuing JWTs per authorization code, and Graph /me for the tokens it issued."""
+
+    def __init__(self, graph_delay: float = 0.0):
+        self.graph_delay = graph_delay
+        self.graph_calls = 0
+        self.token_calls = 0
+        self.users = {"oid-1": {"id": "oid-1", "displayName": "Ada", "mail": "ada@example.com"}}
+        self.issued: Dict[str, str] = {}  # access token -> oid
+        self.app = FastAPI()
+
+        @self.app.post("/{tenant}/oauth2/v2.0/token")
+        async def token(tenant: str, code: str = Form(...), grant_type: str = Form(...)):
+            self.token_calls += 1
+            if code.startswith("bad"):
+                return JSONResponse({"error": "invalid_grant"}, status_code=400)
+            oid, _, lifetime = code.partition(":")
+            claims = {"oid": oid, "exp": int(time.time()) + int(lifetime or 3600), "n": self.token_calls}
+            access_token = make_jwt(claims)
+            self.issued[access_token] = oid
+            return {"access_token": access_token, "id_token": make_jwt(claims), "refresh_token": "refresh"}
+
+        @self.app.get("/me")
+        async def me(request: Request):
+            self.graph_calls += 1
+            await asyncio.sleep(self.graph_delay)
+            oid = self.issued.get(request.headers.get("authorization", "").removeprefix("Bearer "))
+            if oid is None:
+                return JSONResponse({"error": {"code": "InvalidAuthenticationToken"}}, status_code=401)
+            return self.users[oid]
+
+
+@pytest.fixture
+def fake(serve, monkeypatch):
+    fake = FakeMicrosoft()
+    base_url = serve(fake.app)
+    monkeypatch.setattr(microsoft_auth_module, "MICROSOFT_LOGIN_URL", base_url)
+    monkeypatch.setattr(microsoft_auth_module, "MICROSOFT_GRAPH_URL", base_url)
+    return fake
+
+
+def run(client: MicrosoftAuthClient, scenario):
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def test_login_fills_the_cache(fake):
+    client = MicrosoftAuthClient(ttl_seconds=60)
+
+    async def scenario():
+        session = await client.login("oid-1", "http://app/callback", "verifier")
+        profile = await client.get_profile(session["access_token"])
+        # Another login for the same user: new token, profile served by oid
+        second = await client.login("oid-1", "http://app/callback", "verifier")
+        return session, profile, second
+
+    session, profile, second = run(client, scenario)
+    assert session["email"] == "ada@example.com" and session["refresh_token"] == "refresh"
+    assert profile == {"user_id": "oid-1", "name": "Ada", "email": "ada@example.com"}
+    assert second["access_token"] != session["access_token"]
+    assert fake.token_calls == 2
+    assert fake.graph_calls == 1
+
+
+def test_cached_profile_expires(fake):
+    client = MicrosoftAuthClient(ttl_seconds=0.2)
+
+    async def scenario():
+        session = await client.login("oid-1", "http://app/callback", "verifier")
+        await client.get_profile(session["access_token"])
+        calls_while_cached = fake.graph_calls
+        await asyncio.sleep(0.3)
+        await client.get_profile(session["access_token"])
+        return calls_while_cached
+
+    assert run(client, scenario) == 1
+    assert fake.graph_calls == 2
+
+
+def test_token_binding_ends_at_token_expiry(fake):
+    client = MicrosoftAuthClient(ttl_seconds=60)
+
+    async def scenario():
+        # Token valid for two more seconds: bound for at most that long
+        session = await client.login("oid-1:2", "http://app/callback", "verifier")
+        await client.get_profile(session["access_token"])
+        calls_while_valid = fake.graph_calls
+        await asyncio.sleep(2.1)
+        await client.get_profile(session["access_token"])
+        return calls_while_valid
+
+    assert run(client, scenario) == 1
+    assert fake.graph_calls == 2
+
+
+def test_concurrent_lookups_share_one_graph_call(fake):
+    fake.graph_delay = 0.2
+    client = MicrosoftAuthClient(ttl_seconds=60)
+    access_token = make_jwt({"oid": "oid-1", "exp": int(time.time()) + 3600})
+    fake.issued[access_token] = "oid-1"
+
+    async def scenario():
+        return await asyncio.gather(*(client.get_profile(access_token) for _ in range(10)))
+
+    profiles = run(client, scenario)
+    assert fake.graph_calls == 1
+    assert all(profile["user_id"] == "oid-1" for profile in profiles)
+
+
+def test_cache_is_bound_to_token_hash_not_claims(fake):
+    client = MicrosoftAuthClient(ttl_seconds=60)
+    # Same oid claim as a cached user, but never issued: only Graph may vouch for it
+    forged = make_jwt({"oid": "oid-1", "exp": int(time.time()) + 3600})
+
+    async def scenario():
+        await client.login("oid-1", "http://app/callback", "verifier")
+        with pytest.raises(MicrosoftAuthError):
+            await client.get_profile(forged)
+        with pytest.raises(MicrosoftAuthError):
+            await client.get_profile(forged)
+
+    run(client, scenario)
+    assert fake.graph_calls == 3  # login, then each forged lookup goes to Graph
+
+
+def test_rejected_code_raises(fake):
+    client = MicrosoftAuthClient(ttl_seconds=60)
+
+    async def scenario():
+        with pytest.raises(MicrosoftAuthError):
+            await client.login("bad-code", "http://app/callback", "verifier")
+
+    run(client, scenario)
+    assert fake.graph_calls == 0
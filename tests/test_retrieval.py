@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Retrieval scores are cosine similarity whatever the Chroma distance space."""
+
+import math
+import uuid
+
+import chromadb
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+
+from app import retrieval
+
+VECTORS = {
+    "same": [1.0, 0.0, 0.0],
+    "close": [0.8, 0.6, 0.0],
+    "far": [0.0, 0.6, 0.8],
+}
+QUERY = [1.0, 0.0, 0.0]
+
+
+class TableEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [VECTORS[text] for text in texts]
+
+    def embed_query(self, text):
+        return VECTORS[text]
+
+
+def cosine(a, b) -> float:
+    return sum(x * y for x, y in zip(a, b)) / math.sqrt(sum(x * x for x in a) * sum(y * y for y in b))
+
+
+@pytest.mark.parametrize("space", ["l2", "cosine", "ip"])
+def test_scores_are_cosine_similarity(space):
+    store = Chroma(collection_name=f"test-{uuid.uuid4().hex}", embedding_function=TableEmbeddings(),
+                   client=chromadb.EphemeralClient(), collection_metadata={"hnsw:space": space})
+    store.add_texts(list(VECTORS), ids=list(VECTORS))
+
+    hits = retrieval.search_ids(store, QUERY, k=3)
+
+    assert [chunk_id for chunk_id, _ in hits] == ["same", "close", "far"]
+    for chunk_id, score in hits:
+        assert score == pytest.approx(cosine(QUERY, VECTORS[chunk_id]), abs=1e-4)
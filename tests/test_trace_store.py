@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""TraceStore retention and background log compaction."""
+
+import threading
+import time
+
+from app.trace_store import TraceStore
+
+
+def log_lines(path) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def wait_compacted(store: TraceStore, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while store._compacting:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_compaction_runs_off_the_recording_thread(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    store = TraceStore(path=str(path), max_entries=5)
+    compacting_threads = []
+    compact = store.compact
+    monkeypatch.setattr(store, "compact", lambda: (compacting_threads.append(threading.current_thread()),
+                                                   compact()))
+
+    for n in range(11):  # 11 lines > COMPACT_RATIO * 5
+        store.record(f"trace-{n}", question=f"q{n}", answer=f"a{n}")
+    wait_compacted(store)
+
+    assert compacting_threads and threading.current_thread() not in compacting_threads
+    assert log_lines(path) == 5
+    assert [trace["trace_id"] for trace in store.values()] == [f"trace-{n}" for n in range(6, 11)]
+
+
+def test_appends_during_compaction_are_kept(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    store = TraceStore(path=str(path), max_entries=5)
+    other_worker = TraceStore(path=str(path), max_entries=5)
+    for n in range(8):
+        store.record(f"trace-{n}", question=f"q{n}", answer=f"a{n}")
+
+    # Another worker appends right after the snapshot is taken, before the rewrite
+    position = store._log.position
+
+    def position_then_append():
+        snapshot_position = position()
+        other_worker.record("trace-other", question="q", answer="a")
+        return snapshot_position
+
+    monkeypatch.setattr(store._log, "position", position_then_append)
+    store.compact()
+
+    assert log_lines(path) == 6
+    reloaded = TraceStore(path=str(path), max_entries=10)
+    assert [trace["trace_id"] for trace in reloaded.values()] == \
+        [f"trace-{n}" for n in range(3, 8)] + ["trace-other"]